@@ -1,5 +1,7 @@
 #! /usr/local/bin/bash
 
+# The rule_key of each course comes from joining on the (indexed) transfer_rules.id rather than from
+# a function call per row.
 SECONDS=0
 update_date=`psql -Xqtd cuny_curriculum \
                   -c "select update_date from updates where table_name='transfer_rules'"`
@@ -7,29 +9,31 @@ update_date=${update_date// /}
 echo Archiving $update_date
 
 echo -n "source_courses ... "
-psql -Xqd cuny_curriculum -c "copy (select  rule_key(rule_id) as rule_key, \
-                              course_id, \
-                              offer_nbr, \
-                              min_credits, \
-                              max_credits, \
-                              credits_source, \
-                              min_gpa, \
-                              max_gpa \
-                      from source_courses) to \
+psql -Xqd cuny_curriculum -c "copy (select  r.rule_key, \
+                              s.course_id, \
+                              s.offer_nbr, \
+                              s.min_credits, \
+                              s.max_credits, \
+                              s.credits_source, \
+                              s.min_gpa, \
+                              s.max_gpa \
+                      from source_courses s, transfer_rules r \
+                      where r.id = s.rule_id) to \
                       '`pwd`/rules_archive/${update_date}_source_courses.csv' csv"
 echo done
 
 echo -n "destination_courses ... "
-psql -Xqd cuny_curriculum -c "copy (select  rule_key(rule_id) as rule_key, \
-                              course_id, \
-                              offer_nbr, \
-                              transfer_credits \
-                      from destination_courses) to \
+psql -Xqd cuny_curriculum -c "copy (select  r.rule_key, \
+                              d.course_id, \
+                              d.offer_nbr, \
+                              d.transfer_credits \
+                      from destination_courses d, transfer_rules r \
+                      where r.id = d.rule_id) to \
                       '`pwd`/rules_archive/${update_date}_destination_courses.csv' csv"
 echo done
 
 echo -n "effective_dates ... "
-psql -Xqd cuny_curriculum -c "copy (select  rule_key(id) as rule_key, \
+psql -Xqd cuny_curriculum -c "copy (select  rule_key, \
                               effective_date \
                       from transfer_rules) to \
                       '`pwd`/rules_archive/${update_date}_effective_dates.csv' csv"
@@ -38,4 +42,4 @@ echo done
 echo Compressing
 bzip2 -f `pwd`/rules_archive/*.csv
 
-echo $SECONDS seconds
\ No newline at end of file
+echo $SECONDS seconds
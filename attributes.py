@@ -1,9 +1,10 @@
 # Clear and re-populate the (course) attributes table.
 
-import psycopg2
 import csv
 
-db = psycopg2.connect('dbname=cuny_curriculum')
+from curriculum_db import connect
+
+db = connect()
 cur = db.cursor()
 cur.execute('drop table if exists attributes')
 cur.execute(
@@ -0,0 +1,349 @@
+#! /usr/local/bin/python3
+""" Time representative lookups against the cuny_curriculum db, and report the plan Postgres uses
+    for each one, so the effects of schema and index changes can be measured instead of guessed at.
+
+    The benchmarks are a fixed catalogue of the Transfer Explorer’s queries, grouped by the pages
+    that run them, with the slower forms they replaced alongside for comparison. Each one is a query
+    with parameters, plus a sample query that draws parameter values from the db. The query is run
+    once for each sample, and the p50, p95, and p99 times are reported along with the scan and join
+    types in its plan. Benchmarks without parameters are run --repeat times. The samples are drawn
+    after setseed(--seed), so runs against the same db replay the same lookups.
+"""
+import argparse
+import json
+import statistics
+
+from collections import defaultdict, namedtuple
+from time import perf_counter
+
+from curriculum_db import connect
+
+Benchmark = namedtuple('Benchmark', 'group name sample_query query')
+
+benchmarks = [
+    # The app looks rules up by key; the archive scripts get keys by joining on rule ids.
+    Benchmark('rule_key', 'rule by rule_key',
+              'select rule_key from transfer_rules order by random() limit %s',
+              'select * from transfer_rules where rule_key = %s'),
+    Benchmark('rule_key', 'rule by key columns',
+              """select source_institution, destination_institution, subject_area, group_number
+                   from transfer_rules order by random() limit %s""",
+              """select * from transfer_rules
+                  where source_institution = %s
+                    and destination_institution = %s
+                    and subject_area = %s
+                    and group_number = %s"""),
+    Benchmark('rule_key', 'source courses by rule_key',
+              'select rule_key from transfer_rules order by random() limit %s',
+              """select s.* from source_courses s, transfer_rules r
+                  where r.rule_key = %s
+                    and s.rule_id = r.id"""),
+    Benchmark('archive', 'archive source_courses',
+              None,
+              """select r.rule_key, s.course_id, s.offer_nbr, s.min_credits, s.max_credits,
+                        s.credits_source, s.min_gpa, s.max_gpa
+                   from source_courses s, transfer_rules r
+                  where r.id = s.rule_id"""),
+    Benchmark('archive', 'archive destination_courses',
+              None,
+              """select r.rule_key, d.course_id, d.offer_nbr, d.transfer_credits
+                   from destination_courses d, transfer_rules r
+                  where r.id = d.rule_id"""),
+
+    # Rules that send discipline X from college A to college B, and from any college. The LIKE
+    # versions are how the colon-delimited strings used to be searched.
+    Benchmark('disciplines', 'discipline, college pair (LIKE)',
+              """select source_institution, destination_institution, source_disciplines[1]
+                   from transfer_rules order by random() limit %s""",
+              """select id from transfer_rules
+                  where source_institution = %s
+                    and destination_institution = %s
+                    and ':' || array_to_string(source_disciplines, ':') || ':'
+                        like '%%:' || %s || ':%%'"""),
+    Benchmark('disciplines', 'discipline, college pair (array)',
+              """select source_institution, destination_institution, source_disciplines[1]
+                   from transfer_rules order by random() limit %s""",
+              """select id from transfer_rules
+                  where source_institution = %s
+                    and destination_institution = %s
+                    and source_disciplines @> array[%s]"""),
+    Benchmark('disciplines', 'discipline, any college (LIKE)',
+              'select source_disciplines[1] from transfer_rules order by random() limit %s',
+              """select id from transfer_rules
+                  where ':' || array_to_string(source_disciplines, ':') || ':'
+                        like '%%:' || %s || ':%%'"""),
+    Benchmark('disciplines', 'discipline, any college (array)',
+              'select source_disciplines[1] from transfer_rules order by random() limit %s',
+              'select id from transfer_rules where source_disciplines @> array[%s]'),
+
+    # How does a course transfer everywhere?
+    Benchmark('courses', 'rules for course (course tables)',
+              'select course_id, course_id from course_rule_map order by random() limit %s',
+              """select rule_id, 'S' as direction from source_courses where course_id = %s
+                 union
+                 select rule_id, 'D' as direction from destination_courses where course_id = %s
+              """),
+    Benchmark('courses', 'rules for course (course_rule_map)',
+              'select course_id from course_rule_map order by random() limit %s',
+              """select direction, destination_institution, rule_id, rule_key
+                   from course_rule_map
+                  where course_id = %s"""),
+
+    # The app’s hot lookups, from the materialized views in lookup_views.sql and from the joins
+    # they replace.
+    Benchmark('lookups', 'rules by subject (joins)',
+              """select source_institution, destination_institution, subject
+                   from rules_by_subject order by random() limit %s""",
+              """select r.id, r.rule_key, r.priority, r.review_status, r.effective_date
+                   from transfer_rules r, subject_rule_map m
+                  where r.source_institution = %s
+                    and r.destination_institution = %s
+                    and m.subject = %s
+                    and m.rule_id = r.id"""),
+    Benchmark('lookups', 'rules by subject (view)',
+              """select source_institution, destination_institution, subject
+                   from rules_by_subject order by random() limit %s""",
+              """select rule_id, rule_key, priority, review_status, effective_date
+                   from rules_by_subject
+                  where source_institution = %s
+                    and destination_institution = %s
+                    and subject = %s"""),
+    Benchmark('lookups', 'rule courses (joins)',
+              'select rule_id, rule_id from rule_courses order by random() limit %s',
+              """select s.course_id, s.offer_nbr, s.discipline, s.catalog_number, c.title,
+                        s.min_credits, s.max_credits, s.min_gpa, s.max_gpa
+                   from source_courses s
+                        left join cuny_courses c
+                               on c.course_id = s.course_id and c.offer_nbr = s.offer_nbr
+                  where s.rule_id = %s
+                 union all
+                 select d.course_id, d.offer_nbr, d.discipline, d.catalog_number, c.title,
+                        c.min_credits, c.max_credits, null, null
+                   from destination_courses d
+                        left join cuny_courses c
+                               on c.course_id = d.course_id and c.offer_nbr = d.offer_nbr
+                  where d.rule_id = %s"""),
+    Benchmark('lookups', 'rule courses (view)',
+              'select rule_id from rule_courses order by random() limit %s',
+              """select course_id, offer_nbr, discipline, catalog_number, title,
+                        min_credits, max_credits, min_gpa, max_gpa
+                   from rule_courses
+                  where rule_id = %s"""),
+
+    # The subject_rule_map table replaced searching a colon-delimited string of each rule’s source
+    # subjects (mk_subject-rule_map.py), and source_subjects is now an array.
+    Benchmark('subjects', 'rules by subject (string)',
+              """select source_institution, destination_institution, subject
+                   from rules_by_subject order by random() limit %s""",
+              """select id from transfer_rules
+                  where source_institution = %s
+                    and destination_institution = %s
+                    and ':' || array_to_string(source_subjects, ':') || ':'
+                        like '%%:' || %s || ':%%'"""),
+    Benchmark('subjects', 'rules by subject (array)',
+              """select source_institution, destination_institution, subject
+                   from rules_by_subject order by random() limit %s""",
+              """select id from transfer_rules
+                  where source_institution = %s
+                    and destination_institution = %s
+                    and source_subjects @> array[%s]"""),
+    Benchmark('subjects', 'rules by subject (map)',
+              """select source_institution, destination_institution, subject
+                   from rules_by_subject order by random() limit %s""",
+              """select r.id from transfer_rules r, subject_rule_map m
+                  where r.source_institution = %s
+                    and r.destination_institution = %s
+                    and m.subject = %s
+                    and m.rule_id = r.id"""),
+
+    # Catalog pages: a discipline’s courses in catalog-number order, and one course with its
+    # cross-listings. The numeric_part() form is how courses were ordered before cat_num.
+    Benchmark('catalog', 'discipline page (numeric_part)',
+              """select institution, discipline
+                   from cuny_disciplines order by random() limit %s""",
+              """select course_id, offer_nbr, catalog_number, title, min_credits, max_credits,
+                        designation, attributes
+                   from cuny_courses
+                  where institution = %s
+                    and discipline = %s
+                  order by numeric_part(catalog_number), catalog_number"""),
+    Benchmark('catalog', 'discipline page (cat_num)',
+              """select institution, discipline
+                   from cuny_disciplines order by random() limit %s""",
+              """select course_id, offer_nbr, catalog_number, title, min_credits, max_credits,
+                        designation, attributes
+                   from cuny_courses
+                  where institution = %s
+                    and discipline = %s
+                  order by cat_num, catalog_number"""),
+    Benchmark('catalog', 'course with cross-listings',
+              'select course_id from cuny_courses order by random() limit %s',
+              """select c.*, d.discipline_name
+                   from cuny_courses c, cuny_disciplines d
+                  where c.course_id = %s
+                    and d.institution = c.institution
+                    and d.discipline = c.discipline
+                  order by c.offer_nbr"""),
+
+    # Review status: rules between two colleges that have a status bit set (the review page’s
+    # filters), and the review history of one rule.
+    Benchmark('reviews', 'rules with status bit',
+              """select source_institution, destination_institution,
+                        (array[1, 2, 4, 8, 32])[1 + floor(random() * 5)::integer]
+                   from transfer_rules order by random() limit %s""",
+              """select id, rule_key, review_status from transfer_rules
+                  where source_institution = %s
+                    and destination_institution = %s
+                    and review_status & %s != 0"""),
+    Benchmark('reviews', 'rules not yet reviewed',
+              """select source_institution, destination_institution
+                   from transfer_rules order by random() limit %s""",
+              """select id, rule_key from transfer_rules
+                  where source_institution = %s
+                    and destination_institution = %s
+                    and review_status = 0"""),
+    Benchmark('reviews', 'events for rule',
+              'select id from transfer_rules order by random() limit %s',
+              """select e.event_type, b.description, e.who, e.what, e.event_time
+                   from events e, review_status_bits b
+                  where e.rule_id = %s
+                    and b.abbr = e.event_type
+                  order by e.event_time"""),
+
+    # Lookups scoped to one sending college. When the rule tables are partitioned by
+    # source_institution (update_db --partitioned), the plans show only that college’s partition
+    # being scanned. The first parameter of each is the college, for --by-college.
+    Benchmark('colleges', 'rules between two colleges',
+              """select source_institution, destination_institution
+                   from transfer_rules order by random() limit %s""",
+              """select id, rule_key from transfer_rules
+                  where source_institution = %s
+                    and destination_institution = %s"""),
+    Benchmark('colleges', 'rule by key at a college',
+              'select source_institution, rule_key from transfer_rules order by random() limit %s',
+              """select * from transfer_rules
+                  where source_institution = %s
+                    and rule_key = %s"""),
+    Benchmark('colleges', 'sending courses by discipline',
+              """select source_institution, discipline
+                   from source_courses order by random() limit %s""",
+              """select rule_id, course_id, offer_nbr from source_courses
+                  where source_institution = %s
+                    and discipline = %s"""),
+
+    # Catalog queries filtered by course attribute (Pathways, BKCR, WRIC, ...)
+    Benchmark('attributes', 'courses by attribute (regex)',
+              'select name, value from course_attribute_map order by random() limit %s',
+              """select course_id, offer_nbr from cuny_courses
+                  where attributes ~ (%s || ':' || %s)"""),
+    Benchmark('attributes', 'courses by attribute (map)',
+              'select name, value from course_attribute_map order by random() limit %s',
+              """select course_id, offer_nbr from course_attribute_map
+                  where name = %s and value = %s"""),
+    Benchmark('attributes', 'courses by attribute (jsonb)',
+              'select name, value from course_attribute_map order by random() limit %s',
+              """select course_id, offer_nbr from cuny_courses
+                  where attribute_values @> jsonb_build_object(%s, jsonb_build_array(%s))"""),
+    Benchmark('attributes', 'courses with attribute name',
+              'select distinct name from course_attribute_map limit %s',
+              """select course_id, offer_nbr from cuny_courses
+                  where attribute_values ? %s"""),
+]
+
+
+# plan_nodes()
+# -------------------------------------------------------------------------------------------------
+def plan_nodes(plan):
+  """ Generate a description of each node in an EXPLAIN (FORMAT JSON) plan tree.
+  """
+  node = plan['Node Type']
+  if 'Index Name' in plan:
+    node += f' using {plan["Index Name"]}'
+  elif 'Relation Name' in plan:
+    node += f' on {plan["Relation Name"]}'
+  yield node
+  for child in plan.get('Plans', []):
+    yield from plan_nodes(child)
+
+
+# percentile()
+# -------------------------------------------------------------------------------------------------
+def percentile(times, p):
+  """ The p-th percentile of a list of times.
+  """
+  if len(times) == 1:
+    return times[0]
+  return statistics.quantiles(times, n=100, method='inclusive')[p - 1]
+
+
+# run_benchmark()
+# -------------------------------------------------------------------------------------------------
+def run_benchmark(cursor, benchmark, num_samples, repeat):
+  """ Return the list of times (in msec) for running benchmark’s query, its plan, and the samples
+      it was run with.
+  """
+  if benchmark.sample_query is None:
+    samples = repeat * [None]
+  else:
+    cursor.execute(benchmark.sample_query, (num_samples, ))
+    samples = cursor.fetchall()
+  if len(samples) == 0:
+    return [], [], []
+
+  cursor.execute(f'explain (format json) {benchmark.query}', samples[0])
+  plan = cursor.fetchone()[0]
+  if isinstance(plan, str):
+    plan = json.loads(plan)
+  nodes = list(plan_nodes(plan[0]['Plan']))
+
+  times = []
+  for sample in samples:
+    start = perf_counter()
+    cursor.execute(benchmark.query, sample)
+    cursor.fetchall()
+    times.append(1000 * (perf_counter() - start))
+  return times, nodes, samples
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Time representative cuny_curriculum queries')
+  parser.add_argument('--group', '-g', action='append',
+                      help='benchmark group(s) to run (default: all)')
+  parser.add_argument('--samples', '-s', type=int, default=100)
+  parser.add_argument('--repeat', '-r', type=int, default=3)
+  parser.add_argument('--seed', type=float, default=0.5,
+                      help='setseed() value for drawing the samples (-1 to 1)')
+  parser.add_argument('--list', '-l', action='store_true',
+                      help='list the benchmarks instead of running them')
+  parser.add_argument('--by-college', '-c', action='store_true',
+                      help='also report the colleges group’s times for each college')
+  args = parser.parse_args()
+
+  if args.list:
+    for benchmark in benchmarks:
+      print(f'{benchmark.group:<10} {benchmark.name}')
+    exit()
+
+  db = connect()
+  cursor = db.cursor()
+  cursor.execute('select setseed(%s)', (args.seed, ))
+
+  for benchmark in benchmarks:
+    if args.group and benchmark.group not in args.group:
+      continue
+    times, nodes, samples = run_benchmark(cursor, benchmark, args.samples, args.repeat)
+    if len(times) == 0:
+      print(f'{benchmark.group:<10} {benchmark.name:<32} no samples')
+      continue
+    print(f'{benchmark.group:<10} {benchmark.name:<32} {len(times):4} runs  '
+          f'p50 {percentile(times, 50):9.3f} ms  p95 {percentile(times, 95):9.3f} ms  '
+          f'p99 {percentile(times, 99):9.3f} ms')
+    for node in nodes:
+      print(f'{"":43}{node}')
+    if args.by_college and benchmark.group == 'colleges':
+      college_times = defaultdict(list)
+      for sample, sample_time in zip(samples, times):
+        college_times[sample[0]].append(sample_time)
+      for college, times in sorted(college_times.items()):
+        print(f'{"":43}{college:<8} {len(times):4} runs  p50 {percentile(times, 50):9.3f} ms')
+  db.close()
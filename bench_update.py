@@ -0,0 +1,217 @@
+#! /usr/local/bin/python3
+""" Run the stages of update_db that build the db against a throwaway Postgres database, and record
+    the wall time, rows per second, and peak memory of each one.
+
+    The query files come from --queries (a directory with a latest_queries folder in it), or are
+    generated by mk_synthetic_queries.py at --scale. The scripts run in a scratch directory, so
+    their log files don’t overwrite the ones from the last real update, and connect to the
+    throwaway db through CUNY_CURRICULUM_DSN (see curriculum_db.py).
+
+    One line per stage is appended to the results file (CSV): the stage’s wall time, the number of
+    rows in the tables it builds, rows per second, and the peak resident set size of the processes
+    it ran. The stages mirror the ones in update_db, minus the downloads, query checks, archiving,
+    and the CUNY_Programs update. A failing stage is recorded, and ends the run.
+"""
+import argparse
+import csv
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from collections import namedtuple
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+
+from curriculum_db import connect
+
+here = Path(__file__).resolve().parent
+
+Stage = namedtuple('Stage', 'name commands tables parallel')
+Result = namedtuple('Result', """run_date scale partitioned logged_load stage seconds rows
+                                 rows_per_sec peak_rss_mb status""")
+
+
+# sql()
+# -------------------------------------------------------------------------------------------------
+def sql(file):
+  """ psql command for one of the repo’s sql files; the db name and variables are added by
+      run_stage().
+  """
+  return ['psql', '-X', '-q', '-v', 'ON_ERROR_STOP=1', '-f', str(here / file)]
+
+
+# python()
+# -------------------------------------------------------------------------------------------------
+def python(script, *args):
+  return [sys.executable, str(here / script), *args]
+
+
+rule_tables = ['transfer_rules', 'source_courses', 'destination_courses']
+course_tables = ['cuny_courses', 'course_attributes', 'course_attribute_map']
+stages = [
+    Stage('persistent schema', [sql('persistent_schema.sql'), sql('reviews-events.sql'),
+                                sql('rule_ids.sql'), sql('roles.sql')], [], False),
+    Stage('updates, numeric_part', [sql('updates.sql'), sql('numeric_part.sql')], [], False),
+    Stage('cuny_institutions', [sql('cuny_institutions.sql')], ['cuny_institutions'], False),
+    Stage('cuny_programs', [python('cuny_programs.py')], ['cuny_programs', 'cuny_subplans'], False),
+    Stage('cuny_careers', [python('cuny_careers.py')], ['cuny_careers'], False),
+    Stage('cuny_divisions', [python('cuny_divisions.py')], ['cuny_divisions'], False),
+    Stage('cuny_departments', [python('cuny_departments.py')], ['cuny_departments'], False),
+    Stage('cuny_subjects', [python('cuny_subjects.py')], ['cuny_subjects', 'cuny_disciplines'],
+          False),
+    Stage('designations', [python('designations.py')], ['designations'], False),
+    Stage('crse_equiv_tbl', [python('mk_crse_equiv_tbl.py')], ['crse_equiv_tbl'], False),
+    Stage('create courses', [sql('create_cuny_courses.sql'), sql('view_courses.sql')], [], False),
+    Stage('populate courses', [python('populate_cuny_courses.py')], course_tables, False),
+    Stage('check_total_hours', [python('check_total_hours.py')], ['cuny_courses'], False),
+    Stage('create rules', [sql('review_status_bits.sql'), sql('create_transfer_rules.sql')], [],
+          False),
+    Stage('populate rules', [python('populate_transfer_rules.py')],
+          rule_tables + ['course_rule_map'], False),
+    Stage('subject_rule_map', [python('mk_subject-rule_map.py')], ['subject_rule_map'], False),
+    Stage('constraints', [sql('cuny_courses_constraints.sql'),
+                          sql('transfer_rules_constraints.sql')], course_tables + rule_tables,
+          True),
+    Stage('set logged', [python('set_logged.py')], course_tables + rule_tables, False),
+    Stage('lookup views', [sql('lookup_views.sql')], ['rules_by_subject', 'rule_courses'], False),
+    Stage('persistent constraints', [sql('persistent_constraints.sql')], [], False),
+    Stage('review statuses', [python('update_review_statuses.py')], ['transfer_rules'], False),
+    Stage('refresh lookup views', [sql('refresh_lookup_views.sql')],
+          ['rules_by_subject', 'rule_courses'], False),
+    Stage('post load', [sql('post_load.sql')], course_tables + rule_tables, False)]
+
+
+# max_rss_mb()
+# -------------------------------------------------------------------------------------------------
+def max_rss_mb(rusage):
+  """ ru_maxrss is in bytes on macOS and in kilobytes on Linux.
+  """
+  if sys.platform == 'darwin':
+    return rusage.ru_maxrss / (1024 * 1024)
+  return rusage.ru_maxrss / 1024
+
+
+# run_stage()
+# -------------------------------------------------------------------------------------------------
+def run_stage(stage, db_name, psql_vars, workdir, log):
+  """ Run the stage’s commands, one after the other or all at once, and return the wall time, the
+      peak RSS of the largest process, and whether they all succeeded.
+  """
+  env = dict(os.environ, CUNY_CURRICULUM_DSN=f'dbname={db_name}')
+  commands = []
+  for command in stage.commands:
+    if command[0] == 'psql':
+      command = command[0:1] + ['-d', db_name] + psql_vars + command[1:]
+    commands.append(command)
+
+  peak_rss = 0.0
+  ok = True
+  start_time = perf_counter()
+  groups = [commands] if stage.parallel else [[command] for command in commands]
+  for group in groups:
+    processes = [subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=log)
+                 for command in group]
+    for process in processes:
+      # wait4() gives the resource usage of this one child, not all the children so far.
+      pid, status, rusage = os.wait4(process.pid, 0)
+      process.returncode = os.waitstatus_to_exitcode(status)
+      peak_rss = max(peak_rss, max_rss_mb(rusage))
+      ok = ok and process.returncode == 0
+    if not ok:
+      break
+  return perf_counter() - start_time, peak_rss, ok
+
+
+# count_rows()
+# -------------------------------------------------------------------------------------------------
+def count_rows(cursor, tables):
+  rows = 0
+  for table in tables:
+    cursor.execute(f'select count(*) from {table}')
+    rows += cursor.fetchone()[0]
+  return rows
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Benchmark the update_db stages')
+  parser.add_argument('--scale', '-s', type=float, default=1.0,
+                      help='scale of the synthetic query files (see mk_synthetic_queries.py)')
+  parser.add_argument('--queries', '-q',
+                      help='directory containing a latest_queries folder to use instead')
+  parser.add_argument('--db', default='cuny_curriculum_bench',
+                      help='name of the throwaway db (default: %(default)s)')
+  parser.add_argument('--results', '-r', default='bench_update_results.csv')
+  parser.add_argument('--logged-load', '-ll', action='store_true')
+  parser.add_argument('--partitioned', '-pt', action='store_true')
+  parser.add_argument('--keep', '-k', action='store_true',
+                      help='keep the db and the scratch directory')
+  parser.add_argument('--progress', '-p', action='store_true')
+  args = parser.parse_args()
+
+  try:
+    terminal = open(os.ttyname(0), 'wt')
+  except OSError as e:
+    # No progress reporting unless run from command line
+    terminal = open('/dev/null', 'wt')
+
+  if args.db == 'cuny_curriculum':
+    sys.exit('The benchmark db is dropped and re-created; it can’t be cuny_curriculum')
+
+  workdir = Path(tempfile.mkdtemp(prefix='bench_update_'))
+  if args.queries:
+    (workdir / 'latest_queries').symlink_to(Path(args.queries).resolve() / 'latest_queries')
+    scale = ''
+  else:
+    if args.progress:
+      print(f'Generating query files at scale {args.scale:g}', file=terminal)
+    command = python('mk_synthetic_queries.py', '--scale', str(args.scale),
+                     '--directory', str(workdir / 'latest_queries'))
+    if args.progress:
+      command.append('--progress')
+    subprocess.run(command, check=True)
+    scale = args.scale
+
+  subprocess.run(['dropdb', '--if-exists', args.db], check=True)
+  subprocess.run(['createdb', args.db], check=True)
+  persistence = 'logged' if args.logged_load else 'unlogged'
+  partitioned = 'true' if args.partitioned else 'false'
+  psql_vars = ['-v', f'persistence={persistence}', '-v', f'partitioned={partitioned}']
+
+  run_date = datetime.now().isoformat(timespec='seconds')
+  results = []
+  conn = connect(f'dbname={args.db}')
+  conn.autocommit = True
+  cursor = conn.cursor()
+  with open(workdir / 'bench_update.log', 'w') as log:
+    for stage in stages:
+      if args.progress:
+        print(f'  {stage.name:<24}', end='', file=terminal, flush=True)
+      log.write(f'\n--- {stage.name} ---\n')
+      log.flush()
+      seconds, peak_rss, ok = run_stage(stage, args.db, psql_vars, workdir, log)
+      rows = count_rows(cursor, stage.tables) if ok else 0
+      results.append(Result(run_date, scale, args.partitioned, args.logged_load, stage.name,
+                            round(seconds, 3), rows, round(rows / seconds) if seconds else 0,
+                            round(peak_rss, 1), 'ok' if ok else 'failed'))
+      if args.progress:
+        print(f'{seconds:9.1f} sec {rows:12,} rows {peak_rss:8.1f} MB', file=terminal)
+      if not ok:
+        print(f'{stage.name} failed: see {workdir / "bench_update.log"}', file=sys.stderr)
+        break
+  conn.close()
+
+  new_file = not Path(args.results).exists()
+  with open(args.results, 'a', newline='') as results_file:
+    writer = csv.writer(results_file)
+    if new_file:
+      writer.writerow(Result._fields)
+    writer.writerows(results)
+
+  if not args.keep:
+    subprocess.run(['dropdb', '--if-exists', args.db])
+    if results[-1].status == 'ok':
+      shutil.rmtree(workdir)
+  exit(0 if results[-1].status == 'ok' else 1)
@@ -0,0 +1,160 @@
+""" Load rows into a table with COPY instead of one INSERT per row.
+    The populate scripts build their rows in memory and hand them to copy_rows(). The tables have no
+    keys or indexes while they are loaded. Those are added afterwards, by the *_constraints.sql
+    files.
+
+    Each COPY is timed, and the WAL it generates is measured, so loading into UNLOGGED tables can be
+    compared with loading into logged ones (update_db --logged-load).
+
+    A CopyWriter pipelines the work instead: the populate script passes it rows as it validates
+    them, and a writer thread streams them to Postgres in batches through a bounded queue, so
+    Postgres stores one batch while Python prepares the next.
+"""
+import csv
+import queue
+import sys
+import threading
+
+from io import StringIO
+from time import perf_counter
+
+# COPY’s default NULL in CSV format is an unquoted empty field, which would also turn empty strings
+# into NULLs. Use an explicit marker instead.
+NULL = r'\N'
+
+
+# pg_array()
+# -------------------------------------------------------------------------------------------------
+def pg_array(values):
+  """ Postgres array literal for a sequence of strings, for text[] columns.
+  """
+  elements = [value.replace('\\', '\\\\').replace('"', '\\"') for value in values]
+  return '{' + ','.join(f'"{element}"' for element in elements) + '}'
+
+
+# copy_rows()
+# -------------------------------------------------------------------------------------------------
+def copy_rows(cursor, table, rows, columns=None, log=sys.stderr):
+  """ COPY rows, a sequence of tuples of Python values, into table. None values become NULL.
+      If columns is given, the values go into those columns, and the others get their defaults.
+      Writes the row count, time, and WAL bytes to log, and returns the number of rows loaded.
+  """
+  buffer = StringIO()
+  writer = csv.writer(buffer)
+  num_rows = 0
+  for row in rows:
+    writer.writerow([NULL if value is None else value for value in row])
+    num_rows += 1
+  buffer.seek(0)
+  column_list = '' if columns is None else f' ({", ".join(columns)})'
+
+  cursor.execute('select pg_current_wal_lsn()')
+  start_lsn = cursor.fetchone()[0]
+  start_time = perf_counter()
+  cursor.copy_expert(f"copy {table}{column_list} from stdin with (format csv, null '{NULL}')",
+                     buffer)
+  seconds = perf_counter() - start_time
+  cursor.execute('select pg_wal_lsn_diff(pg_current_wal_lsn(), %s)', (start_lsn, ))
+  wal_bytes = int(cursor.fetchone()[0])
+  print(f'  COPY {table}: {num_rows:,} rows in {seconds:.1f} sec; {wal_bytes:,} bytes of WAL',
+        file=log)
+  return num_rows
+
+
+# class CopyWriter
+# -------------------------------------------------------------------------------------------------
+class CopyWriter:
+  """ Stream rows into table with a single COPY that runs in a thread of its own.
+
+      put() formats each row as CSV and, every batch_size rows, queues the batch for the writer
+      thread. The queue holds at most max_batches, so if Postgres falls behind, put() waits
+      (back-pressure) instead of letting the batches pile up in memory. close() sends the last
+      batch, waits for the COPY to finish, and reports the throughput of both sides. A COPY error
+      is raised by the next put() or by close().
+
+      The cursor’s connection must not be used for anything else until close() returns.
+  """
+
+  def __init__(self, cursor, table, columns=None, batch_size=1000, max_batches=16, log=sys.stderr):
+    self.cursor = cursor
+    self.table = table
+    self.columns = columns
+    self.batch_size = batch_size
+    self.log = log
+    self.queue = queue.Queue(maxsize=max_batches)
+    self.error = None
+    self.num_rows = 0
+    self.num_batches = 0
+    self.wait_seconds = 0.0     # time put() spent waiting for room in the queue
+    self.starve_seconds = 0.0   # time the writer spent waiting for a batch
+    self.copy_seconds = 0.0
+    self.done = False
+    self._new_batch()
+    self.start_time = perf_counter()
+    self.thread = threading.Thread(target=self._copy, daemon=True)
+    self.thread.start()
+
+  def _new_batch(self):
+    self.batch = StringIO()
+    self.batch_writer = csv.writer(self.batch)
+    self.batch_rows = 0
+
+  def _send_batch(self):
+    start = perf_counter()
+    self.queue.put(self.batch.getvalue())
+    self.wait_seconds += perf_counter() - start
+    self.num_batches += 1
+    self._new_batch()
+
+  def put(self, row):
+    """ Queue one row (a sequence of Python values, None for NULL) for the table.
+    """
+    if self.error is not None:
+      raise self.error
+    self.batch_writer.writerow([NULL if value is None else value for value in row])
+    self.num_rows += 1
+    self.batch_rows += 1
+    if self.batch_rows == self.batch_size:
+      self._send_batch()
+
+  def read(self, size=-1):
+    """ The file interface copy_expert() reads the rows from: one batch per call, and '' at the end.
+    """
+    start = perf_counter()
+    batch = self.queue.get()
+    self.starve_seconds += perf_counter() - start
+    if batch is None:
+      self.done = True
+      return ''
+    return batch
+
+  def _copy(self):
+    column_list = '' if self.columns is None else f' ({", ".join(self.columns)})'
+    start = perf_counter()
+    try:
+      self.cursor.copy_expert(f"copy {self.table}{column_list} "
+                              f"from stdin with (format csv, null '{NULL}')", self)
+    except Exception as error:
+      # Keep emptying the queue, so put() and close() do not wait forever.
+      self.error = error
+      while not self.done:
+        self.done = self.queue.get() is None
+    self.copy_seconds = perf_counter() - start
+
+  def close(self):
+    """ Finish the COPY, report the counters, and return the number of rows loaded.
+    """
+    if self.batch_rows > 0:
+      self._send_batch()
+    self.queue.put(None)
+    self.thread.join()
+    if self.error is not None:
+      raise self.error
+    elapsed = perf_counter() - self.start_time
+    produce_seconds = max(elapsed - self.wait_seconds, 1e-6)
+    write_seconds = max(self.copy_seconds - self.starve_seconds, 1e-6)
+    print(f'  COPY {self.table}: {self.num_rows:,} rows in {self.num_batches:,} batches, '
+          f'{elapsed:.1f} sec. Producer {self.num_rows / produce_seconds:,.0f} rows/sec, '
+          f'waited {self.wait_seconds:.1f} sec; writer {self.num_rows / write_seconds:,.0f} '
+          f'rows/sec, waited {self.starve_seconds:.1f} sec', file=self.log)
+    return self.num_rows
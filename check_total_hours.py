@@ -1,25 +1,24 @@
 # Generate a report showing active courses where the number of contact hours is not the
 # sum of the component contact hours.
-import psycopg2
-from psycopg2.extras import NamedTupleCursor
+from curriculum_db import connect, server_rows
+import run_metrics
 from collections import namedtuple
 
 Component = namedtuple('Component', 'component hours')
-db = psycopg2.connect('dbname=cuny_curriculum')
-cursor = db.cursor(cursor_factory=NamedTupleCursor)
+db = connect()
 
-cursor.execute("""select  course_id,
-                          institution,
-                          discipline,
-                          catalog_number,
-                          course_status,
-                          contact_hours,
-                          components,
-                          designation,
-                          attributes
-                    from  cuny_courses
-                 order by course_status, institution, discipline, catalog_number""")
-for row in cursor.fetchall():
+for row in server_rows("""select  course_id,
+                                  institution,
+                                  discipline,
+                                  catalog_number,
+                                  course_status,
+                                  contact_hours,
+                                  components,
+                                  designation,
+                                  attributes
+                            from  cuny_courses
+                         order by course_status, institution, discipline, catalog_number"""):
+  run_metrics.read()
   components = [Component._make(c) for c in row.components]
   hours = sum([component.hours for component in components])
   if hours != row.contact_hours and row.course_status == 'A':
@@ -0,0 +1,88 @@
+""" Structured, buffered logging of the conflicts the populate scripts find in the query files.
+
+    The populate scripts report tens of thousands of near-identical notices (cross-listed and
+    inactive destination courses, unknown subject areas, …). Instead of formatting and writing each
+    one as it is found, a ConflictLog keeps them as records (category, rule_key, course_id, detail)
+    and writes them in bulk, one JSON object per line, to <name>.jsonl, which can be loaded with
+    jq, pandas, or Postgres’s COPY for analysis.
+
+    <name>.log is the human-readable part: the script’s notes (file dates, row counts, …) and, at
+    the end, the number of conflicts in each category. The old one-line-per-conflict text is added
+    to it only when the script is run with --text-log.
+
+    Conflicts recorded with rejected=True (the ones that cause a row or rule to be dropped) are
+    also counted in the stage’s run metrics (see run_metrics.py).
+
+    The log is closed, and its buffer flushed, when the script exits, including through sys.exit().
+"""
+import atexit
+import json
+
+from collections import Counter
+
+import run_metrics
+
+
+class ConflictLog:
+  """ Buffered JSON-lines log of conflicts, plus a summary log.
+  """
+  def __init__(self, name, text_log=False, buffer_size=10000):
+    self.name = name
+    self.text_log = text_log
+    self.buffer_size = buffer_size
+    self.counts = Counter()
+    self._records = []
+    self._lines = []
+    self._json_file = open(f'{name}.jsonl', 'w')
+    self._log_file = open(f'{name}.log', 'w')
+    atexit.register(self.close)
+
+  def record(self, category, detail, rule_key=None, course_id=None, rejected=False):
+    """ Record one conflict. detail is the human-readable description, which goes into the text
+        log (with --text-log) as is.
+    """
+    self.counts[category] += 1
+    if rejected:
+      run_metrics.reject(category)
+    self._records.append({'category': category,
+                          'rule_key': None if rule_key is None else str(rule_key),
+                          'course_id': course_id,
+                          'rejected': rejected,
+                          'detail': detail.strip()})
+    if self.text_log:
+      self._lines.append(detail if detail.endswith('\n') else detail + '\n')
+    if len(self._records) >= self.buffer_size:
+      self.flush()
+
+  def note(self, message):
+    """ Always write message to the text log, after any conflicts recorded before it.
+    """
+    self._lines.append(message if message.endswith('\n') else message + '\n')
+    if len(self._lines) >= self.buffer_size:
+      self.flush()
+
+  def flush(self):
+    self._json_file.writelines(json.dumps(record) + '\n' for record in self._records)
+    self._log_file.writelines(self._lines)
+    self._records.clear()
+    self._lines.clear()
+
+  def summary(self):
+    """ Conflict counts by category, most frequent first.
+    """
+    lines = [f'{sum(self.counts.values()):,} conflicts in {self.name}.jsonl']
+    for category, count in self.counts.most_common():
+      lines.append(f'  {count:9,} {category}')
+    return '\n'.join(lines) + '\n'
+
+  def close(self):
+    """ Flush the buffers, end the text log with the summary, and return the category counts.
+        Safe to call more than once.
+    """
+    if self._json_file.closed:
+      return self.counts
+    self.flush()
+    self._log_file.write(self.summary())
+    self._json_file.close()
+    self._log_file.close()
+    return self.counts
@@ -1,23 +1,34 @@
 DROP TABLE IF EXISTS cuny_courses cascade;
 DROP TABLE IF EXISTS course_attributes cascade;
+DROP TABLE IF EXISTS course_attribute_map cascade;
 
-CREATE TABLE course_attributes (
+-- Keys and indexes for these tables are added after they are loaded (cuny_courses_constraints.sql)
+--
+-- The tables are UNLOGGED unless update_db sets the persistence variable to logged: there is no
+-- point writing the load to the WAL when it can be redone from the query files. set_logged.py makes
+-- them permanent once their constraints have been validated.
+\if :{?persistence}
+\else
+  \set persistence unlogged
+\endif
+
+CREATE :persistence TABLE course_attributes (
   name text,
   value text,
-  description text,
-  primary key (name, value)
+  description text
 );
 
 --  No course history, just the most recent version.
-CREATE TABLE cuny_courses (
+CREATE :persistence TABLE cuny_courses (
   course_id integer,
   offer_nbr integer,
-  equivalence_group integer references crse_equiv_tbl,
-  institution text references cuny_institutions,
-  cuny_subject text references cuny_subjects,
-  department text references cuny_departments,
+  equivalence_group integer,
+  institution text,
+  cuny_subject text,
+  department text,
   discipline text,
   catalog_number text,
+  cat_num real,  -- numeric part of catalog_number, for ordering (see numeric_part.py)
   title text,
   short_title text,
   components jsonb,  -- array of [component, component_contact_hours]
@@ -27,7 +38,7 @@ CREATE TABLE cuny_courses (
   repeatable boolean,
   primary_component text,
   requisites text,
-  designation text references designations,
+  designation text,
   description text,
   career text,
   course_status text,
@@ -35,7 +46,17 @@ CREATE TABLE cuny_courses (
   can_schedule text,
   effective_date date,
   attributes text, -- semicolon-separated list of name:value pairs
-  primary key (course_id, offer_nbr),
-  foreign key (institution, career) references cuny_careers,
-  foreign key (institution, discipline) references cuny_disciplines
-)
+  attribute_values jsonb -- the same pairs as {name: [value, ...]}, for indexed lookups
+);
+
+-- One row per course attribute, so courses can be looked up by attribute name and/or value.
+-- is_bkcr is set at load time for attributes with BKCR anywhere in their name or value, so the
+-- courses that carry one can be found through an index rather than by matching every row.
+CREATE :persistence TABLE course_attribute_map (
+  course_id integer,
+  offer_nbr integer,
+  name text,
+  value text,
+  is_bkcr boolean
+);
+
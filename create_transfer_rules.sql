@@ -1,22 +1,45 @@
 -- The tranfer_rules table.
+-- Keys and indexes for these tables are added after they are loaded
+-- (transfer_rules_constraints.sql)
+--
+-- Like the course tables, they are UNLOGGED while they are loaded (see create_cuny_courses.sql).
+--
+-- With the partitioned variable set to true, transfer_rules, source_courses, and
+-- destination_courses are instead partitioned by source_institution, with one partition per
+-- college in cuny_institutions. A partitioned table cannot itself be UNLOGGED; its partitions are.
+\if :{?persistence}
+\else
+  \set persistence unlogged
+\endif
+\if :{?partitioned}
+\else
+  \set partitioned false
+\endif
+\if :partitioned
+  \set table_persistence ''
+  \set partitioning 'partition by list (source_institution)'
+\else
+  \set table_persistence :persistence
+  \set partitioning ''
+\endif
+
 drop table if exists transfer_rules cascade;
-create table transfer_rules (
-  id serial primary key,
-  rule_key text,
+create :table_persistence table transfer_rules (
+  id integer not null, -- stable across rebuilds: assigned from the rule_ids registry
+  rule_key text not null, -- source:destination:subject_area:group_number
   source_institution text not null,
   destination_institution text not null,
   subject_area text not null,
   group_number integer not null,
   priority integer not null,
-  source_disciplines text not null, -- colon-separated list of all source disciplines
-  source_subjects text not null, -- colon-separated list of all source course cuny_subjects
-  destination_disciplines text not null, -- colon-separated list of all destination disciplines
-  sending_courses text not null, -- colon-separated list of sending course_id.offer_nbr
-  receiving_courses text not null, -- colon-separated list of receiving course_id.offer_nbr
+  source_disciplines text[] not null, -- all source disciplines
+  source_subjects text[] not null, -- all source course cuny_subjects
+  destination_disciplines text[] not null, -- all destination disciplines
+  sending_courses text[] not null, -- sending course_id.offer_nbr
+  receiving_courses text[] not null, -- receiving course_id.offer_nbr
   review_status integer default 0,
-  effective_date date, -- latest effective date of any table/view in CF query
-  foreign key (source_institution) references cuny_institutions,
-  foreign key (destination_institution) references cuny_institutions);
+  effective_date date) -- latest effective date of any table/view in CF query
+  :partitioning;
 
 drop table if exists credit_sources cascade;
 create table credit_sources (
@@ -29,9 +52,10 @@ insert into credit_sources values ('E', 'External', 'Specify Maximum Units');
 insert into credit_sources values ('R', 'Rule', 'Specify Fixed Units');
 
 drop table if exists source_courses cascade;
-create table source_courses (
-  id serial primary key,
-  rule_id integer references transfer_rules,
+create :table_persistence table source_courses (
+  id serial,
+  rule_id integer,
+  source_institution text, -- the rule’s, for partitioning
   course_id integer,
   offer_nbr integer,
   offer_count integer,  -- greater than 1 for cross-listed courses
@@ -41,14 +65,16 @@ create table source_courses (
   cuny_subject text,
   min_credits real,
   max_credits real,
-  credits_source text references credit_sources,
+  credits_source text,
   min_gpa real,
-  max_gpa real);
+  max_gpa real)
+  :partitioning;
 
 drop table if exists destination_courses cascade;
-create table destination_courses (
-  id serial primary key,
-  rule_id integer references transfer_rules,
+create :table_persistence table destination_courses (
+  id serial,
+  rule_id integer,
+  source_institution text, -- the rule’s, for partitioning
   course_id integer,
   offer_nbr integer,
   offer_count integer,  -- greater than 1 for cross-listed courses
@@ -56,5 +82,32 @@ create table destination_courses (
   catalog_number text,  -- "the" catalog number
   cat_num real,         -- numeric part for display ordering
   cuny_subject text,
-  transfer_credits real);
+  transfer_credits real)
+  :partitioning;
+
+\if :partitioned
+select format('create %s table %I partition of %I for values in (%L)',
+              :'persistence', t || '_' || lower(i.code), t, i.code)
+  from unnest(array['transfer_rules', 'source_courses', 'destination_courses']) t,
+       cuny_institutions i
+ order by t, i.code
+\gexec
+\endif
+
+-- The rules each course is a sending (S) or receiving (D) course for, by destination institution,
+-- so “How does this course transfer everywhere?” is a single index range scan instead of a scan of
+-- source_courses and destination_courses. The primary key index includes rule_key, so the lookup
+-- does not need to visit transfer_rules either.
+drop table if exists course_rule_map cascade;
+create :persistence table course_rule_map (
+  course_id integer,
+  direction char(1),
+  destination_institution text,
+  rule_id integer,
+  rule_key text);
 
+-- Filled by mk_subject-rule_map.py
+drop table if exists subject_rule_map cascade;
+create :persistence table subject_rule_map (
+  subject text,
+  rule_id integer);
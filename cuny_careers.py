@@ -1,39 +1,65 @@
 """ Clear and re-populate the careers table.
+
+    With --validate, check the query file against the current cuny_institutions table, and report
+    the rows that could not be loaded, but write nothing.
 """
+import argparse
+import sys
+
+from curriculum_db import connect
+from query_csv import QueryReader
+import run_metrics
+import stage_cache
 
-import psycopg2
-import csv
+parser = argparse.ArgumentParser()
+parser.add_argument('--validate', '-v', action='store_true')  # check only; no writes
+args = parser.parse_args()
 
-db = psycopg2.connect('dbname=cuny_curriculum')
+db = connect()
+if args.validate:
+  db.set_session(readonly=True)
 cur = db.cursor()
-cur.execute('drop table if exists cuny_careers cascade')
-cur.execute(
-    """
-    create table cuny_careers (
-    institution text references cuny_institutions,
-    career text,
-    description text,
-    is_graduate boolean,
-    primary key (institution, career))
-    """)
-with open('./latest_queries/ACAD_CAREER_TBL.csv') as csvfile:
-  csv_reader = csv.reader(csvfile)
-  cols = None
-  for row in csv_reader:
-    if cols is None:
-      row[0] = row[0].replace('\ufeff', '')
-      cols = [val.lower().replace(' ', '_').replace('/', '_') for val in row]
-    else:
-      if row[cols.index('institution')] in ['UAPC1', 'MHC01']:
-        continue
-      is_graduate = 0
-      if row[cols.index('graduate')] == 'Y':
-        is_graduate = 1
-      q = """insert into cuny_careers values('{}', '{}', '{}', cast({} as boolean))""".format(
-          row[cols.index('institution')],
-          row[cols.index('career')],
-          row[cols.index('descr')],
-          is_graduate)
-      cur.execute(q)
-  db.commit()
-  db.close()
+if not args.validate:
+  cur.execute('drop table if exists cuny_careers cascade')
+  cur.execute(
+      """
+      create table cuny_careers (
+      institution text references cuny_institutions,
+      career text,
+      description text,
+      is_graduate boolean,
+      primary key (institution, career))
+      """)
+known_institutions = stage_cache.table_keys('cuny_institutions', 'code')
+career_keys = set()
+errors = []
+reader = QueryReader('./latest_queries/ACAD_CAREER_TBL.csv')
+institution, graduate, career, descr = [reader.index[column] for column in
+                                        ['institution', 'graduate', 'career', 'descr']]
+for row in reader:
+  run_metrics.read()
+  if row[institution] in ['UAPC1', 'MHC01']:
+    run_metrics.reject('ignored institution')
+    continue
+  if args.validate:
+    if row[institution] not in known_institutions:
+      errors.append(f'Unknown institution {row[institution]} for career {row[career]}')
+    if (row[institution], row[career]) in career_keys:
+      errors.append(f'Duplicate career {row[career]} at {row[institution]}')
+    career_keys.add((row[institution], row[career]))
+    continue
+  is_graduate = 0
+  if row[graduate] == 'Y':
+    is_graduate = 1
+  q = """insert into cuny_careers values('{}', '{}', '{}', cast({} as boolean))""".format(
+      row[institution],
+      row[career],
+      row[descr],
+      is_graduate)
+  cur.execute(q)
+  run_metrics.wrote()
+db.commit()
+db.close()
+if errors:
+  print('\n'.join(errors), file=sys.stderr)
+  sys.exit(f'{len(errors):,} careers can’t be loaded')
@@ -0,0 +1,31 @@
+-- Keys and indexes for the tables created by create_cuny_courses.sql.
+--
+-- The tables are created without them, so populate_cuny_courses.py can bulk-load the rows without
+-- maintaining indexes or checking foreign keys one row at a time. update_db runs this file in
+-- parallel with transfer_rules_constraints.sql once all the tables are loaded. A duplicate key or
+-- a dangling reference fails the update, and the error, with the offending key values, is in
+-- update_cuny_courses_constraints.log.
+
+set maintenance_work_mem = '1GB';
+
+alter table course_attributes
+  add primary key (name, value);
+
+alter table cuny_courses
+  add primary key (course_id, offer_nbr),
+  add foreign key (equivalence_group) references crse_equiv_tbl,
+  add foreign key (institution) references cuny_institutions,
+  add foreign key (cuny_subject) references cuny_subjects,
+  add foreign key (department) references cuny_departments,
+  add foreign key (designation) references designations,
+  add foreign key (institution, career) references cuny_careers,
+  add foreign key (institution, discipline) references cuny_disciplines;
+create index on cuny_courses (institution, discipline, cat_num);
+create index on cuny_courses using gin (attribute_values);
+
+alter table course_attribute_map
+  add primary key (course_id, offer_nbr, name, value),
+  add foreign key (course_id, offer_nbr) references cuny_courses;
+create index on course_attribute_map (name, value);
+create index on course_attribute_map (value);
+create index on course_attribute_map (course_id, offer_nbr) where is_bkcr;
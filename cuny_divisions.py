@@ -1,21 +1,31 @@
 #! /usr/local/bin/python3
 """ Make a copy of the CUNYfirst Academic Groups table.
+
+    With --validate, check the query file against the current cuny_institutions table, and report
+    the rows that could not be loaded, but write nothing.
 """
 
+import argparse
 import os
 import re
+import sys
 import csv
 from collections import namedtuple
 from datetime import date, datetime
 
-import psycopg2
-from psycopg2.extras import NamedTupleCursor
+from curriculum_db import connect
+import run_metrics
+import stage_cache
+from ignore_lists import ignore_institutions
 
-db = psycopg2.connect('dbname=cuny_curriculum')
-cursor = db.cursor(cursor_factory=NamedTupleCursor)
+parser = argparse.ArgumentParser()
+parser.add_argument('--validate', '-v', action='store_true')  # check only; no writes
+args = parser.parse_args()
 
-# Institutions that don’t fit our model of undergraduate colleges for within-CUNY transfers.
-ignore_institutions = ['CUNY', 'UAPC1', 'MHC01']
+db = connect()
+if args.validate:
+  db.set_session(readonly=True)
+cursor = db.cursor()
 
 # Get list of known departments
 # departments = dict()
@@ -31,16 +41,20 @@ ignore_institutions = ['CUNY', 'UAPC1', 'MHC01']
 
 # Get names, etc. of known CUNY divisions (“academic groups”) and re-create the divisions table
 cols = None
-cursor.execute('drop table if exists cuny_divisions cascade')
-cursor.execute("""create table cuny_divisions (
-                    institution text references cuny_institutions,
-                    division text not null,
-                    division_name text not null,
-                    status text not null,
-                    effective_date date default('1901-01-01'),
-                    primary key (institution, division)
-                    )
-               """)
+if not args.validate:
+  cursor.execute('drop table if exists cuny_divisions cascade')
+  cursor.execute("""create table cuny_divisions (
+                      institution text references cuny_institutions,
+                      division text not null,
+                      division_name text not null,
+                      status text not null,
+                      effective_date date default('1901-01-01'),
+                      primary key (institution, division)
+                      )
+                 """)
+known_institutions = stage_cache.table_keys('cuny_institutions', 'code')
+division_keys = set()
+errors = []
 
 with open('./latest_queries/ACADEMIC_GROUPS.csv') as csv_file:
   csv_reader = csv.reader(csv_file)
@@ -52,6 +66,13 @@ with open('./latest_queries/ACADEMIC_GROUPS.csv') as csv_file:
       row = Row._make(line)
       if row.institution in ignore_institutions:
         continue
+      if args.validate:
+        if row.institution not in known_institutions:
+          errors.append(f'Unknown institution {row.institution} for division {row.academic_group}')
+        if (row.institution, row.academic_group) in division_keys:
+          errors.append(f'Duplicate division {row.academic_group} at {row.institution}')
+        division_keys.add((row.institution, row.academic_group))
+        continue
       cursor.execute(f"""insert into cuny_divisions values(
                            '{row.institution}',
                            '{row.academic_group}',
@@ -62,3 +83,6 @@ with open('./latest_queries/ACADEMIC_GROUPS.csv') as csv_file:
                       """)
 db.commit()
 db.close()
+if errors:
+  print('\n'.join(errors), file=sys.stderr)
+  sys.exit(f'{len(errors):,} divisions can’t be loaded')
@@ -1,28 +1,44 @@
 #! /usr/local/bin/python3
+# Clear and re-populate the cuny_programs and cuny_subplans tables.
+# With --validate, check the query files against the current cuny_institutions table, and report
+# the rows that could not be loaded, but write nothing.
 
+import argparse
 import csv
-import psycopg2
-from psycopg2.extras import NamedTupleCursor
+import sys
+from curriculum_db import connect
+import run_metrics
+import stage_cache
 
 from collections import namedtuple
 
-db = psycopg2.connect('dbname=cuny_curriculum')
-cursor = db.cursor(cursor_factory=NamedTupleCursor)
+parser = argparse.ArgumentParser()
+parser.add_argument('--validate', '-v', action='store_true')  # check only; no writes
+args = parser.parse_args()
 
-cursor.execute("""
-               drop table if exists cuny_programs;
-               create table cuny_programs (
-               id serial primary key,
-               nys_program_code integer,
-               institution text references cuny_institutions,
-               department text,
-               percent_owned float,
-               academic_plan text,
-               description text,
-               cip_code text,
-               hegis_code text,
-               program_status text)
-               """)
+db = connect()
+if args.validate:
+  db.set_session(readonly=True)
+cursor = db.cursor()
+known_institutions = stage_cache.table_keys('cuny_institutions', 'code')
+subplan_keys = set()
+errors = []
+
+if not args.validate:
+  cursor.execute("""
+                 drop table if exists cuny_programs;
+                 create table cuny_programs (
+                 id serial primary key,
+                 nys_program_code integer,
+                 institution text references cuny_institutions,
+                 department text,
+                 percent_owned float,
+                 academic_plan text,
+                 description text,
+                 cip_code text,
+                 hegis_code text,
+                 program_status text)
+                 """)
 
 with open('./latest_queries/QCCV_PROG_PLAN_ORG.csv') as csvfile:
   reader = csv.reader(csvfile)
@@ -37,7 +53,14 @@ with open('./latest_queries/QCCV_PROG_PLAN_ORG.csv') as csvfile:
         Row = namedtuple('Row', cols)
     else:
       row = Row._make(line)
-      if row.nys_program_code != '' and row.nys_program_code != '0':
+      run_metrics.read()
+      if row.nys_program_code == '' or row.nys_program_code == '0':
+        run_metrics.reject('no NYS program code')
+      elif args.validate:
+        if row.institution not in known_institutions:
+          errors.append(f'Unknown institution {row.institution} for program {row.academic_plan}')
+      else:
+        run_metrics.wrote()
         cursor.execute("""
                        insert into cuny_programs values (
                                                  default, %s, %s, %s, %s, %s, %s, %s, %s, %s)
@@ -62,15 +85,25 @@ with open('./latest_queries/ACAD_SUBPLN_TBL.csv') as csvfile:
                            .replace('-', '') for val in line]
         schema = ', '.join([f'{col} text' for col in cols])
         schema = schema.replace('institution text', 'institution text references cuny_institutions')
-        cursor.execute(f"""
-                        drop table if exists cuny_subplans;
-                        create table cuny_subplans (
-                        {schema},
-                        primary key (institution, plan, subplan))
-                        """)
+        if not args.validate:
+          cursor.execute(f"""
+                          drop table if exists cuny_subplans;
+                          create table cuny_subplans (
+                          {schema},
+                          primary key (institution, plan, subplan))
+                          """)
         Row = namedtuple('Row', cols)
     else:
       row = Row._make(line)
+      run_metrics.read()
+      if args.validate:
+        if row.institution not in known_institutions:
+          errors.append(f'Unknown institution {row.institution} for subplan {row.subplan}')
+        if (row.institution, row.plan, row.subplan) in subplan_keys:
+          errors.append(f'Duplicate subplan {row.plan} {row.subplan} at {row.institution}')
+        subplan_keys.add((row.institution, row.plan, row.subplan))
+        continue
+      run_metrics.wrote()
       values = ', '.join([f"""'{val.replace("'", '’')}'""" for val in row])
       cursor.execute(f"""
                       insert into cuny_subplans values ({values})
@@ -78,3 +111,6 @@ with open('./latest_queries/ACAD_SUBPLN_TBL.csv') as csvfile:
 
 db.commit()
 db.close()
+if errors:
+  print('\n'.join(errors), file=sys.stderr)
+  sys.exit(f'{len(errors):,} programs and subplans can’t be loaded')
@@ -1,6 +1,8 @@
 #! /usr/local/bin/python3
 # Clear and re-populate the table of internal subjects at all cuny colleges (cuny_disciplines).
 # Clear and re-populate the table of external subject areas (cuny_subjects).
+# With --validate, check the query files against the current cuny_institutions and cuny_departments
+# tables, and report the rows that could not be loaded, but write nothing.
 
 import os
 import re
@@ -10,34 +12,44 @@ import csv
 from datetime import date
 from collections import namedtuple
 
-import psycopg2
-from psycopg2.extras import NamedTupleCursor
+from curriculum_db import connect
+import run_metrics
+import stage_cache
 
-from cuny_divisions import ignore_institutions
+from ignore_lists import ignore_institutions
 
 import argparse
 
 parser = argparse.ArgumentParser('Create internal and external subject tables')
 parser.add_argument('--debug', '-d', action='store_true')
+parser.add_argument('--validate', '-v', action='store_true')  # check only; no writes
 args = parser.parse_args()
 
-db = psycopg2.connect('dbname=cuny_curriculum')
-cursor = db.cursor(cursor_factory=NamedTupleCursor)
+db = connect()
+if args.validate:
+  db.set_session(readonly=True)
+cursor = db.cursor()
 
 # Internal subject (disciplines) and external subject area (cuny_subjects) queries
 discp_file = './latest_queries/QNS_CV_CUNY_SUBJECT_TABLE.csv'
 extern_file = './latest_queries/QNS_CV_CUNY_SUBJECTS.csv'
-discp_date = date.fromtimestamp(os.lstat(discp_file).st_birthtime).strftime('%Y-%m-%d')
-extern_date = date.fromtimestamp(os.lstat(extern_file).st_birthtime).strftime('%Y-%m-%d')
-
-cursor.execute("""
-               update updates
-               set update_date = '{}', file_name = '{}'
-               where table_name = 'disciplines'""".format(discp_date, discp_file))
-cursor.execute("""
-               update updates
-               set update_date = '{}', file_name = '{}'
-               where table_name = 'subjects'""".format(extern_date, extern_file))
+# st_birthtime is macOS-only; elsewhere (bench_update.py on Linux) use the modification time.
+discp_stat = os.lstat(discp_file)
+extern_stat = os.lstat(extern_file)
+discp_date = date.fromtimestamp(getattr(discp_stat, 'st_birthtime', discp_stat.st_mtime))\
+    .strftime('%Y-%m-%d')
+extern_date = date.fromtimestamp(getattr(extern_stat, 'st_birthtime', extern_stat.st_mtime))\
+    .strftime('%Y-%m-%d')
+
+if not args.validate:
+  cursor.execute("""
+                 update updates
+                 set update_date = '{}', file_name = '{}'
+                 where table_name = 'disciplines'""".format(discp_date, discp_file))
+  cursor.execute("""
+                 update updates
+                 set update_date = '{}', file_name = '{}'
+                 where table_name = 'subjects'""".format(extern_date, extern_file))
 
 if args.debug:
   print(f'cuny_subjects.py:\n  cuny_disciplines: {discp_file}\n  cuny_subjects: {extern_file}')
@@ -48,18 +60,23 @@ cursor.execute("""
                 from cuny_departments
                """)
 departments = [d.department for d in cursor.fetchall()]
+known_institutions = stage_cache.table_keys('cuny_institutions', 'code')
+errors = []
 
 # CUNY Subjects table
-cursor.execute('drop table if exists cuny_subjects cascade')
-cursor.execute("""
-  create table cuny_subjects (
-  subject text primary key,
-  subject_name text
-  )
-  """)
+if not args.validate:
+  cursor.execute('drop table if exists cuny_subjects cascade')
+  cursor.execute("""
+    create table cuny_subjects (
+    subject text primary key,
+    subject_name text
+    )
+    """)
 
 # Populate cuny_subjects
-cursor.execute("insert into cuny_subjects values('missing', 'MISSING')")
+subjects = {'missing'}
+if not args.validate:
+  cursor.execute("insert into cuny_subjects values('missing', 'MISSING')")
 with open(extern_file) as csvfile:
   csv_reader = csv.reader(csvfile)
   cols = None
@@ -70,6 +87,11 @@ with open(extern_file) as csvfile:
       Row = namedtuple('Row', cols)
     else:
       row = Row._make(line)
+      if row.external_subject_area in subjects:
+        errors.append(f'Duplicate subject {row.external_subject_area}')
+      subjects.add(row.external_subject_area)
+      if args.validate:
+        continue
       q = """insert into cuny_subjects values('{}', '{}')""".format(
           row.external_subject_area,
           row.description.replace("'", "’"))
@@ -77,18 +99,19 @@ with open(extern_file) as csvfile:
   db.commit()
 
 # Disciplines table
-cursor.execute('drop table if exists cuny_disciplines cascade')
-cursor.execute(
-    """
-    create table cuny_disciplines (
-      institution text references cuny_institutions,
-      department text references cuny_departments,
-      discipline text,
-      discipline_name text,
-      status text,
-      cuny_subject text default 'missing' references cuny_subjects,
-      primary key (institution, discipline))
-    """)
+if not args.validate:
+  cursor.execute('drop table if exists cuny_disciplines cascade')
+  cursor.execute(
+      """
+      create table cuny_disciplines (
+        institution text references cuny_institutions,
+        department text references cuny_departments,
+        discipline text,
+        discipline_name text,
+        status text,
+        cuny_subject text default 'missing' references cuny_subjects,
+        primary key (institution, discipline))
+      """)
 
 # Populate disciplines
 
@@ -101,6 +124,14 @@ missing_disciplines = [Discipline._make(x) for x in [
     ('SPS01', 'SPS01', 'HESA', 'Temporary Discipline', 'A', 'ELEC'),
     ('QCC01', 'QCC01', 'ELEC', 'Temporary Discipline', 'A', 'ELEC')]]
 for discp in missing_disciplines:
+  if args.validate:
+    if discp.department not in departments:
+      errors.append(f'Unknown department {discp.department} for discipline {discp.discipline} at '
+                    f'{discp.institution}')
+    if discp.cuny_subject not in subjects:
+      errors.append(f'Unknown subject {discp.cuny_subject} for discipline {discp.discipline} at '
+                    f'{discp.institution}')
+    continue
   cursor.execute(f"""
                   insert into cuny_disciplines values (
                   '{discp.institution}',
@@ -133,6 +164,13 @@ with open(discp_file) as csvfile:
           if discipline_key in discipline_keys:
             continue
           discipline_keys.add(discipline_key)
+          if args.validate:
+            if row.institution not in known_institutions:
+              errors.append(f'Unknown institution {row.institution} for discipline {row.subject}')
+            if external_subject_area not in subjects:
+              errors.append(f'Unknown subject {external_subject_area} for discipline '
+                            f'{row.subject} at {row.institution}')
+            continue
           cursor.execute("""insert into cuny_disciplines values (%s, %s, %s, %s, %s, %s)
                          """, (row.institution,
                                row.acad_org,
@@ -142,3 +180,6 @@ with open(discp_file) as csvfile:
                                external_subject_area))
 db.commit()
 db.close()
+if errors:
+  print('\n'.join(errors), file=sys.stderr)
+  sys.exit(f'{len(errors):,} subjects and disciplines can’t be loaded')
@@ -3,10 +3,14 @@ copy (
 select cuny_subject,
        subject_name,
        string_agg(distinct institution, ', ') as colleges
-from cuny_courses, cuny_subjects
+from cuny_courses c, cuny_subjects
 where subject = cuny_subject
   and course_status = 'A'
   and can_schedule = 'Y'
-  and attributes !~ 'BKCR'
+  and not exists (select 1
+                    from course_attribute_map m
+                   where m.course_id = c.course_id
+                     and m.offer_nbr = c.offer_nbr
+                     and m.is_bkcr)
 group by cuny_subject, subject_name
 order by cuny_subject, colleges) to '/Users/vickery/Desktop/cuny_subjects_by_college.csv' header csv
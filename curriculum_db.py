@@ -0,0 +1,179 @@
+""" Access to the cuny_curriculum db, shared by the scripts in this repo.
+
+    connect()       A connection to the db. Later calls in the same process get the same connection
+                    back, unless they ask for a new one (for a second transaction or thread). The
+                    DSN comes from the CUNY_CURRICULUM_DSN environment variable, and defaults to
+                    dbname=cuny_curriculum. Rows are named tuples.
+    close_all()     Close the connections connect() has handed out, as exiting would, between
+                    stages that run in the same process (see run_stages.py).
+    server_rows()   Iterate over the rows of a large query through a named (server-side) cursor,
+                    batch_size rows at a time, so the client never holds the whole result.
+    Prepared        A statement prepared once and then executed with different parameters, for
+                    lookups and inserts repeated once per row of a query file.
+    query_times     The number of executions and total time of each statement run through these
+                    connections, including the time spent fetching server_rows() batches. Reported
+                    on stderr at exit if CUNY_CURRICULUM_QUERY_TIMES is set.
+"""
+import atexit
+import itertools
+import os
+import re
+import sys
+import threading
+
+from collections import defaultdict
+from time import perf_counter
+
+import psycopg2
+from psycopg2.extras import NamedTupleCursor
+
+DSN = os.getenv('CUNY_CURRICULUM_DSN', 'dbname=cuny_curriculum')
+
+# Statement (whitespace collapsed) => [executions, seconds]
+query_times = defaultdict(lambda: [0, 0.0])
+_query_times_lock = threading.Lock()
+
+_connections = dict()
+_cursor_numbers = itertools.count(1)
+
+
+# _record_time()
+# -------------------------------------------------------------------------------------------------
+def _record_time(query, seconds):
+  statement = ' '.join(str(query).split())
+  with _query_times_lock:
+    times = query_times[statement]
+    times[0] += 1
+    times[1] += seconds
+
+
+# class TimedCursor
+# -------------------------------------------------------------------------------------------------
+class TimedCursor(NamedTupleCursor):
+  """ NamedTupleCursor that adds the time each statement takes to query_times.
+  """
+
+  def execute(self, query, vars=None):
+    start = perf_counter()
+    try:
+      return super().execute(query, vars)
+    finally:
+      _record_time(query, perf_counter() - start)
+
+  def copy_expert(self, sql, file, size=8192):
+    start = perf_counter()
+    try:
+      return super().copy_expert(sql, file, size)
+    finally:
+      _record_time(sql, perf_counter() - start)
+
+
+# connect()
+# -------------------------------------------------------------------------------------------------
+def connect(dsn=None, new=False):
+  """ Connection to dsn (default DSN). The connection is reused by later calls unless new is True;
+      a new connection is not reused.
+  """
+  if dsn is None:
+    dsn = DSN
+  if not new:
+    conn = _connections.get(dsn)
+    if conn is not None and not conn.closed:
+      return conn
+  conn = psycopg2.connect(dsn, cursor_factory=TimedCursor)
+  if not new:
+    _connections[dsn] = conn
+  return conn
+
+
+# close_all()
+# -------------------------------------------------------------------------------------------------
+def close_all():
+  """ Close the shared connections. Uncommitted work is rolled back, as it would be if the
+      process exited.
+  """
+  for conn in _connections.values():
+    if not conn.closed:
+      conn.close()
+  _connections.clear()
+
+
+# server_rows()
+# -------------------------------------------------------------------------------------------------
+def server_rows(query, vars=None, batch_size=2000, conn=None):
+  """ Generate the rows of query from a named (server-side) cursor, fetching batch_size rows at a
+      time. The cursor lasts until the end of the transaction, so do not commit on the connection
+      (default: connect()) until the rows have all been read.
+  """
+  if conn is None:
+    conn = connect()
+  cursor = conn.cursor(name=f'server_rows_{next(_cursor_numbers)}')
+  cursor.itersize = batch_size
+  # The rows come back a batch at a time while the cursor is iterated, so time that too.
+  fetch_seconds = 0.0
+  try:
+    cursor.execute(query, vars)
+    rows = iter(cursor)
+    while True:
+      start = perf_counter()
+      try:
+        row = next(rows)
+      except StopIteration:
+        break
+      finally:
+        fetch_seconds += perf_counter() - start
+      yield row
+  finally:
+    _record_time(f'fetch from {query}', fetch_seconds)
+    cursor.close()
+
+
+# class Prepared
+# -------------------------------------------------------------------------------------------------
+class Prepared:
+  """ A statement, with %s placeholders, that is parsed and planned once, by PREPARE, instead of
+      each time it is executed. Prepared statements belong to cursor’s connection, so name must be
+      unique on it.
+  """
+
+  def __init__(self, cursor, name, query):
+    self.cursor = cursor
+    self.name = name
+    numbers = itertools.count(1)
+    cursor.execute(f'prepare {name} as ' + re.sub('%s', lambda match: f'${next(numbers)}', query))
+    num_params = next(numbers) - 1
+    self.statement = f'execute {name}'
+    if num_params > 0:
+      self.statement += f' ({", ".join(num_params * ["%s"])})'
+
+  def execute(self, params=()):
+    """ Execute the statement with params, and return the cursor for fetching the results.
+    """
+    self.cursor.execute(self.statement, params)
+    return self.cursor
+
+
+# reset_query_times()
+# -------------------------------------------------------------------------------------------------
+def reset_query_times():
+  """ Start query_times over, as for each stage run_stages.py profiles.
+  """
+  with _query_times_lock:
+    query_times.clear()
+
+
+# report_query_times()
+# -------------------------------------------------------------------------------------------------
+def report_query_times(file=sys.stderr, limit=20):
+  """ The limit statements that took the most total time.
+  """
+  with _query_times_lock:
+    times = sorted(query_times.items(), key=lambda item: item[1][1], reverse=True)
+  print(f'{"Count":>9} {"Total sec":>10} {"Mean ms":>9}  Statement', file=file)
+  for statement, (count, seconds) in times[:limit]:
+    print(f'{count:9,} {seconds:10.3f} {1000 * seconds / count:9.3f}  {statement[:100]}',
+          file=file)
+
+
+if os.getenv('CUNY_CURRICULUM_QUERY_TIMES'):
+  atexit.register(report_query_times)
@@ -1,28 +1,48 @@
 # Clear and re-populate the (requirement) designations table.
+# With --validate, check the query file for duplicate designations, but write nothing.
+import argparse
+import sys
 
-import psycopg2
-import csv
+from curriculum_db import connect
+from query_csv import QueryReader
+import run_metrics
 
-db = psycopg2.connect('dbname=cuny_curriculum')
+parser = argparse.ArgumentParser()
+parser.add_argument('--validate', '-v', action='store_true')  # check only; no writes
+args = parser.parse_args()
+
+db = connect()
+if args.validate:
+  db.set_session(readonly=True)
 cur = db.cursor()
-cur.execute('drop table if exists designations cascade')
-cur.execute("""
-    create table designations (
-    designation text primary key,
-    description text)
-    """)
-with open('./latest_queries/QCCV_RQMNT_DESIG_TBL.csv') as csvfile:
-  csv_reader = csv.reader(csvfile)
-  cols = None
-  for row in csv_reader:
-    if cols == None:
-      row[0] = row[0].replace('\ufeff', '')
-      cols = [val.lower().replace(' ', '_').replace('/', '_') for val in row]
-    else:
-      q = """insert into designations values('{}', '{}')""".format(
-          row[cols.index('designation')],
-          row[cols.index('formal_description')].replace('l&Q', 'l & Q').replace('eR', 'e R'))
-      cur.execute(q)
+if not args.validate:
+  cur.execute('drop table if exists designations cascade')
+  cur.execute("""
+      create table designations (
+      designation text primary key,
+      description text)
+      """)
+reader = QueryReader('./latest_queries/QCCV_RQMNT_DESIG_TBL.csv')
+designation = reader.index['designation']
+formal_description = reader.index['formal_description']
+designations = {''}  # 'No Designation', added below
+errors = []
+for row in reader:
+  run_metrics.read()
+  if args.validate:
+    if row[designation] in designations:
+      errors.append(f'Duplicate designation {row[designation]!r}')
+    designations.add(row[designation])
+    continue
+  q = """insert into designations values('{}', '{}')""".format(
+      row[designation],
+      row[formal_description].replace('l&Q', 'l & Q').replace('eR', 'e R'))
+  cur.execute(q)
+  run_metrics.wrote()
+if not args.validate:
   cur.execute("insert into designations values ('', 'No Designation')")
-  db.commit()
-  db.close()
+db.commit()
+db.close()
+if errors:
+  print('\n'.join(errors), file=sys.stderr)
+  sys.exit(f'{len(errors):,} designations can’t be loaded')
@@ -18,42 +18,65 @@
 # transfer_rule.id values in the db.
 #
 # You have to edit the COPY statement in the dump to account for the new table schema first.
-import psycopg2
-from psycopg2.extras import NamedTupleCursor
+#
+# All the rule ids are read in a single query before the dump is processed, so the time it takes
+# depends on the size of the dump rather than on the number of lookups. Unmatched lines are
+# reported the same way they were when each line was looked up separately.
+from curriculum_db import connect, server_rows
 
 import re
 import sys
 
-conn = psycopg2.connect('dbname=cuny_curriculum')
-cursor = conn.cursor(cursor_factory=NamedTupleCursor)
+from collections import defaultdict
 
-for line in sys.stdin:
-  if line.startswith('COPY'):
-    line = 'COPY public.events (id, rule_id, event_type, who, what, event_time) FROM stdin;'
-  # If a line starts with a digit (event.id), use the (source, destination, subject, group) columns
-  # to look up the corresponding transfer_rules.id, and replace them with it.
-  if line[0].isdigit():
-    fields = line.split('\t')
-    cursor.execute("""
+conn = connect()
+cursor = conn.cursor()
+
+lookup_query = """
                    select id
                      from transfer_rules
                     where source_institution = %s
                       and destination_institution = %s
                       and subject_area = %s
                       and group_number = %s
-                   """, (fields[1],
-                         fields[4],
-                         fields[2],
-                         fields[3]))
-    if cursor.rowcount != 1:
-      print(f'\n{line}\n{cursor.query} returned {cursor.rowcount} rows', file=sys.stderr)
+                   """
+
+# Map (source_institution, destination_institution, subject_area, group_number) to rule ids.
+rule_ids = defaultdict(list)
+for rule in server_rows("""
+                        select id, source_institution, destination_institution, subject_area,
+                               group_number
+                          from transfer_rules
+                        """):
+  rule_ids[(rule.source_institution,
+            rule.destination_institution,
+            rule.subject_area,
+            rule.group_number)].append(rule.id)
+
+for line in sys.stdin:
+  if line.startswith('COPY'):
+    line = 'COPY persistent.events (id, rule_id, event_type, who, what, event_time) FROM stdin;'
+  # If a line starts with a digit (event.id), use the (source, destination, subject, group) columns
+  # to look up the corresponding transfer_rules.id, and replace them with it.
+  if line[0].isdigit():
+    fields = line.split('\t')
+    try:
+      ids = rule_ids.get((fields[1], fields[4], fields[2], int(fields[3])), [])
+    except ValueError:
+      ids = []
+    if len(ids) != 1:
+      query = cursor.mogrify(lookup_query, (fields[1],
+                                            fields[4],
+                                            fields[2],
+                                            fields[3]))
+      print(f'\n{line}\n{query} returned {len(ids)} rows', file=sys.stderr)
       continue
     else:
       fields.pop(1)
       fields.pop(1)
       fields.pop(1)
       fields.pop(1)
-      fields.insert(1, f'{cursor.fetchone()[0]}')
+      fields.insert(1, f'{ids[0]}')
       line = '\t'.join(fields)
   # print the line, which may or may not have been altered above.
   print(line.strip('\n'))
@@ -0,0 +1,10 @@
+""" Institutions and departments that the populate scripts leave out.
+    These used to be defined in cuny_divisions.py and cuny_departments.py, but those scripts rebuild
+    their tables when they are imported, so the lists live here, where they can be imported without
+    touching the db (as populate_*.py --validate must).
+"""
+
+# Institutions that don’t fit our model of undergraduate colleges for within-CUNY transfers.
+ignore_institutions = ['CUNY', 'UAPC1', 'MHC01']
+
+ignore_departments = ['PEES-BKL', 'SOC-YRK', 'JOUR-GRD']
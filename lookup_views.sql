@@ -0,0 +1,67 @@
+-- Materialized views that pre-join the shapes of the Transfer Explorer’s most frequent rule lookups:
+--   rules_by_subject  Rules by (source_institution, destination_institution, subject), from
+--                     transfer_rules and subject_rule_map.
+--   rule_courses      The sending and receiving courses of each rule, with their catalog titles and
+--                     credits, from source_courses, destination_courses, and cuny_courses.
+-- Each has a unique index so it can be refreshed concurrently (refresh_lookup_views.sql) without
+-- blocking readers; update_db does that at the end, after setting the rules’ review statuses.
+
+drop materialized view if exists rules_by_subject cascade;
+create materialized view rules_by_subject as
+  select r.source_institution,
+         r.destination_institution,
+         m.subject,
+         r.id as rule_id,
+         r.rule_key,
+         r.priority,
+         r.review_status,
+         r.effective_date
+    from transfer_rules r, subject_rule_map m
+   where m.rule_id = r.id;
+create unique index on rules_by_subject
+  (source_institution, destination_institution, subject, rule_id);
+
+drop materialized view if exists rule_courses cascade;
+create materialized view rule_courses as
+  select s.rule_id,
+         r.rule_key,
+         'S'::char(1) as direction,
+         s.id as course_row,  -- source_courses.id
+         s.course_id,
+         s.offer_nbr,
+         s.discipline,
+         s.catalog_number,
+         s.cat_num,
+         c.title,
+         s.min_credits,
+         s.max_credits,
+         null::real as transfer_credits,
+         s.credits_source,
+         s.min_gpa,
+         s.max_gpa,
+         c.course_status
+    from source_courses s
+         join transfer_rules r on r.id = s.rule_id
+         left join cuny_courses c on c.course_id = s.course_id and c.offer_nbr = s.offer_nbr
+  union all
+  select d.rule_id,
+         r.rule_key,
+         'D'::char(1) as direction,
+         d.id as course_row,  -- destination_courses.id
+         d.course_id,
+         d.offer_nbr,
+         d.discipline,
+         d.catalog_number,
+         d.cat_num,
+         c.title,
+         c.min_credits,
+         c.max_credits,
+         d.transfer_credits,
+         null as credits_source,
+         null::real as min_gpa,
+         null::real as max_gpa,
+         c.course_status
+    from destination_courses d
+         join transfer_rules r on r.id = d.rule_id
+         left join cuny_courses c on c.course_id = d.course_id and c.offer_nbr = d.offer_nbr;
+create unique index on rule_courses (rule_id, direction, course_row);
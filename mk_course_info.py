@@ -24,49 +24,39 @@
 """
 
 import sys
-import csv
 from collections import namedtuple
 
-import psycopg2
+from curriculum_db import connect
+import query_cache
 
-conn = psycopg2.connect('dbname=vickery')
+conn = connect('dbname=vickery')
 cursor = conn.cursor()
 
-with open('./latest_queries/QNS_QCCV_CU_CATALOG_NP.csv') as csvfile:
-  csv_reader = csv.reader(csvfile)
-  raw = next(csv_reader)
-  raw[0] = raw[0].replace('\ufeff', '')
-  Row = namedtuple('Row', [val.lower().replace(' ', '_').replace('/', '_') for val in raw])
-  create_query = """
+catalog = query_cache.load('./latest_queries/QNS_QCCV_CU_CATALOG_NP.csv', header='Institution')
+Row = namedtuple('Row', catalog.columns)
+create_query = """
 drop table if exists course_info;
 create table course_info (\n
 """
-  for field in range(len(Row._fields)):
-    create_query = create_query + f'  {Row._fields[field]} text,\n'
-  create_query = create_query + 'primary key(course_id, offer_nbr))'
-  print(create_query)
-  cursor.execute(create_query)
-  # prev_raw = next(csv_reader, False)
-  prev_raw = raw
-  raw = next(csv_reader, False)
+for field in range(len(Row._fields)):
+  create_query = create_query + f'  {Row._fields[field]} text,\n'
+create_query = create_query + 'primary key(course_id, offer_nbr))'
+print(create_query)
+cursor.execute(create_query)
 
-  n = 1
-  # populate the table
-  while raw:
-    # if raw == prev_raw:
-    #   continue
-    n = n + 1
-    print(f'Row {n:,}\r', end='', file=sys.stderr)
-    row = Row._make(raw)
-    query = 'insert into course_info values(\n'
-    for value in row:
-      query = query + '%s,'
-    query = query.strip(',') + ') on conflict do nothing'
-    cursor.execute(query, [value for value in row])
-    if cursor.rowcount != 1:
-      print(f'\nIgnoring duplicate record(s) at row {n}: {raw}\n')
-    prev_raw = raw
-    raw = next(csv_reader, False)
+n = 1
+# populate the table
+for raw in catalog:
+  n = n + 1
+  print(f'Row {n:,}\r', end='', file=sys.stderr)
+  row = Row._make(raw)
+  query = 'insert into course_info values(\n'
+  for value in row:
+    query = query + '%s,'
+  query = query.strip(',') + ') on conflict do nothing'
+  cursor.execute(query, [value for value in row])
+  if cursor.rowcount != 1:
+    print(f'\nIgnoring duplicate record(s) at row {n}: {raw}\n')
 print('', file=sys.stderr)
 query = """
 CREATE OR REPLACE FUNCTION text_to_integer(chartoconvert character varying)
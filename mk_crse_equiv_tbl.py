@@ -7,6 +7,8 @@
 
       It would be interesting, for example, to see what Pathways courses are designated by virtue of
       being part of an equivalence group rather than having been reviewed by the CCCRC.
+
+    With --validate, check the query file for duplicate groups, but write nothing.
 """
 import os
 import csv
@@ -15,12 +17,13 @@ import argparse
 
 from collections import namedtuple
 
-import psycopg2
-from psycopg2.extras import NamedTupleCursor
+from curriculum_db import connect
+import run_metrics
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--debug', '-d', action='store_true')
 parser.add_argument('--progress', '-p', action='store_true')
+parser.add_argument('--validate', '-v', action='store_true')  # check only; no writes
 args = parser.parse_args()
 
 try:
@@ -30,15 +33,20 @@ except OSError as e:
   terminal = open('/dev/null', 'wt')
 
 num_rows = 0
-conn = psycopg2.connect('dbname=cuny_curriculum')
-cursor = conn.cursor(cursor_factory=NamedTupleCursor)
+conn = connect()
+if args.validate:
+  conn.set_session(readonly=True)
+cursor = conn.cursor()
 
-cursor.execute("""
-  drop table if exists crse_equiv_tbl cascade;
-  create table crse_equiv_tbl (
-    equivalent_course_group integer primary key,
-    description text)
-""")
+if not args.validate:
+  cursor.execute("""
+    drop table if exists crse_equiv_tbl cascade;
+    create table crse_equiv_tbl (
+      equivalent_course_group integer primary key,
+      description text)
+  """)
+groups = set()
+errors = []
 
 total_rows = sum(1 for line in open('./latest_queries/QNS_CV_CRSE_EQUIV_TBL.csv'))
 with open('./latest_queries/QNS_CV_CRSE_EQUIV_TBL.csv') as csvfile:
@@ -54,13 +62,24 @@ with open('./latest_queries/QNS_CV_CRSE_EQUIV_TBL.csv') as csvfile:
       print(f'{num_rows:,} / {total_rows:,}\r', end='', file=terminal)
     row = Equiv_Table_Row._make(raw)
     try:
-      int(row.equivalent_course_group)
-      cursor.execute('insert into crse_equiv_tbl values (%s, %s)', (row.equivalent_course_group,
-                                                                    row.description))
+      group = int(row.equivalent_course_group)
+      if args.validate:
+        if group in groups:
+          errors.append(f'Duplicate equivalent course group {group}')
+        groups.add(group)
+      else:
+        cursor.execute('insert into crse_equiv_tbl values (%s, %s)',
+                       (row.equivalent_course_group, row.description))
+        run_metrics.wrote()
     except ValueError:
       print('Invalid Index:', row)
+      run_metrics.reject('invalid equivalent course group')
     raw = next(csv_reader, False)   # next data row
   if args.progress:
     print(file=terminal)
+run_metrics.read(num_rows)
 conn.commit()
 conn.close()
+if errors:
+  print('\n'.join(errors), file=sys.stderr)
+  sys.exit(f'{len(errors):,} equivalent course groups can’t be loaded')
@@ -1,7 +1,8 @@
 #! /usr/local/bin/python3
-""" Speed up transfer rule lookups.
-    1. Create the eponymous subject-rule map table.
-    2. Index the rule_id field of source_courses and destination_courses
+""" Speed up transfer rule lookups: populate the eponymous subject-rule map table, which is created
+    by create_transfer_rules.sql.
+    Its keys, and the indexes on the rule_id fields of source_courses and destination_courses, are
+    added after all the tables are loaded, by transfer_rules_constraints.sql.
 """
 import os
 import sys
@@ -12,8 +13,8 @@ from collections import namedtuple
 from datetime import date
 from time import perf_counter
 
-import psycopg2
-from psycopg2.extras import NamedTupleCursor
+from curriculum_db import connect
+import run_metrics
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--debug', '-d', action='store_true')
@@ -28,49 +29,21 @@ except OSError as e:
 
 app_start = perf_counter()
 
-db = psycopg2.connect('dbname=cuny_curriculum')
-cursor = db.cursor(cursor_factory=NamedTupleCursor)
+db = connect()
+cursor = db.cursor()
 
 # Using the subject_rule_map table (instead of putting source subjects in a colon-delimited string
 # in each rule) gives a 1.97 speedup of rule lookups in do_form_2()
 if args.progress:
   print('\n  Create subject-rule map', file=terminal)
-cursor.execute("""
-    drop table if exists subject_rule_map;
-    create table subject_rule_map (
-    subject text references cuny_subjects,
-    rule_id integer references transfer_rules,
-    primary key (subject, rule_id))""")
-cursor.execute('select id, source_subjects from transfer_rules')
-num_rules = cursor.rowcount
-count = 0
-for rule in cursor.fetchall():
-  count += 1
-  if args.progress and (0 == count % 10000):
-    print(f'    {count:,}/{num_rules:,}', end='\r', file=terminal)
-  subjects = rule.source_subjects.strip(':').split(':')
-  for subject in subjects:
-    cursor.execute('insert into subject_rule_map values(%s, %s)', (subject, rule.id))
-
-# Creating indexes on the rule_id fields of source_courses and destination_courses gives an
-# (unmeasured but really big) speedup in looking up source and destination courses in do_form_2().
-
-if args.progress:
-  end_map = perf_counter() - app_start
-  print(f'\n    That took {end_map:0.1f} seconds.', file=terminal)
-  print('  Index source_courses', file=terminal)
-cursor.execute('create index on source_courses (rule_id)')
-
-if args.progress:
-  end_index_src = perf_counter() - end_map
-  print(f'    That took {end_index_src:0.1f} seconds.', file=terminal)
-  print('  Index destination_courses', file=sys.stderr)
-cursor.execute('create index on destination_courses (rule_id)')
+cursor.execute('truncate subject_rule_map')
+cursor.execute("""insert into subject_rule_map
+                  select unnest(source_subjects), id from transfer_rules""")
+run_metrics.wrote(cursor.rowcount)
 
 if args.progress:
-  end_index_dst = perf_counter() - end_index_src
-  print(f'    That took {end_index_dst:0.1f} seconds.', file=terminal)
   app_end = perf_counter() - app_start
+  print(f'    {cursor.rowcount:,} subject-rule pairs', file=terminal)
   print(f'\n  Completed in {app_end:0.1f} seconds.', file=terminal)
 
 db.commit()
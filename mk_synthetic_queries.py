@@ -0,0 +1,499 @@
+#! /usr/local/bin/python3
+""" Write synthetic versions of the CUNYfirst query files update_db needs, for benchmarking and for
+    trying out growth scenarios without a real query drop.
+
+    One file is written for each query in required_queries.py’s run_control_ids, named the way
+    check_queries.py leaves them in latest_queries, with the columns the scripts in this repo read.
+    The catalog and the internal transfer rules are scaled by --scale (1 is about the volume of the
+    current query files); the organizational tables (colleges, divisions, departments, disciplines)
+    are the same size at any scale, because CUNY does not add colleges when its catalog grows.
+
+    The data are random, but generated from a seed, and shaped like the real files:
+      * Some course_ids are cross-listed, with two or three offer_nbrs in different disciplines.
+      * Courses have one row per component in the catalog query, and a few have inconsistent
+        contact hours, for check_total_hours.py to find.
+      * Course attributes follow the skew of the real ones (most courses have none, Pathways is the
+        most common), and a few courses reference attributes that are not in SR742A.
+      * Most rules accept any passing grade, but some are split into GPA ranges that send a course
+        to different destination courses.
+      * A small fraction of rule rows reference missing courses, ignored colleges, or have no
+        “transfer course” flag, so the conflict-handling paths in populate_transfer_rules.py run.
+"""
+import argparse
+import csv
+import os
+import re
+
+from collections import defaultdict, namedtuple
+from pathlib import Path
+from random import Random
+from time import perf_counter, time
+
+from ignore_lists import ignore_institutions
+from required_queries import required_query_names
+
+# Number of catalog rows (course_id, offer_nbr) and internal transfer rule rows at --scale 1. These
+# approximate the recent CUNYfirst query files; adjust them if the real volumes drift.
+BASE_COURSES = 60000
+BASE_RULE_ROWS = 1250000
+
+# (subject, name, cip_code, hegis_code): the disciplines colleges choose from, and the external
+# subject areas they map to. ELEC is only an external subject area; cuny_subjects.py adds the
+# QCC01 ELEC and SPS01 HESA disciplines itself.
+subjects = [('ACCT', 'Accounting', '52.0301', '0502'),
+            ('AFST', 'Africana Studies', '05.0201', '2211'),
+            ('ANTH', 'Anthropology', '45.0201', '2202'),
+            ('ARAB', 'Arabic', '16.1101', '1107'),
+            ('ARTH', 'Art History', '50.0703', '1003'),
+            ('ARTS', 'Studio Art', '50.0702', '1002'),
+            ('ASTR', 'Astronomy', '40.0201', '1911'),
+            ('BIOL', 'Biology', '26.0101', '0401'),
+            ('BUS', 'Business', '52.0101', '0501'),
+            ('CHEM', 'Chemistry', '40.0501', '1905'),
+            ('CHIN', 'Chinese', '16.0301', '1107'),
+            ('CMST', 'Communication Studies', '09.0101', '0601'),
+            ('CSCI', 'Computer Science', '11.0701', '0701'),
+            ('DANC', 'Dance', '50.0301', '1008'),
+            ('ECON', 'Economics', '45.0601', '2204'),
+            ('EDUC', 'Education', '13.0101', '0801'),
+            ('ELEC', 'Elective', '24.0101', '4901'),
+            ('ENGL', 'English', '23.0101', '1501'),
+            ('ENVS', 'Environmental Science', '03.0104', '0420'),
+            ('FREN', 'French', '16.0901', '1102'),
+            ('GEOL', 'Geology', '40.0601', '1914'),
+            ('HIST', 'History', '54.0101', '2205'),
+            ('HLTH', 'Health Education', '51.0001', '0837'),
+            ('ITAL', 'Italian', '16.0902', '1104'),
+            ('JOUR', 'Journalism', '09.0401', '0602'),
+            ('LBST', 'Labor Studies', '52.1002', '0516'),
+            ('LING', 'Linguistics', '16.0102', '1505'),
+            ('MATH', 'Mathematics', '27.0101', '1701'),
+            ('MUSC', 'Music', '50.0901', '1005'),
+            ('NURS', 'Nursing', '51.3801', '1203'),
+            ('PHIL', 'Philosophy', '38.0101', '1509'),
+            ('PHYS', 'Physics', '40.0801', '1902'),
+            ('POLS', 'Political Science', '45.1001', '2207'),
+            ('PSYC', 'Psychology', '42.0101', '2001'),
+            ('SOC', 'Sociology', '45.1101', '2208'),
+            ('SPAN', 'Spanish', '16.0905', '1105'),
+            ('STAT', 'Statistics', '27.0501', '1702'),
+            ('THEA', 'Theatre', '50.0501', '1007'),
+            ('URBS', 'Urban Studies', '45.1201', '2214'),
+            ('WGST', 'Women’s and Gender Studies', '05.0207', '4903')]
+subject_names = {subject: name for subject, name, cip, hegis in subjects}
+
+divisions = [('ARTS', 'Arts and Humanities'),
+             ('SCI', 'Mathematics and Natural Sciences'),
+             ('SOCSC', 'Social Sciences'),
+             ('EDUC', 'Education'),
+             ('BUS', 'Business'),
+             ('HLTH', 'Health Sciences'),
+             ('PROF', 'Professional Studies')]
+
+designations = [('FCER', 'Flexible Core - Creative Expression'),
+                ('FCWR', 'Flexible Core - World Cultures & Global Issues'),
+                ('FIS', 'Flexible Core - Individual & Society'),
+                ('FSW', 'Flexible Core - Scientific World'),
+                ('FUSR', 'Flexible Core - US Experience in its Diversity'),
+                ('RECR', 'Required Core - English Composition'),
+                ('RLPR', 'Required Core - Life & Physical Sciences'),
+                ('RMQR', 'Required Core - Math & Quantitative Reasoning'),
+                ('RLA', 'Regular Liberal Arts'),
+                ('RNL', 'Regular Non-Liberal Arts'),
+                ('GLA', 'Graduate Liberal Arts'),
+                ('GNL', 'Graduate Non-Liberal Arts')]
+
+# (name, value, description, relative frequency)
+attributes = [('PATH', 'EC', 'Pathways: English Composition', 8),
+              ('PATH', 'MQR', 'Pathways: Math & Quantitative Reasoning', 6),
+              ('PATH', 'LPS', 'Pathways: Life & Physical Sciences', 6),
+              ('PATH', 'WCGI', 'Pathways: World Cultures & Global Issues', 10),
+              ('PATH', 'USED', 'Pathways: US Experience in its Diversity', 8),
+              ('PATH', 'CE', 'Pathways: Creative Expression', 9),
+              ('PATH', 'IS', 'Pathways: Individual & Society', 9),
+              ('PATH', 'SW', 'Pathways: Scientific World', 7),
+              ('BKCR', 'Y', 'Bachelor’s Degree Credit', 12),
+              ('WRIC', 'Y', 'Writing Intensive', 6),
+              ('HONR', 'Y', 'Honors', 3),
+              ('ZTC', 'Y', 'Zero Textbook Cost', 4),
+              ('MODE', 'ONLN', 'Fully Online', 3),
+              ('MODE', 'HYBR', 'Hybrid', 2),
+              ('SERV', 'Y', 'Service Learning', 1)]
+attribute_weights = [weight for *attribute, weight in attributes]
+
+title_patterns = ['Introduction to {}', 'Principles of {}', 'Topics in {}', 'Seminar in {}',
+                  'Advanced {}', 'Intermediate {}', 'Research in {}', '{} for Non-Majors',
+                  'Independent Study in {}', 'Methods of {}', 'History of {}', '{} Laboratory']
+components = [('LEC', 'Lecture'), ('LAB', 'Laboratory'), ('REC', 'Recitation'),
+              ('SEM', 'Seminar'), ('IND', 'Independent Study')]
+effective_dates = ['08/25/2013', '01/27/2015', '08/26/2016', '06/01/2018', '01/02/2020',
+                   '08/26/2021', '01/25/2023']
+
+Course = namedtuple('Course', """course_id offer_nbr institution discipline catalog_number
+                                 cuny_subject min_credits max_credits""")
+
+# Header rows, in the column order of the CUNYfirst queries.
+headers = {
+    'ACAD_CAREER_TBL': ['Institution', 'Career', 'Eff Date', 'Status', 'Descr', 'Short Desc',
+                        'Graduate'],
+    'ACAD_SUBPLN_TBL': ['Institution', 'Plan', 'Subplan', 'Eff Date', 'Status', 'Subplan Type',
+                        'Description', 'Diploma Description'],
+    'ACADEMIC_GROUPS': ['Institution', 'Academic Group', 'Effective Date', 'Status',
+                        'Description'],
+    'QCCV_PROG_PLAN_ORG': ['Institution', 'Academic Plan', 'Academic Organization',
+                           'Percent Owned', 'Transcript Description', 'NYS Program Code',
+                           'CIP Code', 'HEGIS Code', 'Status'],
+    'QCCV_RQMNT_DESIG_TBL': ['Designation', 'Eff Date', 'Status', 'Descr', 'Formal Description'],
+    'QNS_CV_ACADEMIC_ORGANIZATIONS': ['Acad Org', 'Institution', 'Eff Date', 'Status', 'Descr',
+                                      'FormalDesc'],
+    'QNS_CV_CRSE_EQUIV_TBL': ['Equivalent Course Group', 'Eff Date', 'Status', 'Description'],
+    'QNS_CV_CUNY_SUBJECT_TABLE': ['Institution', 'Subject', 'Formal Description', 'Acad Org',
+                                  'Status', 'External Subject Area', 'CIP Code', 'HEGIS Code'],
+    'QNS_CV_CUNY_SUBJECTS': ['External Subject Area', 'Description'],
+    'QNS_CV_SR_TRNS_INTERNAL_RULES': [
+        'Source Institution', 'Source Course ID', 'Source Offer Nbr', 'Component Subject Area',
+        'Source Catalog Num', 'Src Equivalency Component', 'Equivalency Sequence Num',
+        'Src Min Units', 'Src Max Units', 'Min Grade Pts', 'Max Grade Pts', 'Transfer Priority',
+        'Source Career', 'Destination Institution', 'Destination Discipline',
+        'Destination Catalog Num', 'Destination Course ID', 'Destination Offer Nbr',
+        'Units Taken', 'Dest Min Units', 'Dest Max Units', 'Destination Career',
+        'Dest Equivalency Component', 'Internal Equiv Course Value A',
+        'Internal Equiv Course Value B', 'Contingent Credit', 'Input Course Count',
+        'Transfer Subject Eff Date', 'Transfer Component Eff Date', 'Source Inst Eff Date',
+        'Transfer To Eff Date', 'Crse Offer Eff Date', 'Crse Offer View Eff Date',
+        'Subject Credit Source', 'Component Credit Source', 'Transfer Course'],
+    'QNS_QCCV_COURSE_ATTRIBUTES_NP': ['Institution', 'Course ID', 'Course Offering Nbr',
+                                      'Course Attribute', 'Course Attribute Value'],
+    'QNS_QCCV_CU_CATALOG_NP': [
+        'Institution', 'Acad Group', 'Acad Org', 'Subject', 'Catalog Number', 'Course ID',
+        'Offer Nbr', 'Career', 'Long Course Title', 'Short Course Title', 'Descr', 'Min Units',
+        'Max Units', 'Course Contact Hours', 'Component Course Component',
+        'Instructor Contact Hours', 'Primary Component', 'Repeat For Credit', 'Designation',
+        'Equiv Course Group', 'Subject External Area', 'Crse Catalog Status',
+        'Subject Eff Status', 'Schedule Course', 'Crse Catalog Effective Date'],
+    'QNS_QCCV_CU_REQUISITES_NP': ['Institution', 'Course ID', 'Offer Nbr', 'Subject', 'Catalog',
+                                  'Descr of Pre/Co-requisites'],
+    'SR701____INSTITUTION_TABLE': ['Institution', 'Eff Date', 'Status', 'Descr', 'Short Desc',
+                                   'Formal Description'],
+    'SR742A___CRSE_ATTRIBUTE_VALUE': ['Crse Attr', 'CrsAtr Val', 'Formal Description']}
+
+
+# colleges()
+# -------------------------------------------------------------------------------------------------
+def colleges():
+  """ (code, name) for the institutions in cuny_institutions.sql.
+  """
+  sql = Path(__file__).with_name('cuny_institutions.sql').read_text()
+  return re.findall(r"^insert into cuny_institutions values \('(\w+)', *'[^']*', *'([^']*)'",
+                    sql, re.M)
+
+
+# class Generator
+# -------------------------------------------------------------------------------------------------
+class Generator:
+  """ Builds the organizational structure once, then writes the query files from it.
+  """
+
+  def __init__(self, scale, seed):
+    self.rng = Random(seed)
+    self.scale = scale
+    self.colleges = colleges()
+    rng = self.rng
+
+    # Divisions, departments, and disciplines for each college. Each discipline has its own
+    # department, except that some departments own two. Every college also has a college-wide
+    # organization, which only QCC01 and SPS01 offer courses through (see cuny_subjects.py).
+    self.divisions = dict()
+    self.departments = dict()   # (institution, department) => (division, name)
+    self.disciplines = dict()   # institution => [(discipline, department, external_subject)]
+    pool = [subject for subject in subjects if subject[0] != 'ELEC']
+    for institution, name in self.colleges:
+      self.divisions[institution] = rng.sample(divisions, rng.randint(3, 6))
+      self.departments[(institution, institution)] = (self.divisions[institution][0][0],
+                                                      f'{name} Academic Affairs')
+      self.disciplines[institution] = []
+      department = None
+      for subject, subject_name, cip, hegis in sorted(rng.sample(pool, rng.randint(18, 36))):
+        if department is None or rng.random() > 0.2:
+          department = f'{subject}-{institution[0:3]}'
+          self.departments[(institution, department)] = (rng.choice(self.divisions[institution])[0],
+                                                         f'Department of {subject_name}')
+        external_subject = subject if rng.random() > 0.03 else ''
+        self.disciplines[institution].append((subject, department, external_subject))
+    self.equivalence_groups = range(1, max(100, int(BASE_COURSES * scale / 40)))
+    self.courses = defaultdict(list)          # institution => [Course]
+    self.by_subject = defaultdict(list)       # (institution, cuny_subject) => [Course]
+    self.requisites = []
+    self.course_attributes = []
+
+  def write(self, writer, query):
+    """ Write the rows for one query file.
+    """
+    writer.writerow(headers[query])
+    getattr(self, query.lower())(writer)
+
+  # Organizational tables
+  # -----------------------------------------------------------------------------------------------
+  def sr701____institution_table(self, writer):
+    for institution, name in self.colleges + [('MHC01', 'Macaulay Honors College'),
+                                              ('UAPC1', 'University Application Processing')]:
+      writer.writerow([institution, '01/01/1901', 'A', name[0:30], institution[0:3], name])
+
+  def acad_career_tbl(self, writer):
+    for institution, name in self.colleges + [('UAPC1', '')]:
+      writer.writerow([institution, 'UGRD', '01/01/1901', 'A', 'Undergraduate', 'Undergrad', 'N'])
+      writer.writerow([institution, 'GRAD', '01/01/1901', 'A', 'Graduate', 'Graduate', 'Y'])
+
+  def academic_groups(self, writer):
+    for institution, college_divisions in self.divisions.items():
+      for division, name in college_divisions:
+        writer.writerow([institution, division, self.rng.choice(effective_dates), 'A', name])
+    writer.writerow(['MHC01', 'HONR', '01/01/1901', 'A', 'Honors'])
+
+  def qns_cv_academic_organizations(self, writer):
+    for (institution, department), (division, name) in self.departments.items():
+      writer.writerow([department, institution, '01/01/1901', 'A', name[0:30], name])
+
+  def qns_cv_cuny_subjects(self, writer):
+    for subject, name, cip, hegis in subjects:
+      writer.writerow([subject, name])
+
+  def qns_cv_cuny_subject_table(self, writer):
+    cips = {subject: (cip, hegis) for subject, name, cip, hegis in subjects}
+    for institution, disciplines in self.disciplines.items():
+      for discipline, department, external_subject in disciplines:
+        writer.writerow([institution, discipline, subject_names[discipline], department, 'A',
+                         external_subject, *cips[discipline]])
+
+  def qccv_rqmnt_desig_tbl(self, writer):
+    for designation, description in designations:
+      writer.writerow([designation, '01/01/2013', 'A', description[0:30], description])
+
+  def qns_cv_crse_equiv_tbl(self, writer):
+    for group in self.equivalence_groups:
+      writer.writerow([group, '01/01/1901', 'A', f'Equivalence group {group}'])
+
+  def qccv_prog_plan_org(self, writer):
+    rng = self.rng
+    self.plans = []
+    for (institution, department), (division, name) in self.departments.items():
+      if department == institution:
+        continue
+      for degree in rng.sample(['AA', 'AS', 'BA', 'BS', 'MA', 'MS'], rng.randint(1, 2)):
+        plan = f'{department.split("-")[0]}-{degree}'
+        self.plans.append((institution, plan))
+        nys_program_code = rng.randint(10000, 99999) if rng.random() > 0.03 else '0'
+        writer.writerow([institution, plan, department, 100.0, f'{name[14:]} {degree}',
+                         nys_program_code, '', '', 'A'])
+
+  def acad_subpln_tbl(self, writer):
+    rng = self.rng
+    for institution, plan in self.plans:
+      for number in range(rng.choice([0, 0, 1, 2, 3])):
+        writer.writerow([institution, plan, f'{plan.split("-")[0]}{number + 1}', '01/01/2015',
+                         'A', 'CON', f'Concentration {number + 1}', ''])
+
+  # The catalog, and the queries that depend on it
+  # -----------------------------------------------------------------------------------------------
+  def qns_qccv_cu_catalog_np(self, writer):
+    """ The catalog query has one row per course component. Courses are spread over the colleges
+        unevenly, the way senior and community colleges differ.
+    """
+    rng = self.rng
+    num_courses = int(BASE_COURSES * self.scale)
+    weights = [rng.uniform(0.4, 1.6) for college in self.colleges]
+    course_ids = iter(rng.sample(range(1, 10 * num_courses), num_courses))
+    four_digit = {institution: rng.random() < 0.3 for institution, name in self.colleges}
+    num_rows = 0
+    while num_rows < num_courses:
+      institution = rng.choices(self.colleges, weights)[0][0]
+      disciplines = self.disciplines[institution]
+      if institution == 'QCC01' and rng.random() < 0.01:
+        disciplines = [('ELEC', 'QCC01', 'ELEC')]
+      elif institution == 'SPS01' and rng.random() < 0.05:
+        disciplines = [('HESA', 'SPS01', 'LBST')]
+      course_id = next(course_ids)
+      # Cross-listed courses share a course_id, with an offer_nbr for each discipline.
+      num_offers = rng.choices([1, 2, 3], [92, 6, 2])[0]
+      offers = rng.sample(disciplines, min(num_offers, len(disciplines)))
+      career = 'GRAD' if institution == 'GRD01' or rng.random() < 0.08 else 'UGRD'
+      if career == 'GRAD':
+        number = rng.randint(500, 899)
+      else:
+        number = rng.randint(100, 499)
+      if four_digit[institution]:
+        number = 10 * number + rng.randint(0, 9)
+      catalog_number = str(number)
+      if rng.random() < 0.05:
+        catalog_number += rng.choice(['W', 'H', 'L', '.1'])
+      elif rng.random() < 0.003:
+        catalog_number = rng.choice(['TRAN', 'BLNK', 'XFER'])
+      credits = rng.choices([3.0, 4.0, 1.0, 2.0, 0.0, None], [70, 12, 6, 5, 2, 5])[0]
+      if credits is None:
+        min_credits, max_credits = 1.0, rng.choice([3.0, 4.0, 6.0])
+      else:
+        min_credits = max_credits = credits
+      contact_hours = max(max_credits, 1.0)
+      course_components = [('LEC', contact_hours)]
+      if rng.random() < 0.2:
+        extra = rng.choice(components[1:])[0]
+        course_components = [('LEC', contact_hours - 1.0 if contact_hours > 1 else 1.0),
+                             (extra, 1.0 if contact_hours > 1 else 2.0)]
+        contact_hours = sum(hours for component, hours in course_components)
+      if rng.random() < 0.005:
+        contact_hours += 1.0
+      status = 'A' if rng.random() < 0.85 else 'I'
+      schedule = 'Y' if rng.random() < 0.9 else 'N'
+      repeatable = 'Y' if rng.random() < 0.05 else 'N'
+      designation = rng.choice(designations)[0] if rng.random() < 0.85 else ''
+      group = rng.choice(self.equivalence_groups) if rng.random() < 0.08 else ''
+      effective_date = rng.choice(effective_dates)
+      title = rng.choice(title_patterns)
+
+      for offer_nbr, (discipline, department, external_subject) in enumerate(offers, start=1):
+        division = self.departments[(institution, department)][0]
+        if rng.random() < 0.03:
+          division = rng.choice(self.divisions[institution])[0]
+        long_title = title.format(subject_names.get(discipline, 'Special Topics'))
+        course = Course(course_id, offer_nbr, institution, discipline, catalog_number,
+                        external_subject or 'missing', min_credits, max_credits)
+        self.courses[institution].append(course)
+        self.by_subject[(institution, course.cuny_subject)].append(course)
+        for component, hours in course_components:
+          writer.writerow([institution, division, department, discipline, catalog_number,
+                           course_id, offer_nbr, career, long_title, long_title[0:30],
+                           f'{long_title}. {discipline} {catalog_number} description.',
+                           min_credits, max_credits, contact_hours, component, hours,
+                           course_components[0][0], repeatable, designation, group,
+                           external_subject, status, 'A', schedule, effective_date])
+        num_rows += 1
+        if rng.random() < 0.3:
+          prerequisite = rng.choice(self.courses[institution])
+          self.requisites.append([institution, course_id, offer_nbr, discipline, catalog_number,
+                                  f'Prereq: {prerequisite.discipline} '
+                                  f'{prerequisite.catalog_number}'])
+        num_attributes = rng.choices([0, 1, 2, 3], [55, 35, 8, 2])[0]
+        pairs = set(tuple(attribute[0:2])
+                    for attribute in rng.choices(attributes, attribute_weights, k=num_attributes))
+        if rng.random() < 0.002:
+          pairs.add(('PATH', 'XX'))
+        for name, value in sorted(pairs):
+          self.course_attributes.append([institution, course_id, offer_nbr, name, value])
+
+  def qns_qccv_cu_requisites_np(self, writer):
+    writer.writerows(self.requisites)
+
+  def qns_qccv_course_attributes_np(self, writer):
+    writer.writerows(self.course_attributes)
+
+  def sr742a___crse_attribute_value(self, writer):
+    for name, value, description, weight in attributes:
+      writer.writerow([name, value, description])
+
+  # Internal transfer rules
+  # -----------------------------------------------------------------------------------------------
+  def qns_cv_sr_trns_internal_rules(self, writer):
+    """ One row for each (source course, destination course) pair of each rule. Destination courses
+        are in the same CUNY subject as the source course where the receiving college has one, and
+        blanket credit otherwise.
+    """
+    rng = self.rng
+    num_rows = int(BASE_RULE_ROWS * self.scale)
+    institutions = [institution for institution, name in self.colleges
+                    if institution in self.courses]
+    weights = [len(self.courses[institution]) for institution in institutions]
+    group_numbers = defaultdict(int)
+    row_count = 0
+    while row_count < num_rows:
+      source_institution = rng.choices(institutions, weights)[0]
+      destination_institution = rng.choice(institutions)
+      if destination_institution == source_institution:
+        continue
+      source_course = rng.choice(self.courses[source_institution])
+      discipline = source_course.discipline
+      source_courses = [source_course]
+      if rng.random() < 0.15:
+        siblings = [course for course in rng.sample(self.courses[source_institution],
+                                                    min(50, len(self.courses[source_institution])))
+                    if course.discipline == discipline and course != source_course]
+        source_courses += siblings[0:rng.choice([1, 2])]
+      same_subject = self.by_subject.get((destination_institution, source_course.cuny_subject))
+      # Most rules accept any passing grade; some send low grades to blanket credit.
+      if rng.random() < 0.06:
+        grade_ranges = [(0.0, 1.99), (2.0, 4.0)]
+      else:
+        grade_ranges = [(rng.choice([0.0, 0.0, 0.0, 0.7, 1.0]), 4.0)]
+      for min_grade, max_grade in grade_ranges:
+        if same_subject and (min_grade >= 1.0 or len(grade_ranges) == 1) and \
+           rng.random() < 0.75:
+          candidates = same_subject
+        else:
+          candidates = self.courses[destination_institution]
+        destination_courses = rng.sample(candidates, min(rng.choices([1, 2], [90, 10])[0],
+                                                         len(candidates)))
+        rule_key = (source_institution, destination_institution, discipline)
+        group_numbers[rule_key] += 1
+        group_number = group_numbers[rule_key]
+        priority = 1 if rng.random() < 0.95 else 2
+        credit_source = rng.choices(['C', 'R', 'E'], [70, 25, 5])[0]
+        transfer_course = 'Y' if rng.random() < 0.97 else 'N'
+        dates = [rng.choice(effective_dates) for date in range(6)]
+        for sequence, course in enumerate(source_courses, start=1):
+          # A few rows reference courses that are not in the catalog, or an ignored college.
+          course_id = course.course_id
+          if rng.random() < 0.002:
+            course_id = int(10 * BASE_COURSES * self.scale) + rng.randint(1, 99999)
+          institution = source_institution if rng.random() > 0.0005 else 'MHC01'
+          min_units, max_units = course.min_credits, course.max_credits
+          if rng.random() < 0.01:
+            max_units += 1.0
+          for destination in destination_courses:
+            writer.writerow([institution, course_id, course.offer_nbr, discipline,
+                             course.catalog_number, group_number, sequence, min_units, max_units,
+                             min_grade, max_grade, priority, 'UGRD', destination_institution,
+                             destination.discipline, destination.catalog_number,
+                             destination.course_id, destination.offer_nbr,
+                             destination.max_credits, destination.min_credits,
+                             destination.max_credits, 'UGRD', group_number, '', '', 'N',
+                             len(source_courses), *dates, credit_source, credit_source,
+                             transfer_course])
+            row_count += 1
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Write synthetic CUNYfirst query files')
+  parser.add_argument('--scale', '-s', type=float, default=1.0,
+                      help='catalog and rule volume, relative to the current query files')
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--directory', '-o', default='./synthetic_queries/latest_queries',
+                      help='where to write the files (default: %(default)s)')
+  parser.add_argument('--progress', '-p', action='store_true')
+  args = parser.parse_args()
+
+  try:
+    terminal = open(os.ttyname(0), 'wt')
+  except OSError as e:
+    # No progress reporting unless run from command line
+    terminal = open('/dev/null', 'wt')
+
+  directory = Path(args.directory)
+  directory.mkdir(parents=True, exist_ok=True)
+  generator = Generator(args.scale, args.seed)
+
+  # The catalog has to be generated before the files derived from it, and the programs before the
+  # subplans.
+  names = list(required_query_names)
+  order = ['QNS_QCCV_CU_CATALOG_NP', 'QCCV_PROG_PLAN_ORG']
+  names = [name for name in order if name in names] + [name for name in names
+                                                       if name not in order]
+  # The populate scripts check that the query files all have the same date.
+  timestamp = time()
+  for name in names:
+    start_time = perf_counter()
+    path = directory / f'{name}.csv'
+    with open(path, 'w', newline='') as csvfile:
+      generator.write(csv.writer(csvfile), name)
+    os.utime(path, (timestamp, timestamp))
+    if args.progress:
+      print(f'{name:<32} {path.stat().st_size:15,} bytes {perf_counter() - start_time:7.1f} sec',
+            file=terminal)
@@ -0,0 +1,33 @@
+""" Python version of the numeric_part() function in numeric_part.sql.
+    populate_cuny_courses.py uses it to compute cuny_courses.cat_num once, when the catalog is
+    loaded, so queries can select (and sort by) the indexed column instead of calling the plpgsql
+    function for every row.
+"""
+import re
+import struct
+
+numeric_re = re.compile(r'(\d+\.?\d*)')
+
+
+# to_real()
+# -------------------------------------------------------------------------------------------------
+def to_real(value):
+  """ Round a Python float to Postgres real (4-byte float) precision, so the arithmetic below gives
+      the same results the plpgsql version does.
+  """
+  return struct.unpack('f', struct.pack('f', value))[0]
+
+
+# numeric_part()
+# -------------------------------------------------------------------------------------------------
+def numeric_part(catalog_number):
+  """ Numeric part of a catalog number, divided down to less than 1000 if needed.
+      Returns -1 if there is no numeric part.
+  """
+  match = numeric_re.search(catalog_number)
+  if match is None:
+    return -1.0
+  num = to_real(float(match.group(1)))
+  while num > 1000.0:
+    num = to_real(num / 10)
+  return num
@@ -1,5 +1,7 @@
 -- Use postgres to give numeric part of catalog numbers, divided down to less than 1000 if needed
 -- Returns -1 if there is no numeric part.
+-- The value for every course is precomputed in cuny_courses.cat_num (see numeric_part.py); this
+-- function remains for ad hoc queries against catalog numbers from other sources.
 CREATE OR REPLACE FUNCTION numeric_part(cat_num text)
   RETURNS real AS
 $$
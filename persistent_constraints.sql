@@ -0,0 +1,30 @@
+-- Restore the foreign keys from the persistent tables into the rebuilt public schema.
+--
+-- Dropping the public schema drops these constraints, but not the persistent tables they belong to.
+-- They are added back as NOT VALID, which is instantaneous, and then each one is checked with a
+-- single VALIDATE pass over its table, rather than row by row as the rows used to be restored.
+-- Rule ids are checked against the permanent rule_ids registry, so the events for rules that have
+-- dropped out of the rebuilt transfer_rules are kept. Run with ON_ERROR_STOP so an event that
+-- refers to a rule id that was never assigned, or a reference to an unknown event type or
+-- institution, stops the update.
+
+alter table persistent.events drop constraint if exists events_rule_id_fkey;
+alter table persistent.events drop constraint if exists events_event_type_fkey;
+alter table persistent.person_roles drop constraint if exists person_roles_institution_fkey;
+
+-- Not transfer_rules: a rule that CUNYfirst no longer sends, or that populate_transfer_rules
+-- rejects, is not in it, but keeps its id, and its events. (And when transfer_rules is partitioned,
+-- its id alone is not a key.)
+alter table persistent.events
+  add constraint events_rule_id_fkey
+  foreign key (rule_id) references persistent.rule_ids (id) not valid;
+alter table persistent.events
+  add constraint events_event_type_fkey
+  foreign key (event_type) references review_status_bits(abbr) not valid;
+alter table persistent.person_roles
+  add constraint person_roles_institution_fkey
+  foreign key (institution) references cuny_institutions not valid;
+
+alter table persistent.events validate constraint events_rule_id_fkey;
+alter table persistent.events validate constraint events_event_type_fkey;
+alter table persistent.person_roles validate constraint person_roles_institution_fkey;
@@ -0,0 +1,34 @@
+-- The persistent schema holds the tables that come from users of the app rather than from
+-- CUNYfirst: events, pending_reviews, roles, and person_roles, plus the rule_ids registry that
+-- keeps the rule ids events refer to stable. update_db rebuilds the public schema from scratch,
+-- but never touches this one, so these tables no longer have to be dumped and restored around each
+-- rebuild.
+--
+-- The tables themselves are created (if need be) by reviews-events.sql, rule_ids.sql, and
+-- roles.sql. Their foreign keys into the public schema get dropped along with it, and are restored
+-- and validated after each rebuild by persistent_constraints.sql.
+
+create schema if not exists persistent;
+
+-- Let the app and the update scripts find the persistent tables without qualifying their names.
+-- The setting is for whichever db this is run against (bench_update.py uses a throwaway one), and
+-- takes effect in the sessions that start after it.
+select format('alter database %I set search_path = "$user", public, persistent',
+              current_database())
+\gexec
+
+-- Move tables that were kept in the public schema by earlier versions of update_db.
+do $$
+  declare
+    table_name text;
+  begin
+    foreach table_name in array array['events', 'pending_reviews', 'roles', 'person_roles',
+                                      'rule_ids']
+    loop
+      if to_regclass('public.' || table_name) is not null
+         and to_regclass('persistent.' || table_name) is null then
+        execute format('alter table public.%I set schema persistent', table_name);
+      end if;
+    end loop;
+  end;
+$$;
@@ -40,25 +40,37 @@
           Note rules that specify inactive destination courses
           Build lists of source disciplines for all rules
     3. Insert rules and course lists into database tables
+
+  With --validate, only steps 1 and 2 are done, against the current cuny_courses table, over a
+  read-only connection: the conflicts go to validate_transfer_rule_conflicts.{log,jsonl}, and
+  nothing is written. update_db runs this before it drops the db, and stops if it fails, which it
+  does if a rule refers to a credit source or subject that is not in the current tables.
 """
 
 import os
 import sys
 import argparse
-import csv
 
 from collections import namedtuple, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
 from time import perf_counter
 
-from pgconnection import PgConnection
+from curriculum_db import connect
 
-from cuny_divisions import ignore_institutions
+from ignore_lists import ignore_institutions
+from bulk_load import CopyWriter, copy_rows, pg_array
+from conflict_log import ConflictLog
+import query_cache
+import stage_cache
+import run_metrics
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--debug', '-d', action='store_true')
 parser.add_argument('--progress', '-p', action='store_true')  # to stderr
 parser.add_argument('--report', '-r', action='store_true')    # to stdout
+parser.add_argument('--text-log', '-t', action='store_true')  # each conflict, to the .log file
+parser.add_argument('--validate', '-v', action='store_true')  # check only; no writes
 args = parser.parse_args()
 
 app_start = perf_counter()
@@ -86,51 +98,37 @@ def mk_rule_key(rule):
 if args.progress:
   print('\nInitializing.', file=terminal)
 
-conn = PgConnection()
+conn = connect()
+if args.validate:
+  conn.set_session(readonly=True)
 cursor = conn.cursor()
 
 # Get most recent transfer_rules query file
 cf_rules_file = './latest_queries/QNS_CV_SR_TRNS_INTERNAL_RULES.csv'
 file_date = date\
     .fromtimestamp(os.lstat(cf_rules_file).st_mtime).strftime('%Y-%m-%d')
-num_lines = sum(1 for line in open(cf_rules_file))
+rules_table = query_cache.load(cf_rules_file)
+num_lines = len(rules_table)
 
 if args.report:
   print('\n  Transfer rules query file: {} {}'.format(file_date, cf_rules_file))
 
 # There be some garbage institution "names" in the transfer_rules, but the app’s
 # cuny_institutions table is “definitive”.
-cursor.execute("""select code
-                  from cuny_institutions
-                  order by code""")
-known_institutions = [record.code for record in cursor.fetchall()]
+known_institutions = sorted(record.code for record in stage_cache.table_rows('cuny_institutions'))
 
 # Use the disciplines table for reporting cases where the component_subject_area isn't
 # there.
-cursor.execute("""select institution, discipline
-                  from cuny_disciplines""")
-valid_disciplines = [(record.institution, record.discipline)
-                     for record in cursor.fetchall()]
+valid_disciplines = set((record.institution, record.discipline)
+                        for record in stage_cache.table_rows('cuny_disciplines'))
 
-# Cache the information that might be used for all courses in the cuny_courses table.
+# The information that might be used for all courses in the cuny_courses table.
 # Index by course_id; list info for each offer_nbr.
-cursor.execute("""
-               select course_id,
-                      offer_nbr,
-                      institution,
-                      discipline,
-                      catalog_number,
-                      numeric_part(catalog_number) as cat_num,
-                      cuny_subject,
-                      min_credits,
-                      max_credits,
-                      course_status from cuny_courses""")
-course_cache = defaultdict(list)
-for course in cursor.fetchall():
-  course_cache[course.course_id].append(course)
-
-# Logging file
-conflicts = open('transfer_rule_conflicts.log', 'w')
+course_cache = stage_cache.course_index()
+
+# Conflicts go to transfer_rule_conflicts.jsonl, with a summary in transfer_rule_conflicts.log
+conflicts = ConflictLog(f'{"validate_" if args.validate else ""}transfer_rule_conflicts',
+                        text_log=args.text_log)
 
 # Templates for building the three tables
 Rule_Key = namedtuple('Rule_Key',
@@ -188,216 +186,273 @@ num_missing_courses = 0
 if args.progress:
   print('\nStep 1/2: Process the csv file.', file=terminal)
 start_time = perf_counter()
-with open(cf_rules_file) as csvfile:
-  csv_reader = csv.reader(csvfile)
-  cols = None
-  line_num = 0
-  for line in csv_reader:
-    if cols is None:
-      line[0] = line[0].replace('\ufeff', '')
-      cols = [val.lower().replace(' ', '_').replace('/', '_') for val in line]
-      Record = namedtuple('Record', cols)
-      if args.debug:
-        print(cols)
-        for col in cols:
-          print('{} = {}; '.format(col, cols.index(col), end=''))
-        print()
-    else:
-      line_num += 1
-      if args.progress and line_num % 10000 == 0:
-        elapsed_time = perf_counter() - start_time
-        total_time = num_lines * elapsed_time / line_num
-        secs_remaining = total_time - elapsed_time
-        mins_remaining = int((secs_remaining) / 60)
-        secs_remaining = int(secs_remaining - (mins_remaining * 60))
-        print('line {:,}/{:,} ({:.1f}%) Estimated time remaining: {}:{:02}\r'
-              .format(line_num,
-                      num_lines,
-                      100 * line_num / num_lines,
-                      mins_remaining,
-                      secs_remaining),
-              end='', file=terminal)
-
-      try:
-        record = Record._make(line)
-      except TypeError as te:
-        print(f'{te}\nline {line_num}:, {line}', file=sys.stderr)
-        continue
-
-      # 2020-0902: Check "Transfer Course" flag
-      if record.transfer_course != 'Y':
-        continue
-
-      if record.source_institution in ignore_institutions or \
-         record.destination_institution in ignore_institutions:
-         conflicts.write(f'Ignoring rule from {record.source_institution} to '
-                         f'{record.destination_institution}\n')
-         continue
-      try:
-        rule_key = Rule_Key(record.source_institution,
-                            record.destination_institution,
-                            record.component_subject_area,
-                            int(record.src_equivalency_component))
-      except ValueError as e:
-        conflicts.write(f'Unable to construct Rule Key for {record}.\n{e}')
-        continue
-
-      # Determine the effective date of the row (the latest effective date of any of the
-      # tables that make up the CF query).
-      date_vals = [[int(f) for f in field.split('/')]for field in
-                   [record.transfer_subject_eff_date,
-                    record.transfer_component_eff_date,
-                    record.source_inst_eff_date,
-                    record.transfer_to_eff_date,
-                    record.crse_offer_eff_date,
-                    record.crse_offer_view_eff_date]]
-      effective_date = max([date(month=v[0], day=v[1], year=v[2]) for v in date_vals])
-      if rule_key not in rules_dict.keys():
-        # source_courses, source_disciplines, source_subjects,
-        # destination_courses, destination_disciplines,
-        # Rule Priority, Effective Date
-        rules_dict[rule_key] = Rule_Tuple(set(), set(), set(), set(), set(),
-                                          record.transfer_priority, effective_date)
-      elif effective_date > rules_dict[rule_key].effective_date:
-        rules_dict[rule_key].effective_date.replace(year=effective_date.year,
-                                                    month=effective_date.month,
-                                                    day=effective_date.day)
-        if rules_dict[rule_key].priority != record.transfer_priority:
-          conflicts.write(f'\nConflicting priorities for {rule_key}: '
-                          f'{rules_dict[rule_key].priority} != {record.transfer_priority} '
-                          f'Record kept.\n')
-
-      # 2018-07-19: The following two tests never fail
-      if record.source_institution not in known_institutions:
-        conflicts.write('Unknown institution: {} for rule {}. Rule ignored.\n'
-                        .format(record.source_institution, rule_key))
-        del(rules_dict[rule_key])
-        continue
-      if record.destination_institution not in known_institutions:
-        conflicts.write('Unknown institution: {} for rule {}. Rule ignored.\n'
-                        .format(record.destination_institution, rule_key))
-        del(rules_dict[rule_key])
-        continue
-
-      if (record.source_institution, record.component_subject_area) \
-         not in valid_disciplines:
-        # Report the anomaly, but accept the record.
-        conflicts.write(
-            'Notice: Component Subject Area {} not a CUNY Subject Area for rule {}. '
-            'Record kept.\n'.format(record.component_subject_area, rule_key))
-
-      # Process source_course_id
-      # ------------------------
-      course_id = int(record.source_course_id)
-      offer_nbr = int(record.source_offer_nbr)
-      if course_id not in course_cache.keys():
-        conflicts.write('Source course {:06}.{} not in course catalog for rule {}. '
-                        'Rule ignored.\n'.format(course_id, offer_nbr, rule_key))
-        del(rules_dict[rule_key])
-        num_missing_courses += 1
-        continue
-      # Only one course gets added to the rule, but all (cross-listed) disciplines and
-      # subjects
-      courses = course_cache[course_id]
-      course = courses[0]
-
-      # Eliminate rules with zero-credit source courses.
-      if float(course.max_credits) < 0.1:
-        conflicts.write(f'Source_course {course_id} in rule {rule_key} is a zero-credit course. '
-                        f'Rule ignored.\n')
-        del(rules_dict[rule_key])
-        continue
-
-      if float(course.min_credits) < float(record.src_min_units):
-        conflicts.write('Source course {:06} has {} min credits, '
-                        'but rule {} speifies {} min units\n'
-                        .format(course.course_id,
+cols = rules_table.columns
+Record = namedtuple('Record', cols)
+if args.debug:
+  print(cols)
+  for col in cols:
+    print('{} = {}; '.format(col, cols.index(col), end=''))
+  print()
+line_num = 0
+for line in rules_table:
+  line_num += 1
+  if args.progress and line_num % 10000 == 0:
+    elapsed_time = perf_counter() - start_time
+    total_time = num_lines * elapsed_time / line_num
+    secs_remaining = total_time - elapsed_time
+    mins_remaining = int((secs_remaining) / 60)
+    secs_remaining = int(secs_remaining - (mins_remaining * 60))
+    print('line {:,}/{:,} ({:.1f}%) Estimated time remaining: {}:{:02}\r'
+          .format(line_num,
+                  num_lines,
+                  100 * line_num / num_lines,
+                  mins_remaining,
+                  secs_remaining),
+          end='', file=terminal)
+
+  try:
+    record = Record._make(line)
+  except TypeError as te:
+    print(f'{te}\nline {line_num}:, {line}', file=sys.stderr)
+    run_metrics.reject('malformed row')
+    continue
+
+  # 2020-0902: Check "Transfer Course" flag
+  if record.transfer_course != 'Y':
+    run_metrics.reject('not a transfer course')
+    continue
+
+  if record.source_institution in ignore_institutions or \
+     record.destination_institution in ignore_institutions:
+     conflicts.record('ignored institution',
+                      f'Ignoring rule from {record.source_institution} to '
+                      f'{record.destination_institution}\n', rejected=True)
+     continue
+  try:
+    rule_key = Rule_Key(record.source_institution,
+                        record.destination_institution,
+                        record.component_subject_area,
+                        int(record.src_equivalency_component))
+  except ValueError as e:
+    conflicts.record('bad rule key', f'Unable to construct Rule Key for {record}.\n{e}',
+                     rejected=True)
+    continue
+
+  # Determine the effective date of the row (the latest effective date of any of the
+  # tables that make up the CF query).
+  date_vals = [[int(f) for f in field.split('/')]for field in
+               [record.transfer_subject_eff_date,
+                record.transfer_component_eff_date,
+                record.source_inst_eff_date,
+                record.transfer_to_eff_date,
+                record.crse_offer_eff_date,
+                record.crse_offer_view_eff_date]]
+  effective_date = max([date(month=v[0], day=v[1], year=v[2]) for v in date_vals])
+  if rule_key not in rules_dict.keys():
+    # source_courses, source_disciplines, source_subjects,
+    # destination_courses, destination_disciplines,
+    # Rule Priority, Effective Date
+    rules_dict[rule_key] = Rule_Tuple(set(), set(), set(), set(), set(),
+                                      record.transfer_priority, effective_date)
+  elif effective_date > rules_dict[rule_key].effective_date:
+    rules_dict[rule_key].effective_date.replace(year=effective_date.year,
+                                                month=effective_date.month,
+                                                day=effective_date.day)
+    if rules_dict[rule_key].priority != record.transfer_priority:
+      conflicts.record('conflicting priorities',
+                       f'\nConflicting priorities for {rule_key}: '
+                       f'{rules_dict[rule_key].priority} != {record.transfer_priority} '
+                       f'Record kept.\n', rule_key=rule_key)
+
+  # 2018-07-19: The following two tests never fail
+  if record.source_institution not in known_institutions:
+    conflicts.record('unknown institution',
+                     'Unknown institution: {} for rule {}. Rule ignored.\n'
+                     .format(record.source_institution, rule_key),
+                     rule_key=rule_key, rejected=True)
+    del(rules_dict[rule_key])
+    continue
+  if record.destination_institution not in known_institutions:
+    conflicts.record('unknown institution',
+                     'Unknown institution: {} for rule {}. Rule ignored.\n'
+                     .format(record.destination_institution, rule_key),
+                     rule_key=rule_key, rejected=True)
+    del(rules_dict[rule_key])
+    continue
+
+  if (record.source_institution, record.component_subject_area) \
+     not in valid_disciplines:
+    # Report the anomaly, but accept the record.
+    conflicts.record(
+        'not a CUNY subject area',
+        'Notice: Component Subject Area {} not a CUNY Subject Area for rule {}. '
+        'Record kept.\n'.format(record.component_subject_area, rule_key), rule_key=rule_key)
+
+  # Process source_course_id
+  # ------------------------
+  course_id = int(record.source_course_id)
+  offer_nbr = int(record.source_offer_nbr)
+  if course_id not in course_cache.keys():
+    conflicts.record('source course not in catalog',
+                     'Source course {:06}.{} not in course catalog for rule {}. '
+                     'Rule ignored.\n'.format(course_id, offer_nbr, rule_key),
+                     rule_key=rule_key, course_id=course_id, rejected=True)
+    del(rules_dict[rule_key])
+    num_missing_courses += 1
+    continue
+  # Only one course gets added to the rule, but all (cross-listed) disciplines and
+  # subjects
+  courses = course_cache[course_id]
+  course = courses[0]
+
+  # Eliminate rules with zero-credit source courses.
+  if float(course.max_credits) < 0.1:
+    conflicts.record('zero-credit source course',
+                     f'Source_course {course_id} in rule {rule_key} is a zero-credit course. '
+                     f'Rule ignored.\n', rule_key=rule_key, course_id=course_id, rejected=True)
+    del(rules_dict[rule_key])
+    continue
+
+  if float(course.min_credits) < float(record.src_min_units):
+    conflicts.record('source min credits',
+                     'Source course {:06} has {} min credits, '
+                     'but rule {} speifies {} min units\n'
+                     .format(course.course_id,
+                             course.min_credits,
+                             rule_key,
+                             record.src_min_units), rule_key=rule_key, course_id=course_id)
+  if float(course.max_credits) > float(record.src_max_units):
+    conflicts.record('source max credits',
+                     'Source course {:06} has {} max credits, '
+                     'but rule {} speifies {} max units\n'
+                     .format(course.course_id,
+                             course.max_credits,
+                             rule_key,
+                             record.src_max_units), rule_key=rule_key, course_id=course_id)
+  source_course = Source_Course(course_id,
+                                offer_nbr,
+                                len(courses),
+                                course.discipline,
+                                course.catalog_number,
+                                float(course.cat_num),
+                                course.cuny_subject,
                                 course.min_credits,
-                                rule_key,
-                                record.src_min_units))
-      if float(course.max_credits) > float(record.src_max_units):
-        conflicts.write('Source course {:06} has {} max credits, '
-                        'but rule {} speifies {} max units\n'
-                        .format(course.course_id,
                                 course.max_credits,
-                                rule_key,
-                                record.src_max_units))
-      source_course = Source_Course(course_id,
-                                    offer_nbr,
-                                    len(courses),
-                                    course.discipline,
-                                    course.catalog_number,
-                                    float(course.cat_num),
-                                    course.cuny_subject,
-                                    course.min_credits,
-                                    course.max_credits,
-                                    record.subject_credit_source,
-                                    record.min_grade_pts,
-                                    record.max_grade_pts)
-      rules_dict[rule_key].source_courses.add(source_course)
-      fail = False
-      for course in courses:
-        if course.cat_num < 0:
-          conflicts.write(
-              'Source course {:06} with non-numeric catalog number {} for rule {}. '
-              'Rule ignored.\n'.format(course_id, course.catalog_number, rule_key))
-          fail = True
-          break
-        rules_dict[rule_key].source_disciplines.add(course.discipline)
-        rules_dict[rule_key].source_subjects.add(course.cuny_subject)
-      if fail:
-        rules_dict.pop(rule_key)
-        continue
-
-      # Process destination_course_id
-      # -----------------------------
-      course_id = int(record.destination_course_id)
-      offer_nbr = int(record.destination_offer_nbr)
-      if course_id not in course_cache.keys():
-        conflicts.write('Destination course {:06}.{} not in catalog for rule {}. '
-                        'Rule ignored.\n'.format(course_id, offer_nbr, rule_key))
-        rules_dict.pop(rule_key)
-        continue
-      courses = course_cache[course_id]
-      destination_course = Destination_Course(course_id,
-                                              offer_nbr,
-                                              len(courses),
-                                              courses[0].discipline,
-                                              courses[0].catalog_number,
-                                              float(courses[0].cat_num),
-                                              courses[0].cuny_subject,
-                                              record.units_taken)
-      rules_dict[rule_key].destination_courses.add(destination_course)
-      rules_dict[rule_key].destination_disciplines.add(destination_course.discipline)
-      if len(courses) > 1:
-        conflicts.write(
-            'Destination course_id {:06} for rule {} is cross-listed {} times. '
-            'Rule retained.\n'.format(destination_course.course_id, rule_key,
-                                      len(course_cache[destination_course.course_id])))
-      fail = False
-      for course in courses:
-        if course.cat_num < 0:
-          conflicts.write('Destination course {:06} with non-numeric catalog number {} '
-                          'for rule {}. Rule ignored.\n'
-                          .format(course_id, course.catalog_number, rule_key))
-          fail = True
-          break
-        if course.course_status != 'A':
-          conflicts.write('Inactive destination course_id ({:06}) in rule {}. Rule retained.\n'.
-                          format(course_id, rule_key))
-      if fail:
-        rules_dict.pop(rule_key)
-        continue
-
+                                record.subject_credit_source,
+                                record.min_grade_pts,
+                                record.max_grade_pts)
+  rules_dict[rule_key].source_courses.add(source_course)
+  fail = False
+  for course in courses:
+    if course.cat_num < 0:
+      conflicts.record(
+          'non-numeric source catalog number',
+          'Source course {:06} with non-numeric catalog number {} for rule {}. '
+          'Rule ignored.\n'.format(course_id, course.catalog_number, rule_key),
+          rule_key=rule_key, course_id=course_id, rejected=True)
+      fail = True
+      break
+    rules_dict[rule_key].source_disciplines.add(course.discipline)
+    rules_dict[rule_key].source_subjects.add(course.cuny_subject)
+  if fail:
+    rules_dict.pop(rule_key)
+    continue
+
+  # Process destination_course_id
+  # -----------------------------
+  course_id = int(record.destination_course_id)
+  offer_nbr = int(record.destination_offer_nbr)
+  if course_id not in course_cache.keys():
+    conflicts.record('destination course not in catalog',
+                     'Destination course {:06}.{} not in catalog for rule {}. '
+                     'Rule ignored.\n'.format(course_id, offer_nbr, rule_key),
+                     rule_key=rule_key, course_id=course_id, rejected=True)
+    rules_dict.pop(rule_key)
+    continue
+  courses = course_cache[course_id]
+  destination_course = Destination_Course(course_id,
+                                          offer_nbr,
+                                          len(courses),
+                                          courses[0].discipline,
+                                          courses[0].catalog_number,
+                                          float(courses[0].cat_num),
+                                          courses[0].cuny_subject,
+                                          record.units_taken)
+  rules_dict[rule_key].destination_courses.add(destination_course)
+  rules_dict[rule_key].destination_disciplines.add(destination_course.discipline)
+  if len(courses) > 1:
+    conflicts.record(
+        'cross-listed destination course',
+        'Destination course_id {:06} for rule {} is cross-listed {} times. '
+        'Rule retained.\n'.format(destination_course.course_id, rule_key,
+                                  len(course_cache[destination_course.course_id])),
+        rule_key=rule_key, course_id=course_id)
+  fail = False
+  for course in courses:
+    if course.cat_num < 0:
+      conflicts.record('non-numeric destination catalog number',
+                       'Destination course {:06} with non-numeric catalog number {} '
+                       'for rule {}. Rule ignored.\n'
+                       .format(course_id, course.catalog_number, rule_key),
+                       rule_key=rule_key, course_id=course_id, rejected=True)
+      fail = True
+      break
+    if course.course_status != 'A':
+      conflicts.record('inactive destination course',
+                       'Inactive destination course_id ({:06}) in rule {}. Rule retained.\n'.
+                       format(course_id, rule_key), rule_key=rule_key, course_id=course_id)
+  if fail:
+    rules_dict.pop(rule_key)
+    continue
+
+run_metrics.read(line_num)
 if args.progress:
   print(f'\n  Found {len(rules_dict.keys()):,} rules', file=terminal)
   secs = perf_counter() - start_time
   mins = int(secs / 60)
   secs = int(secs - 60 * mins)
   print(f'\n  That took {mins} min {secs} sec.', file=terminal)
-  print('\nStep 2/2: Populate the three tables', file=terminal)
+  if not args.validate:
+    print('\nStep 2/2: Populate the three tables', file=terminal)
   start_time = perf_counter()
 
+if args.validate:
+  # rule_ids is created by update_db after validation the first time it runs.
+  known_keys = set()
+  cursor.execute("select to_regclass('rule_ids') is not null as ok")
+  if cursor.fetchone().ok:
+    cursor.execute('select rule_key from rule_ids')
+    known_keys = set(row.rule_key for row in cursor.fetchall())
+  num_new_keys = sum(str(rule_key) not in known_keys for rule_key in rules_dict.keys())
+  # Rules whose courses are not in cuny_courses have been dropped above, as they are when the rules
+  # are loaded. The references that are not filtered out that way, and that
+  # transfer_rules_constraints.sql would find dangling, fail the validation.
+  credit_sources = stage_cache.table_keys('credit_sources', 'value')
+  subjects = stage_cache.table_keys('cuny_subjects', 'subject')
+  num_dangling = 0
+  for rule_key, rule in rules_dict.items():
+    for course in rule.source_courses:
+      if course.credits_source not in credit_sources:
+        num_dangling += 1
+        conflicts.record('unknown credit source',
+                         f'Credit source {course.credits_source} of source course '
+                         f'{course.course_id:06} in rule {rule_key} is not in credit_sources\n',
+                         rule_key=rule_key, course_id=course.course_id)
+    for subject in rule.source_subjects - subjects:
+      num_dangling += 1
+      conflicts.record('unknown subject',
+                       f'Source subject {subject} of rule {rule_key} is not in cuny_subjects\n',
+                       rule_key=rule_key)
+  conflicts.note(f'Validated {line_num:,} rows: {len(rules_dict):,} rules '
+                 f'({num_new_keys:,} not in rule_ids).')
+  if args.report:
+    print(conflicts.summary(), end='')
+  conn.close()
+  if num_dangling:
+    conflicts.note(f'{num_dangling:,} references to rows that are not in the current tables.')
+    sys.exit(f'{num_dangling:,} rule references to rows that are not in the current tables')
+  sys.exit(0)
+
 # Step 2
 # -------------------------------------------------------------------------------------------------
 # Clear the three db tables and re-populate them.
@@ -409,6 +464,106 @@ cursor.execute("""
                set update_date = '{}', file_name = '{}'
                where table_name = 'transfer_rules'""".format(file_date, cf_rules_file))
 
+# Rule ids come from the rule_ids registry, which outlives rebuilds of the db, so events that
+# reference rules by id remain valid from one update to the next. Rules keep the id they were first
+# registered with; new rule keys, registered all at once, get the next ids.
+cursor.execute('select rule_key, id from rule_ids')
+rule_ids = {row.rule_key: row.id for row in cursor.fetchall()}
+rule_key_strs = {rule_key: ':'.join([str(part) for part in rule_key])
+                 for rule_key in rules_dict.keys()}
+new_keys = [key_str for key_str in rule_key_strs.values() if key_str not in rule_ids]
+if len(new_keys) > 0:
+  cursor.execute("""insert into rule_ids (rule_key)
+                    select unnest(%s::text[])
+                    returning rule_key, id""", (new_keys, ))
+  rule_ids.update({row.rule_key: row.id for row in cursor.fetchall()})
+num_new_ids = len(new_keys)
+
+table_columns = {'transfer_rules': ['source_institution',
+                                    'destination_institution',
+                                    'subject_area',
+                                    'group_number',
+                                    'rule_key',
+                                    'source_disciplines',
+                                    'source_subjects',
+                                    'sending_courses',
+                                    'destination_disciplines',
+                                    'receiving_courses',
+                                    'priority',
+                                    'effective_date',
+                                    'id'],
+                 'source_courses': ['rule_id',
+                                    'source_institution',
+                                    'course_id',
+                                    'offer_nbr',
+                                    'offer_count',
+                                    'discipline',
+                                    'catalog_number',
+                                    'cat_num',
+                                    'cuny_subject',
+                                    'min_credits',
+                                    'max_credits',
+                                    'credits_source',
+                                    'min_gpa',
+                                    'max_gpa'],
+                 'destination_courses': ['rule_id',
+                                         'source_institution',
+                                         'course_id',
+                                         'offer_nbr',
+                                         'offer_count',
+                                         'discipline',
+                                         'catalog_number',
+                                         'cat_num',
+                                         'cuny_subject',
+                                         'transfer_credits']}
+
+# The rows are streamed to the three tables as they are built, each by a CopyWriter with a
+# connection of its own. When the tables are partitioned by source institution (see
+# create_transfer_rules.sql), the rows are collected by college instead, and each college’s
+# partitions are loaded over a separate connection, in parallel. Either way, the truncate and the
+# new rule ids have to be committed first, or the other connections would wait for this one’s
+# locks.
+cursor.execute("select relkind from pg_class where oid = 'transfer_rules'::regclass")
+partitioned = cursor.fetchone().relkind == 'p'
+conn.commit()
+load_start = perf_counter()
+if partitioned:
+  partition_rows = {table: defaultdict(list) for table in table_columns.keys()}
+else:
+  writer_conns = {table: connect(new=True) for table in table_columns.keys()}
+  writers = {table: CopyWriter(writer_conns[table].cursor(), table, columns)
+             for table, columns in table_columns.items()}
+
+
+# emit()
+# -------------------------------------------------------------------------------------------------
+def emit(table, institution, row):
+  """ Send a row to table’s writer, or keep it for the institution’s partition of table.
+  """
+  run_metrics.wrote()
+  if partitioned:
+    partition_rows[table][institution].append(row)
+  else:
+    writers[table].put(row)
+
+
+# load_partition()
+# -------------------------------------------------------------------------------------------------
+def load_partition(institution):
+  """ COPY one institution’s rows into its partitions, over a connection of its own.
+  """
+  partition_conn = connect(new=True)
+  partition_cursor = partition_conn.cursor()
+  for table, columns in table_columns.items():
+    copy_rows(partition_cursor, f'{table}_{institution.lower()}',
+              partition_rows[table][institution], columns=columns)
+  partition_conn.commit()
+  partition_conn.close()
+
+
+# Rows for the course_rule_map table, which is bulk-loaded after the rules.
+course_rule_rows = set()
+
 total_keys = len(rules_dict.keys())
 keys_so_far = 0
 for rule_key in rules_dict.keys():
@@ -417,80 +572,56 @@ for rule_key in rules_dict.keys():
     print(f'\r{keys_so_far:,}/{total_keys:,} keys. {100 * keys_so_far / total_keys:.1f}%',
           end='', file=terminal)
 
-  # Build the colon-delimited discipline and subject strings
-  source_disciplines_str = ':' + ':'.join(sorted(rules_dict[rule_key].source_disciplines)) + ':'
-  destination_disciplines_str = ':'.join(sorted(rules_dict[rule_key].destination_disciplines))
-  source_subjects_str = ':' + ':'.join(sorted(rules_dict[rule_key].source_subjects)) + ':'
-  sending_courses = ':'.join(sorted([f'{c.course_id:06}.{c.offer_nbr}'
-                                    for c in rules_dict[rule_key].source_courses]))
-  receiving_courses = ':'.join(sorted([f'{c.course_id:06}.{c.offer_nbr}'
-                                      for c in rules_dict[rule_key].destination_courses]))
-
-  # Insert the rule, getting back it's id
-  cursor.execute("""insert into transfer_rules (
-                                  source_institution,
-                                  destination_institution,
-                                  subject_area,
-                                  group_number,
-                                  rule_key,
-                                  source_disciplines,
-                                  source_subjects,
-                                  sending_courses,
-                                  destination_disciplines,
-                                  receiving_courses,
-                                  priority,
-                                  effective_date)
-                                values (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                                returning id""",
-                 rule_key + (':'.join([str(part) for part in rule_key]),
-                             source_disciplines_str,
-                             source_subjects_str,
-                             sending_courses,
-                             destination_disciplines_str,
-                             receiving_courses,
-                             rules_dict[rule_key].priority,
-                             rules_dict[rule_key].effective_date.isoformat()))
-  rule_id = cursor.fetchone()[0]
-
-  # Sort and insert the source_courses
+  # Build the (sorted) discipline, subject, and course arrays
+  source_disciplines = sorted(rules_dict[rule_key].source_disciplines)
+  destination_disciplines = sorted(rules_dict[rule_key].destination_disciplines)
+  source_subjects = sorted(rules_dict[rule_key].source_subjects)
+  sending_courses = sorted([f'{c.course_id:06}.{c.offer_nbr}'
+                            for c in rules_dict[rule_key].source_courses])
+  receiving_courses = sorted([f'{c.course_id:06}.{c.offer_nbr}'
+                              for c in rules_dict[rule_key].destination_courses])
+
+  rule_key_str = rule_key_strs[rule_key]
+  rule_id = rule_ids[rule_key_str]
+  institution = rule_key.source_institution
+  emit('transfer_rules', institution, rule_key + (rule_key_str,
+                                                  pg_array(source_disciplines),
+                                                  pg_array(source_subjects),
+                                                  pg_array(sending_courses),
+                                                  pg_array(destination_disciplines),
+                                                  pg_array(receiving_courses),
+                                                  rules_dict[rule_key].priority,
+                                                  rules_dict[rule_key].effective_date.isoformat(),
+                                                  rule_id))
+
+  for course in rules_dict[rule_key].source_courses:
+    course_rule_rows.add((course.course_id, 'S', rule_key.destination_institution, rule_id,
+                          rule_key_str))
+  for course in rules_dict[rule_key].destination_courses:
+    course_rule_rows.add((course.course_id, 'D', rule_key.destination_institution, rule_id,
+                          rule_key_str))
+
+  # Sort the source_courses and destination_courses
   for course in sorted(rules_dict[rule_key].source_courses,
                        key=lambda c: (c.discipline, c.cat_num, c.offer_nbr)):
-    cursor.execute("""insert into source_courses
-                                  (
-                                    rule_id,
-                                    course_id,
-                                    offer_nbr,
-                                    offer_count,
-                                    discipline,
-                                    catalog_number,
-                                    cat_num,
-                                    cuny_subject,
-                                    min_credits,
-                                    max_credits,
-                                    credits_source,
-                                    min_gpa,
-                                    max_gpa
-                                  )
-                                  values (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                   """, (rule_id, ) + course)
-
-  # Sort and insert the destination_courses
+    emit('source_courses', institution, (rule_id, institution) + course)
   for course in sorted(rules_dict[rule_key].destination_courses,
                        key=lambda c: (c.discipline, c.cat_num, c.offer_nbr)):
-    cursor.execute("""insert into destination_courses
-                                  (
-                                    rule_id,
-                                    course_id,
-                                    offer_nbr,
-                                    offer_count,
-                                    discipline,
-                                    catalog_number,
-                                    cat_num,
-                                    cuny_subject,
-                                    transfer_credits
-                                  )
-                                  values (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                   """, (rule_id, ) + course)
+    emit('destination_courses', institution, (rule_id, institution) + course)
+
+if partitioned:
+  institutions = sorted(partition_rows['transfer_rules'].keys())
+  with ThreadPoolExecutor(max_workers=max(1, len(institutions))) as executor:
+    list(executor.map(load_partition, institutions))
+else:
+  for table, writer in writers.items():
+    writer.close()
+    writer_conns[table].commit()
+    writer_conns[table].close()
+copy_rows(cursor, 'course_rule_map', sorted(course_rule_rows))
+run_metrics.wrote(len(course_rule_rows))
+print(f'  Loaded {len(rules_dict):,} rules in {perf_counter() - load_start:.1f} sec '
+      f'({"partitioned, in parallel" if partitioned else "streamed"})', file=sys.stderr)
 
 cursor.execute('select count(*) from transfer_rules')
 num_rules = cursor.fetchone()[0]
@@ -499,7 +630,7 @@ if args.progress:
   mins = int(secs / 60)
   secs = int(secs - 60 * mins)
   print(f'\n  That took {mins} min {secs} sec.', file=terminal)
-  print(f'\nThere are {num_rules:,} rules', file=terminal)
+  print(f'\nThere are {num_rules:,} rules ({num_new_ids:,} new rule ids)', file=terminal)
 
 conflicts.close()
 conn.commit()
@@ -510,3 +641,4 @@ if args.report:
   mins = int(secs / 60)
   secs = int(secs - 60 * mins)
   print(f'\n  Generated {num_rules:,} rules in {mins} min {secs} sec.')
+  print(conflicts.summary(), end='')
@@ -0,0 +1,47 @@
+-- Post-load stage: get the freshly loaded tables into shape for the app’s first lookups.
+--   1. Order the rows of source_courses and destination_courses physically by rule_id, so the
+--      courses of a rule are in one or two pages instead of scattered through the table. (When
+--      the tables are partitioned, this needs PostgreSQL 15 or later.)
+--   2. Update the planner statistics for every table.
+--   3. Load the tables and indexes the app uses most into shared buffers.
+-- The rule_id indexes are created by transfer_rules_constraints.sql, and the materialized views by
+-- lookup_views.sql.
+
+cluster source_courses using source_courses_rule_id_idx;
+cluster destination_courses using destination_courses_rule_id_idx;
+
+analyze;
+
+-- pg_prewarm is in contrib, which not every installation has (bench_update.py may run against
+-- one that doesn’t); without it, the tables just start out cold.
+select exists (select 1 from pg_available_extensions where name = 'pg_prewarm') as have_prewarm
+\gset
+\if :have_prewarm
+create extension if not exists pg_prewarm;
+with hot_tables as (
+  select unnest(array['transfer_rules',
+                      'source_courses',
+                      'destination_courses',
+                      'subject_rule_map',
+                      'course_rule_map',
+                      'cuny_courses',
+                      'rules_by_subject',
+                      'rule_courses']::regclass[]) as oid
+),
+-- Partitioned tables (see create_transfer_rules.sql) and their indexes have no storage of their
+-- own: prewarm the partitions and their indexes.
+hot_relations as (
+  select oid from hot_tables
+  union
+  select p.relid from hot_tables h, pg_partition_tree(h.oid) p
+)
+select c.relname, pg_prewarm(c.oid) as blocks
+  from pg_class c
+ where c.relkind in ('r', 'm', 'i')
+   and (c.oid in (select oid from hot_relations)
+        or c.oid in (select indexrelid from pg_index
+                      where indrelid in (select oid from hot_relations)))
+ order by c.relname;
+\else
+\echo 'pg_prewarm is not available: tables not prewarmed'
+\endif
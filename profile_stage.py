@@ -0,0 +1,118 @@
+#! /usr/local/bin/python3
+""" Run one of the update_db Python stages under cProfile, and write a report on where its time
+    went beside update.log:
+
+      profile_<stage>.log     Wall time, split into time spent waiting for the db (the statements
+                              and server-side cursor fetches timed by curriculum_db) and the rest,
+                              which is Python; the functions that took the most time; and, with
+                              --tracemalloc, the lines that allocated the most memory and the peak.
+      profile_<stage>.pstats  The raw profile, for pstats or snakeviz.
+
+    Usage: profile_stage.py [--tracemalloc] [--top N] script.py [script options]
+
+    update_db runs its Python stages this way when given --profile (or --profile-memory, for
+    --tracemalloc), except the ones run_stages.py runs, which it profiles one by one with
+    StageProfile, from here. The stage runs as __main__, with its own command line, and
+    exits with its own status.
+
+    cProfile only sees the main thread, so the COPY time of the bulk_load.CopyWriter threads appears
+    in the db time but not in the function list, and the db and Python times can add up to more
+    than the wall time when they overlap.
+"""
+import argparse
+import cProfile
+import pstats
+import runpy
+import sys
+import tracemalloc
+
+from pathlib import Path
+from time import perf_counter
+
+import curriculum_db
+
+# class StageProfile
+# -------------------------------------------------------------------------------------------------
+class StageProfile:
+  """ cProfile, and optionally tracemalloc, around one stage, from start() to stop().
+  """
+
+  def __init__(self, trace_memory=False):
+    self.trace_memory = trace_memory
+    self.profiler = cProfile.Profile()
+
+  def start(self):
+    curriculum_db.reset_query_times()
+    if self.trace_memory:
+      tracemalloc.start()
+      self.start_snapshot = tracemalloc.take_snapshot()
+    self.start_time = perf_counter()
+    self.profiler.enable()
+
+  def stop(self):
+    self.profiler.disable()
+    self.wall_seconds = perf_counter() - self.start_time
+    if self.trace_memory:
+      self.end_snapshot = tracemalloc.take_snapshot()
+      self.current, self.peak = tracemalloc.get_traced_memory()
+      tracemalloc.stop()
+
+  def report(self, stage, script_args, exit_status, output_dir='.', top=30):
+    """ Write profile_<stage>.log and profile_<stage>.pstats in output_dir.
+    """
+    output_dir = Path(output_dir)
+    with open(output_dir / f'profile_{stage}.log', 'w') as report:
+      with curriculum_db._query_times_lock:
+        db_seconds = sum(seconds for count, seconds in curriculum_db.query_times.values())
+        db_statements = sum(count for count, seconds in curriculum_db.query_times.values())
+      print(f'{stage}: {" ".join(script_args)}\n'
+            f'  Wall time    {self.wall_seconds:10.3f} sec\n'
+            f'  Database     {db_seconds:10.3f} sec  ({db_statements:,} statements and fetches)\n'
+            f'  Python       {max(0.0, self.wall_seconds - db_seconds):10.3f} sec\n'
+            f'  Exit status  {exit_status!s:>10}\n', file=report)
+
+      print('Statements\n----------', file=report)
+      curriculum_db.report_query_times(file=report, limit=top)
+
+      print('\nFunctions by cumulative time\n----------------------------', file=report)
+      stats = pstats.Stats(self.profiler, stream=report)
+      stats.strip_dirs().sort_stats('cumulative').print_stats(top)
+      print('Functions by own time\n---------------------', file=report)
+      stats.sort_stats('tottime').print_stats(top)
+      stats.dump_stats(output_dir / f'profile_{stage}.pstats')
+
+      if self.trace_memory:
+        print(f'Memory\n------\n  Peak traced  {self.peak / 2**20:10.1f} MB\n'
+              f'  At exit      {self.current / 2**20:10.1f} MB\n\n'
+              f'  Growth from start to end of stage, by line:', file=report)
+        for difference in self.end_snapshot.compare_to(self.start_snapshot, 'lineno')[0:top]:
+          print(f'  {difference}', file=report)
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Profile an update_db stage')
+  parser.add_argument('--top', '-n', type=int, default=30,
+                      help='number of functions, statements, and allocation sites to report')
+  parser.add_argument('--tracemalloc', '-t', action='store_true',
+                      help='also trace memory allocations (slows the stage down)')
+  parser.add_argument('--output-dir', '-o', default='.')
+  parser.add_argument('script')
+  parser.add_argument('script_args', nargs=argparse.REMAINDER)
+  args = parser.parse_args()
+
+  # The stage sees its own command line.
+  sys.argv = [args.script] + args.script_args
+
+  profile = StageProfile(args.tracemalloc)
+  exit_status = 0
+  profile.start()
+  try:
+    runpy.run_path(args.script, run_name='__main__')
+  except SystemExit as e:
+    exit_status = 0 if e.code is None else e.code
+  finally:
+    profile.stop()
+    profile.report(Path(args.script).stem, args.script_args, exit_status, args.output_dir,
+                   args.top)
+
+  sys.exit(exit_status)
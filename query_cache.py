@@ -0,0 +1,235 @@
+""" Parse cache for the query files.
+
+    The same query files are parsed by several scripts: the rules query by populate_transfer_rules,
+    bogus_rules, raw_rules-populate, and analyze_transfer_rules, and the catalog by
+    populate_cuny_courses, cuny_departments, and mk_course_info. load(path) parses a file with
+    QueryReader the first time it is seen, and saves the result in query_cache/ (or $QUERY_CACHE)
+    in a columnar binary file, named for the query and a hash of the file’s contents. Later loads
+    of a file with the same contents, by any script, in the same run or in an ad hoc session days
+    later, memory-map that file instead of parsing the csv again, and a second load in the same
+    process (run_stages.py) gets the table already in memory.
+
+      table = load('latest_queries/QNS_QCCV_CU_CATALOG_NP.csv', header='Institution')
+      for row in table.namedtuples():
+        …
+
+    Cache file format: one line of JSON with the column names, the number of rows, the byte spans
+    of the sections that follow, and any rows that don’t have one value per column (kept as they
+    were parsed, so the readers can report them); then two sections for each column: an array of
+    4-byte indices, one per row, into the column’s distinct values, and the distinct values, in
+    UTF-8, separated by NULs. Most columns (institutions, subjects, dates, flags) have few distinct
+    values, so a column is loaded, the first time it is used, by decoding just those and looking
+    them up through the memory-mapped indices, and rows that share a value share one str. A
+    script pays only for the columns it reads.
+
+    Only the last few cache files for each query are kept.
+"""
+import json
+import mmap
+import os
+import sys
+import tempfile
+
+from array import array
+from collections import Counter, namedtuple
+from hashlib import blake2b
+from pathlib import Path
+
+from query_csv import QueryReader
+
+FORMAT = 1
+INDEX_TYPE = 'I'  # 4-byte unsigned
+KEEP = 4  # cache files kept for each query
+
+_tables = dict()  # (path, header, size, mtime) => QueryTable
+loads = Counter()  # 'parsed', 'mapped', or 'memory' => number of loads
+
+
+# class QueryTable
+# -------------------------------------------------------------------------------------------------
+class QueryTable:
+  """ The data rows of a query file, with the same interface as QueryReader (columns, index,
+      iteration, and namedtuples()), except that the rows are tuples, and the table can be iterated
+      over more than once. Also len(), and column(name), the list of values in one column.
+  """
+
+  def __init__(self, columns, num_rows, load_column, ragged=None):
+    self.columns = columns
+    self.index = {column: position for position, column in enumerate(columns)}
+    self.ragged = ragged or dict()  # row number => row
+    self._num_rows = num_rows
+    self._load_column = load_column
+    self._values = [None] * len(columns)
+
+  def _column(self, position):
+    if self._values[position] is None:
+      self._values[position] = self._load_column(position) if self._num_rows else []
+    return self._values[position]
+
+  def column(self, name):
+    return self._column(self.index[name])
+
+  def __len__(self):
+    return self._num_rows
+
+  def __iter__(self):
+    rows = zip(*[self._column(position) for position in range(len(self.columns))])
+    if not self.ragged:
+      return rows
+    return (self.ragged.get(row_num, row) for row_num, row in enumerate(rows))
+
+  def namedtuples(self, name='Row'):
+    """ The rows as named tuples, with the normalized column names as fields.
+    """
+    return map(namedtuple(name, self.columns)._make, self)
+
+
+# cache_dir()
+# -------------------------------------------------------------------------------------------------
+def cache_dir():
+  return Path(os.getenv('QUERY_CACHE', 'query_cache'))
+
+
+# content_hash()
+# -------------------------------------------------------------------------------------------------
+def content_hash(path, header=None):
+  """ Hash of the contents of the file at path, and of the header row the readers look for, which
+      changes what is parsed.
+  """
+  hash = blake2b(f'{FORMAT} {header}\n'.encode(), digest_size=16)
+  with open(path, 'rb') as file:
+    while chunk := file.read(1 << 20):
+      hash.update(chunk)
+  return hash.hexdigest()
+
+
+# _parse()
+# -------------------------------------------------------------------------------------------------
+def _parse(path, header):
+  """ Columns, number of rows, column values, and ragged rows of the query file at path.
+  """
+  reader = QueryReader(path, header=header)
+  columns = reader.columns
+  rows = list(reader)
+  ragged = dict()
+  for row_num, row in enumerate(rows):
+    if len(row) != len(columns):
+      ragged[row_num] = row
+      rows[row_num] = [''] * len(columns)
+  values = [list(column) for column in zip(*rows)] or [[] for column in columns]
+  return columns, len(rows), values, ragged
+
+
+# _write()
+# -------------------------------------------------------------------------------------------------
+def _write(cache_file, columns, num_rows, values, ragged):
+  """ Save a parsed query file in cache_file. Returns False, and saves nothing, if a value
+      contains a NUL, which would be taken as a separator when the file is read back.
+  """
+  sections = []
+  for column in values:
+    distinct = list(dict.fromkeys(column))
+    blob = '\0'.join(distinct).encode()
+    if blob.count(b'\0') != max(len(distinct) - 1, 0):
+      return False
+    positions = {value: position for position, value in enumerate(distinct)}
+    sections += [array(INDEX_TYPE, map(positions.__getitem__, column)).tobytes(), blob]
+  # Each section starts on a 4-byte boundary, so the index arrays are aligned.
+  spans = []
+  offset = 0
+  for section in sections:
+    spans.append((offset, offset + len(section)))
+    offset += len(section) + (-len(section) % 4)
+  header = json.dumps({'format': FORMAT, 'byteorder': sys.byteorder, 'columns': columns,
+                       'rows': num_rows, 'spans': spans, 'ragged': ragged})
+  header = header.encode() + b'\n'
+  header += bytes(-len(header) % 4)
+  cache_file.parent.mkdir(parents=True, exist_ok=True)
+  # Write to a temporary file and rename it, so a concurrent reader never sees a partial file.
+  fd, temp_name = tempfile.mkstemp(dir=cache_file.parent, suffix='.tmp')
+  try:
+    with os.fdopen(fd, 'wb') as file:
+      file.write(header)
+      for section in sections:
+        file.write(section + bytes(-len(section) % 4))
+    os.replace(temp_name, cache_file)
+  except BaseException:
+    os.unlink(temp_name)
+    raise
+  return True
+
+
+# _map()
+# -------------------------------------------------------------------------------------------------
+def _map(cache_file):
+  """ QueryTable for cache_file, or None if it is not a cache file in the current format.
+  """
+  with open(cache_file, 'rb') as file:
+    try:
+      meta = json.loads(file.readline())
+    except ValueError:
+      return None
+    if not isinstance(meta, dict) or meta.get('format') != FORMAT or \
+       meta.get('byteorder') != sys.byteorder:
+      return None
+    start = file.tell() + (-file.tell() % 4)
+    data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+  view = memoryview(data)
+  spans = [(start + begin, start + end) for begin, end in meta['spans']]
+
+  def load_column(position):
+    (indices_begin, indices_end), (values_begin, values_end) = spans[2 * position:2 * position + 2]
+    distinct = str(data[values_begin:values_end], 'utf-8').split('\0')
+    return list(map(distinct.__getitem__, view[indices_begin:indices_end].cast(INDEX_TYPE)))
+
+  ragged = {int(row_num): row for row_num, row in meta['ragged'].items()}
+  return QueryTable(meta['columns'], meta['rows'], load_column, ragged)
+
+
+# _prune()
+# -------------------------------------------------------------------------------------------------
+def _prune(query):
+  """ Delete all but the KEEP newest cache files for query.
+  """
+  cache_files = sorted(cache_dir().glob(f'{query}-*.qcache'),
+                       key=lambda cache_file: cache_file.stat().st_mtime, reverse=True)
+  for cache_file in cache_files[KEEP:]:
+    cache_file.unlink(missing_ok=True)
+
+
+# load()
+# -------------------------------------------------------------------------------------------------
+def load(path, header=None):
+  """ QueryTable for the query file at path. If header is given, rows before the one whose first
+      field is header are skipped, as with QueryReader.
+  """
+  path = Path(path)
+  status = path.stat()
+  key = (str(path.resolve()), header, status.st_size, status.st_mtime_ns)
+  if key in _tables:
+    loads['memory'] += 1
+    return _tables[key]
+
+  cache_file = cache_dir() / f'{path.stem}-{content_hash(path, header)}.qcache'
+  try:
+    table = _map(cache_file)
+  except FileNotFoundError:
+    table = None
+  if table is not None:
+    loads['mapped'] += 1
+    try:
+      os.utime(cache_file)  # so _prune() keeps the files in use
+    except OSError:
+      pass
+  else:
+    loads['parsed'] += 1
+    columns, num_rows, values, ragged = _parse(path, header)
+    table = QueryTable(columns, num_rows, values.__getitem__, ragged)
+    # The cache is only an optimization: if it can’t be written, the table is still good.
+    try:
+      if _write(cache_file, columns, num_rows, values, ragged):
+        _prune(path.stem)
+    except OSError:
+      pass
+  _tables[key] = table
+  return table
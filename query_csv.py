@@ -0,0 +1,104 @@
+""" Streaming reader for the CUNYfirst query files.
+
+    Every script used to repeat the same steps for each query file: strip the byte order mark from
+    the first header, find the header row (some queries have a title line above it), normalize the
+    headers to lower_case_with_underscores, and then look up each field with cols.index() on every
+    row. QueryReader does the first three once, as the file is opened, and gives the position of
+    each column in index, so the per-row lookups become list indexing:
+
+      reader = QueryReader('latest_queries/ACAD_CAREER_TBL.csv')
+      institution = reader.index['institution']
+      for row in reader:
+        … row[institution] …
+
+    namedtuples() yields the rows as named tuples instead, for files whose headers are all valid
+    identifiers.
+
+    The files are decoded as they are read: UTF-16 if they start with a UTF-16 byte order mark,
+    otherwise UTF-8 (with or without a BOM), with any bytes that are not valid UTF-8 taken as
+    Windows-1252, which is what CUNYfirst writes them in. That is the clean-up the separate iconv
+    pass over the downloaded files does, so the files can be read whether or not that pass has run.
+"""
+import codecs
+import csv
+
+from collections import namedtuple
+
+
+# _cp1252_fallback()
+# -------------------------------------------------------------------------------------------------
+def _cp1252_fallback(error):
+  """ Decoding error handler: decode the bytes that are not valid UTF-8 as Windows-1252.
+  """
+  bad_bytes = error.object[error.start:error.end]
+  return bad_bytes.decode('cp1252', errors='replace'), error.end
+
+
+codecs.register_error('cp1252_fallback', _cp1252_fallback)
+
+
+# normalize()
+# -------------------------------------------------------------------------------------------------
+def normalize(header):
+  """ Column name for a query header: 'Crse Attr' => 'crse_attr', 'Pre/Co-req' => 'pre_co-req'.
+  """
+  return header.strip().lower().replace(' ', '_').replace('/', '_')
+
+
+# encoding()
+# -------------------------------------------------------------------------------------------------
+def encoding(path):
+  """ The codec for path, from its byte order mark, if any.
+  """
+  with open(path, 'rb') as file:
+    start = file.read(2)
+  if start in (codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE):
+    return 'utf-16'
+  return 'utf-8-sig'
+
+
+# class QueryReader
+# -------------------------------------------------------------------------------------------------
+class QueryReader:
+  """ The data rows of a query file, as lists of strings. If header is given, rows before the one
+      whose first field is header are skipped; otherwise the first row is the header row.
+      columns is the list of normalized column names, and index maps each name to its position.
+  """
+
+  def __init__(self, path, header=None):
+    self.path = path
+    self._file = open(path, newline='', encoding=encoding(path), errors='cp1252_fallback')
+    self._reader = csv.reader(self._file)
+    self.columns = None
+    for row in self._reader:
+      if row and (header is None or row[0].strip() == header):
+        self.columns = [normalize(value) for value in row]
+        break
+    if self.columns is None:
+      self._file.close()
+      raise ValueError(f'{path}: no header row'
+                       f'{"" if header is None else " starting with " + header}')
+    self.index = {column: position for position, column in enumerate(self.columns)}
+
+  def __iter__(self):
+    try:
+      yield from self._reader
+    finally:
+      self._file.close()
+
+  def namedtuples(self, name='Row'):
+    """ The rows as named tuples, with the normalized column names as fields.
+    """
+    Row = namedtuple(name, self.columns)
+    make = Row._make
+    for row in self:
+      yield make(row)
+
+  def close(self):
+    self._file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
@@ -5,14 +5,12 @@
 import os
 import sys
 import argparse
-import csv
 
-from collections import namedtuple
 from datetime import date
 from time import perf_counter
 
-import psycopg2
-from psycopg2.extras import NamedTupleCursor
+from curriculum_db import connect, Prepared
+import query_cache
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--debug', '-d', action='store_true')
@@ -21,39 +19,34 @@ parser.add_argument('--report', '-r', action='store_true')    # to stdout
 args = parser.parse_args()
 
 
-db = psycopg2.connect('dbname=cuny_curriculum')
-cursor = db.cursor(cursor_factory=NamedTupleCursor)
+db = connect()
+cursor = db.cursor()
 
 # Get most recent transfer_rules query file
 cf_rules_file = './latest_queries/QNS_CV_SR_TRNS_INTERNAL_RULES.csv'
 start_time = perf_counter()
-num_lines = sum(1 for line in open(cf_rules_file))
-with open(cf_rules_file) as csvfile:
-  csv_reader = csv.reader(csvfile)
-  cols = None
-  line_num = 0
-  for line in csv_reader:
-    if cols is None:
-      line[0] = line[0].replace('\ufeff', '')
-      cols = [val.lower().replace(' ', '_').replace('/', '_') for val in line]
-      query = 'insert into raw_rules values (' + ', '.join(['%s' for c in cols]) + ')'
-    else:
-      line_num += 1
-      if args.progress and line_num % 10000 == 0:
-        elapsed_time = perf_counter() - start_time
-        total_time = num_lines * elapsed_time / line_num
-        secs_remaining = total_time - elapsed_time
-        mins_remaining = int((secs_remaining) / 60)
-        secs_remaining = int(secs_remaining - (mins_remaining * 60))
-        print('line {:,}/{:,} ({:.1f}%) Estimated time remaining: {}:{:02}\r'
-              .format(line_num,
-                      num_lines,
-                      100 * line_num / num_lines,
-                      mins_remaining,
-                      secs_remaining),
-              end='',
-              file=sys.stderr)
-      cursor.execute(query, line)
+rules_table = query_cache.load(cf_rules_file)
+num_lines = len(rules_table)
+query = 'insert into raw_rules values (' + ', '.join(['%s' for c in rules_table.columns]) + ')'
+insert_raw_rule = Prepared(cursor, 'insert_raw_rule', query)
+line_num = 0
+for line in rules_table:
+  line_num += 1
+  if args.progress and line_num % 10000 == 0:
+    elapsed_time = perf_counter() - start_time
+    total_time = num_lines * elapsed_time / line_num
+    secs_remaining = total_time - elapsed_time
+    mins_remaining = int((secs_remaining) / 60)
+    secs_remaining = int(secs_remaining - (mins_remaining * 60))
+    print('line {:,}/{:,} ({:.1f}%) Estimated time remaining: {}:{:02}\r'
+          .format(line_num,
+                  num_lines,
+                  100 * line_num / num_lines,
+                  mins_remaining,
+                  secs_remaining),
+          end='',
+          file=sys.stderr)
+  insert_raw_rule.execute(line)
 
 db.commit()
 db.close()
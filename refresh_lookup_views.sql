@@ -0,0 +1,3 @@
+-- Refresh the materialized views defined in lookup_views.sql without locking out readers.
+refresh materialized view concurrently rules_by_subject;
+refresh materialized view concurrently rule_courses;
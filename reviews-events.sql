@@ -1,6 +1,9 @@
+-- The pending_reviews and (review_)events tables come from users of the app, so they live in the
+-- persistent schema, which is not rebuilt (see persistent_schema.sql). The foreign keys of events
+-- are maintained by persistent_constraints.sql.
+
 -- The pending_reviews table
-drop table if exists pending_reviews cascade;
-create table pending_reviews (
+create table if not exists persistent.pending_reviews (
 token text primary key,
 email text,
 reviews text,
@@ -8,12 +11,10 @@ when_entered timestamptz default now()
 );
 
 -- The (review_)events table
-drop table if exists events cascade;
-
-create table events (
+create table if not exists persistent.events (
 id serial primary key,
-rule_id integer references transfer_rules,
-event_type text references review_status_bits(abbr),
+rule_id integer,      -- references transfer_rules
+event_type text,      -- references review_status_bits(abbr)
 who text,
 what text,
 event_time timestamptz default now()
@@ -1,38 +1,43 @@
 -- Roles of users, by institution
 -- Each person listed will be notified of events involving their institution.
-drop table if exists roles cascade;
-drop table if exists person_roles cascade;
+-- The tables are in the persistent schema (see persistent_schema.sql), so they keep any changes
+-- made to them between updates. The foreign key from person_roles to cuny_institutions is
+-- maintained by persistent_constraints.sql.
 
-create table roles (
+create table if not exists persistent.roles (
   id text primary key,
   description text
 );
 
-create table person_roles (
+create table if not exists persistent.person_roles (
   id serial primary key,
-  institution text references cuny_institutions default null,
+  institution text default null,  -- references cuny_institutions
   job_title text,
-  role text references roles,
+  role text references persistent.roles,
   email text not null,
   name text not null
 );
 
 -- Eventually, initialization/editing should be done via web forms. For now, it's ad hoc.
 
-insert into roles values('cuny_registrar', 'University Registrar');
-insert into roles values('college_registrar', 'College  Registrar');
-insert into roles values('college_provost', 'College Provost');
-insert into roles values('webmaster', 'Webmaster');
+insert into persistent.roles values ('cuny_registrar', 'University Registrar'),
+                                   ('college_registrar', 'College  Registrar'),
+                                   ('college_provost', 'College Provost'),
+                                   ('webmaster', 'Webmaster')
+  on conflict do nothing;
 
-insert into person_roles values(default, null,
-                                'Executive University Registrar',
-                                'cuny_registrar',
-                                'nobody@cuny.edu', 'University Registrar');
-insert into person_roles values(default, null,
-                                'Professor of Computer Science',
-                                'webmaster',
-                                'Christopher.Vickery@qc.cuny.edu', 'Christopher Vickery');
-insert into person_roles values(default, 'QNS01',
-                                'Associate Provost',
-                                'college_provost',
-                                'nobody@qc.cuny.edu', 'Alicia Alvero');
+-- Initial people, if there are none yet.
+insert into persistent.person_roles (institution, job_title, role, email, name)
+  select * from (values (null,
+                         'Executive University Registrar',
+                         'cuny_registrar',
+                         'nobody@cuny.edu', 'University Registrar'),
+                        (null,
+                         'Professor of Computer Science',
+                         'webmaster',
+                         'Christopher.Vickery@qc.cuny.edu', 'Christopher Vickery'),
+                        ('QNS01',
+                         'Associate Provost',
+                         'college_provost',
+                         'nobody@qc.cuny.edu', 'Alicia Alvero')) as people
+   where not exists (select 1 from persistent.person_roles);
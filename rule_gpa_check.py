@@ -13,8 +13,7 @@
 #   Else add the tuple for this row to the list, and report any gaps/overlaps detected.
 
 from collections import defaultdict
-import psycopg2
-from psycopg2.extras import NamedTupleCursor
+from curriculum_db import connect, server_rows
 
 
 class struct:
@@ -56,21 +55,20 @@ def analyze(institution, course_id, ranges):
     laps[(institution, frozenset(ranges))] += 1
 
 
-conn = psycopg2.connect('dbname=cuny_curriculum')
-cursor = conn.cursor(cursor_factory=NamedTupleCursor)
+conn = connect()
 
 laps = defaultdict(int)
 gaps = defaultdict(int)
 
 previous_row = struct(course_id=-1, institution='')
-cursor.execute("""
-                select r.destination_institution as institution, r.id, s.course_id, min_gpa, max_gpa
-                from transfer_rules r, source_courses s
-                where r.id = s.rule_id
-                order by destination_institution, course_id;
-               """)
 ranges = []
-for row in cursor.fetchall():
+for row in server_rows("""
+                       select r.destination_institution as institution, r.id, s.course_id,
+                              min_gpa, max_gpa
+                       from transfer_rules r, source_courses s
+                       where r.id = s.rule_id
+                       order by destination_institution, course_id
+                       """):
   if previous_row.course_id != row.course_id or previous_row.institution != row.institution:
     if len(ranges) > 1:
       analyze(previous_row.institution, previous_row.course_id, ranges)
@@ -0,0 +1,29 @@
+-- Registry of transfer rule ids, keyed by rule_key.
+--
+-- transfer_rules is rebuilt from scratch every time update_db runs, but events reference rules by
+-- id. populate_transfer_rules.py takes each rule’s id from this table, adding new rows only for
+-- rule keys it has not seen before, so a rule keeps the same id across rebuilds for as long as its
+-- key exists (and ids of rules that go away are never reused).
+--
+-- The table is in the persistent schema, so it survives rebuilds of the public schema. The first
+-- time this script runs, it seeds the registry with the ids in the existing transfer_rules table so
+-- the events that reference them remain valid.
+create table if not exists persistent.rule_ids (
+  rule_key text primary key,
+  id integer generated by default as identity unique
+);
+
+do $$
+  begin
+    if to_regclass('transfer_rules') is not null then
+      insert into persistent.rule_ids (rule_key, id)
+        select rule_key, id from transfer_rules
+      on conflict do nothing;
+    end if;
+  end;
+$$;
+
+-- Start assigning new ids above any that were seeded.
+select setval(pg_get_serial_sequence('persistent.rule_ids', 'id'), max(id))
+  from persistent.rule_ids
+having max(id) is not null;
@@ -0,0 +1,263 @@
+#! /usr/local/bin/python3
+""" Run telemetry for update_db.
+
+    Each Python stage imports this module and counts the rows it reads, the rows it writes, and the
+    rows it rejects, by category. When the stage exits, its counts, duration, and peak memory are
+    recorded as one row in a SQLite file, update_metrics.db (or $UPDATE_METRICS_DB), under the run
+    id update_db exports as UPDATE_RUN_ID. The store is SQLite rather than a table in
+    cuny_curriculum because it has to outlive rebuilds of that db, including failed ones. Nothing is
+    recorded when a stage is run by hand, without UPDATE_RUN_ID.
+
+    Usage:
+      run_metrics.py begin [--options text]   Start a run, and print its id.
+      run_metrics.py end [status]             Finish the current run (default status: completed).
+      run_metrics.py report [--runs N] [--threshold PCT] [--min-seconds S] [--run ID]
+                                              Compare a run (default: the latest) to the trailing N
+                                              completed runs, and flag the stages whose duration or
+                                              peak memory grew by more than the threshold.
+
+    When several stages run in one process (run_stages.py), the driver calls start_stage() and
+    record_stage() around each one instead. start_stage() resets the process’s peak resident set
+    size (on Linux, through /proc/self/clear_refs), so each stage’s peak memory is its own. Where
+    the peak can’t be reset, stages run this way record no peak memory, and are not flagged for
+    memory growth.
+
+    Stages that fail still record their metrics, but a run that does not reach `end` stays
+    “running”, and only completed runs are used as the baseline for comparisons.
+"""
+import argparse
+import atexit
+import json
+import os
+import re
+import resource
+import sqlite3
+import statistics
+import sys
+
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+
+METRICS_DB = os.getenv('UPDATE_METRICS_DB', 'update_metrics.db')
+RUN_ID = int(os.environ['UPDATE_RUN_ID']) if os.getenv('UPDATE_RUN_ID') else None
+
+counts = Counter()    # rows_read, rows_written
+rejects = Counter()   # category => rows
+
+_start_time = perf_counter()
+_started = datetime.now().isoformat(timespec='seconds')
+_peak_is_stage = True  # the peak memory so far is the current stage’s own
+
+
+# read(), wrote(), reject()
+# -------------------------------------------------------------------------------------------------
+def read(num_rows=1):
+  counts['rows_read'] += num_rows
+
+
+def wrote(num_rows=1):
+  counts['rows_written'] += num_rows
+
+
+def reject(category, num_rows=1):
+  rejects[category] += num_rows
+
+
+# connect()
+# -------------------------------------------------------------------------------------------------
+def connect():
+  """ Connection to the metrics store, creating its tables the first time.
+  """
+  conn = sqlite3.connect(METRICS_DB, timeout=30)
+  conn.row_factory = sqlite3.Row
+  conn.executescript("""
+      create table if not exists runs (
+        id integer primary key,
+        started text,
+        finished text,
+        seconds real,
+        status text default 'running',
+        options text);
+      create table if not exists stages (
+        run_id integer references runs,
+        stage text,
+        started text,
+        seconds real,
+        rows_read integer,
+        rows_written integer,
+        rejects text,  -- json {category: rows}
+        peak_rss_mb real);
+      """)
+  return conn
+
+
+# peak_rss_mb()
+# -------------------------------------------------------------------------------------------------
+def peak_rss_mb():
+  """ Peak resident set size of this process, since it started or since reset_peak_rss(). On Linux
+      that is VmHWM, which clear_refs resets; ru_maxrss also includes threads that have exited,
+      and is in bytes on macOS and in kilobytes on Linux.
+  """
+  try:
+    with open('/proc/self/status') as status:
+      return int(re.search(r'^VmHWM:\s+(\d+) kB', status.read(), re.M).group(1)) / 1024
+  except (OSError, AttributeError):
+    pass
+  max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  if sys.platform == 'darwin':
+    return max_rss / (1024 * 1024)
+  return max_rss / 1024
+
+
+# reset_peak_rss()
+# -------------------------------------------------------------------------------------------------
+def reset_peak_rss():
+  """ Start the peak resident set size over from the current one. Returns False where that isn’t
+      possible (not Linux, or /proc not writable).
+  """
+  try:
+    with open('/proc/self/clear_refs', 'w') as clear_refs:
+      clear_refs.write('5')
+    return True
+  except OSError:
+    return False
+
+
+# record_stage()
+# -------------------------------------------------------------------------------------------------
+def record_stage(stage=None):
+  """ Add a stage’s row (default: this script’s) to the current run, and start counting for the
+      next one. Registered to run at exit.
+  """
+  if RUN_ID is None:
+    return
+  conn = connect()
+  with conn:
+    conn.execute('insert into stages values (?, ?, ?, ?, ?, ?, ?, ?)',
+                 (RUN_ID, stage or Path(sys.argv[0]).stem, _started, perf_counter() - _start_time,
+                  counts['rows_read'], counts['rows_written'], json.dumps(dict(rejects)),
+                  peak_rss_mb() if _peak_is_stage else None))
+  conn.close()
+  start_stage()
+
+
+# start_stage()
+# -------------------------------------------------------------------------------------------------
+def start_stage():
+  """ Reset the counts, the clock, and the peak memory for the next stage to run in this process.
+  """
+  global _start_time, _started, _peak_is_stage
+  counts.clear()
+  rejects.clear()
+  _peak_is_stage = reset_peak_rss()
+  _start_time = perf_counter()
+  _started = datetime.now().isoformat(timespec='seconds')
+
+
+if RUN_ID is not None and __name__ != '__main__':
+  atexit.register(record_stage)
+
+
+# report()
+# -------------------------------------------------------------------------------------------------
+def report(conn, run_id=None, num_runs=5, threshold=25.0, min_seconds=5.0, file=sys.stdout):
+  """ Compare the stages of a run to the medians of the same stages in the trailing num_runs
+      completed runs, and flag increases in duration or peak memory of more than threshold percent
+      (and, for duration, more than min_seconds). Returns the number of regressions.
+  """
+  if run_id is None:
+    run = conn.execute('select * from runs order by id desc limit 1').fetchone()
+  else:
+    run = conn.execute('select * from runs where id = ?', (run_id, )).fetchone()
+  if run is None:
+    print('No runs recorded.', file=file)
+    return 0
+  stages = conn.execute('select * from stages where run_id = ? order by rowid',
+                        (run['id'], )).fetchall()
+  if len(stages) == 0:
+    return 0
+  baseline_runs = [row['id'] for row in
+                   conn.execute("""select id from runs
+                                    where status = 'completed' and id < ?
+                                    order by id desc limit ?""", (run['id'], num_runs))]
+
+  print(f'Run {run["id"]} started {run["started"]} ({run["status"]}) {run["options"] or ""}\n'
+        f'Compared to the median of {len(baseline_runs)} previous completed run(s); '
+        f'flagging growth over {threshold:g}%', file=file)
+  print(f'  {"Stage":<26} {"Seconds":>9} {"Median":>9} {"Change":>8} {"Peak MB":>9} '
+        f'{"Median":>9} {"Read":>11} {"Written":>11} {"Rejected":>9}', file=file)
+  regressions = 0
+  for stage in stages:
+    history = conn.execute(f"""select seconds, peak_rss_mb from stages
+                                where stage = ?
+                                  and run_id in ({", ".join("?" * len(baseline_runs))})""",
+                           (stage['stage'], *baseline_runs)).fetchall()
+    flags = []
+    seconds_change = ''
+    median_seconds = median_rss = ''
+    if history:
+      median_seconds = statistics.median(row['seconds'] for row in history)
+      history_rss = [row['peak_rss_mb'] for row in history if row['peak_rss_mb'] is not None]
+      median_rss = statistics.median(history_rss) if history_rss else 0
+      if median_seconds > 0:
+        change = 100 * (stage['seconds'] - median_seconds) / median_seconds
+        seconds_change = f'{change:+.0f}%'
+        if change > threshold and stage['seconds'] - median_seconds > min_seconds:
+          flags.append('SLOWER')
+      if stage['peak_rss_mb'] is not None and median_rss > 0 and \
+         100 * (stage['peak_rss_mb'] - median_rss) / median_rss > threshold:
+        flags.append('MORE MEMORY')
+      median_seconds = f'{median_seconds:9.1f}'
+      median_rss = f'{median_rss:9.1f}' if history_rss else ''
+    peak_rss = '' if stage['peak_rss_mb'] is None else f'{stage["peak_rss_mb"]:9.1f}'
+    rejected = sum(json.loads(stage['rejects']).values())
+    regressions += len(flags) > 0
+    print(f'  {stage["stage"]:<26} {stage["seconds"]:9.1f} {median_seconds:>9} '
+          f'{seconds_change:>8} {peak_rss:>9} {median_rss:>9} '
+          f'{stage["rows_read"]:11,} {stage["rows_written"]:11,} {rejected:9,} '
+          f'{" ".join(flags)}', file=file)
+  for stage in stages:
+    stage_rejects = json.loads(stage['rejects'])
+    if stage_rejects:
+      print(f'  {stage["stage"]} rejects:', file=file)
+      for category, num_rows in sorted(stage_rejects.items(), key=lambda item: -item[1]):
+        print(f'    {num_rows:9,} {category}', file=file)
+  if regressions:
+    print(f'{regressions} stage(s) regressed.', file=file)
+  return regressions
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='update_db run telemetry')
+  subparsers = parser.add_subparsers(dest='command', required=True)
+  begin_parser = subparsers.add_parser('begin')
+  begin_parser.add_argument('--options', default='')
+  end_parser = subparsers.add_parser('end')
+  end_parser.add_argument('status', nargs='?', default='completed')
+  report_parser = subparsers.add_parser('report')
+  report_parser.add_argument('--run', type=int)
+  report_parser.add_argument('--runs', '-n', type=int, default=5)
+  report_parser.add_argument('--threshold', '-t', type=float, default=25.0)
+  report_parser.add_argument('--min-seconds', '-m', type=float, default=5.0)
+  args = parser.parse_args()
+
+  conn = connect()
+  now = datetime.now().isoformat(timespec='seconds')
+  if args.command == 'begin':
+    with conn:
+      cursor = conn.execute('insert into runs (started, options) values (?, ?)',
+                            (now, args.options))
+    print(cursor.lastrowid)
+  elif args.command == 'end':
+    if RUN_ID is None:
+      sys.exit('UPDATE_RUN_ID is not set')
+    with conn:
+      started = conn.execute('select started from runs where id = ?', (RUN_ID, )).fetchone()
+      seconds = (datetime.now() - datetime.fromisoformat(started['started'])).total_seconds()
+      conn.execute('update runs set finished = ?, seconds = ?, status = ? where id = ?',
+                   (now, seconds, args.status, RUN_ID))
+  else:
+    report(conn, args.run or RUN_ID, args.runs, args.threshold, args.min_seconds)
+  conn.close()
@@ -0,0 +1,199 @@
+#! /usr/local/bin/python3
+""" Build the tables that come from the query files, from cuny_programs to subject_rule_map, in one
+    Python process.
+
+    update_db used to start a fresh interpreter for each of these stages, each of which imported
+    psycopg2 and the repo’s modules again and re-read reference tables the stages before it had just
+    built. Here the Python stages run in order in this process, as __main__ with their own command
+    lines (the way profile_stage.py runs them), and the sql stages between them run through psql.
+    The modules are imported once, the reference tables and the course index are handed from stage
+    to stage through stage_cache, and query files are parsed once, through query_cache.
+
+    Between stages the db connections are closed, as they would be when a stage’s process exited,
+    so each stage starts in a clean transaction and no stage holds locks while the next one runs.
+
+    Each stage’s output is appended to update.log (the sql stages’ to update_psql.log, and
+    check_total_hours’ report to check_contact_hours.log), and the stage name and “done.” are
+    written to stdout, for update_db to tee into update.log. A failing stage ends the run with exit
+    status 1, after writing its traceback to update.log. At the end, the time of each stage, the
+    one-time import time, and the reference tables loaded and reused are reported on stdout.
+
+    With --profile (and --tracemalloc), each Python stage gets its own profile_<stage>.log and
+    .pstats, as it would running under profile_stage.py, with the db statement times started over
+    for each stage.
+"""
+import argparse
+import atexit
+import runpy
+import subprocess
+import sys
+import traceback
+
+from collections import namedtuple
+from contextlib import redirect_stdout, redirect_stderr
+from pathlib import Path
+from time import perf_counter
+
+# The modules the stages share, including psycopg2, are imported (and timed) once, here.
+import_start = perf_counter()
+import curriculum_db
+import run_metrics
+import stage_cache
+import bulk_load
+import conflict_log
+import numeric_part
+import query_cache
+from profile_stage import StageProfile
+import_seconds = perf_counter() - import_start
+
+Stage = namedtuple('Stage', 'title command writes stdout')
+
+
+# python()
+# -------------------------------------------------------------------------------------------------
+def python(script, *args):
+  return ['python', script, *args]
+
+
+# sql()
+# -------------------------------------------------------------------------------------------------
+def sql(*files):
+  return ['sql', *files]
+
+
+# stages()
+# -------------------------------------------------------------------------------------------------
+def stages(progress, report):
+  """ The stages, in the order update_db runs them. progress and report are the command line
+      options (or empty strings) for the stages that take them.
+  """
+  options = [option for option in [progress] if option]
+  report_options = options + [option for option in [report] if option]
+  return [
+      Stage('CREATE academic_programs', python('cuny_programs.py'),
+            ['cuny_programs', 'cuny_subplans'], None),
+      Stage('CREATE TABLE cuny_careers', python('cuny_careers.py'), ['cuny_careers'], None),
+      Stage('CREATE TABLE cuny_divisions', python('cuny_divisions.py'), ['cuny_divisions'], None),
+      Stage('CREATE TABLE cuny_departments', python('cuny_departments.py'), ['cuny_departments'],
+            None),
+      Stage('CREATE TABLE cuny_subjects', python('cuny_subjects.py'),
+            ['cuny_subjects', 'cuny_disciplines'], None),
+      Stage('CREATE TABLE designations', python('designations.py'), ['designations'], None),
+      Stage('CREATE TABLE crse_equiv_tbl', python('mk_crse_equiv_tbl.py', *options),
+            ['crse_equiv_tbl'], None),
+      Stage('CREATE TABLE courses', sql('create_cuny_courses.sql', 'view_courses.sql'),
+            ['cuny_courses', 'course_attributes', 'course_attribute_map'], None),
+      Stage('POPULATE courses', python('populate_cuny_courses.py', *options),
+            ['cuny_courses', 'course_attributes', 'course_attribute_map'], None),
+      Stage('CHECK component contact hours', python('check_total_hours.py'), [],
+            'check_contact_hours.log'),
+      Stage('CREATE TABLE review_status_bits', sql('review_status_bits.sql'),
+            ['review_status_bits'], None),
+      Stage('CREATE transfer_rules, source_courses, destination_courses',
+            sql('create_transfer_rules.sql'),
+            ['transfer_rules', 'source_courses', 'destination_courses'], None),
+      Stage('POPULATE transfer_rules', python('populate_transfer_rules.py', *report_options),
+            ['transfer_rules', 'source_courses', 'destination_courses', 'course_rule_map'], None),
+      Stage('SPEEDUP transfer_rule lookups', python('mk_subject-rule_map.py', *options),
+            ['subject_rule_map'], None)]
+
+
+# run_python()
+# -------------------------------------------------------------------------------------------------
+def run_python(script, args, stdout, log, profile=None):
+  """ Run script as __main__ with args as its command line, and return True if it succeeded. If
+      profile is a StageProfile, the stage is profiled, and profile_<stage>.log and .pstats are
+      written, as profile_stage.py would.
+  """
+  saved_argv = sys.argv
+  sys.argv = [script] + args
+  ok = True
+  exit_status = 0
+  if profile is not None:
+    profile.start()
+  try:
+    with redirect_stdout(stdout), redirect_stderr(log):
+      runpy.run_path(script, run_name='__main__')
+  except SystemExit as e:
+    if e.code not in (None, 0):
+      print(e.code, file=log)
+      ok = False
+      exit_status = e.code
+  except Exception:
+    traceback.print_exc(file=log)
+    ok = False
+    exit_status = 1
+  finally:
+    if profile is not None:
+      profile.stop()
+      profile.report(Path(script).stem, args, exit_status)
+    sys.argv = saved_argv
+    stdout.flush()
+    log.flush()
+    curriculum_db.close_all()
+  return ok
+
+
+# run_sql()
+# -------------------------------------------------------------------------------------------------
+def run_sql(files, psql_vars, log):
+  for file in files:
+    completed = subprocess.run(['psql', '-X', '-q', '-v', 'ON_ERROR_STOP=1', *psql_vars,
+                                '-d', 'cuny_curriculum', '-f', file],
+                               stdout=log, stderr=log)
+    if completed.returncode != 0:
+      return False
+  return True
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Run the update_db build stages in one process')
+  parser.add_argument('--progress', '-p', action='store_true')
+  parser.add_argument('--report', '-r', action='store_true')
+  parser.add_argument('--persistence', default='unlogged', choices=['logged', 'unlogged'])
+  parser.add_argument('--partitioned', default='false', choices=['true', 'false'])
+  parser.add_argument('--profile', action='store_true',
+                      help='profile each Python stage, as profile_stage.py does')
+  parser.add_argument('--tracemalloc', action='store_true',
+                      help='with --profile, also trace memory allocations')
+  args = parser.parse_args()
+
+  psql_vars = ['-v', f'persistence={args.persistence}', '-v', f'partitioned={args.partitioned}']
+
+  # Each stage is recorded under its own name in the run metrics, not as run_stages.
+  atexit.unregister(run_metrics.record_stage)
+
+  times = []
+  with open('update.log', 'a') as log, open('update_psql.log', 'a') as psql_log:
+    for stage in stages('--progress' if args.progress else '',
+                        '--report' if args.report else ''):
+      print(f'{stage.title}... ', end='', flush=True)
+      stage_cache.forget(*stage.writes)
+      start_time = perf_counter()
+      if stage.command[0] == 'sql':
+        ok = run_sql(stage.command[1:], psql_vars, psql_log)
+      else:
+        script, *script_args = stage.command[1:]
+        profile = StageProfile(args.tracemalloc) if args.profile else None
+        run_metrics.start_stage()
+        if stage.stdout is None:
+          ok = run_python(script, script_args, log, log, profile)
+        else:
+          with open(stage.stdout, 'w') as stdout:
+            ok = run_python(script, script_args, stdout, log, profile)
+        run_metrics.record_stage(Path(script).stem)
+      times.append((stage.title, perf_counter() - start_time))
+      if not ok:
+        print(f'ERROR: {stage.title} failed', flush=True)
+        sys.exit(1)
+      print('done.', flush=True)
+
+  print(f'\n  Imports (once, instead of once per stage) {import_seconds:8.3f} sec')
+  for title, seconds in times:
+    print(f'  {title[0:40]:<40} {seconds:8.1f} sec')
+  for table, (rows, seconds) in stage_cache.loads.items():
+    print(f'  {table} loaded once ({rows:,} rows, {seconds:.3f} sec), '
+          f'reused {stage_cache.hits[table]} time(s)')
+  print(f'  Query files: {query_cache.loads["parsed"]} parsed, '
+        f'{query_cache.loads["mapped"]} mapped from the parse cache, '
+        f'{query_cache.loads["memory"]} reused in memory')
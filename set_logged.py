@@ -0,0 +1,70 @@
+#! /usr/local/bin/python3
+""" Make the tables that are loaded UNLOGGED (see create_cuny_courses.sql) permanent, once
+    update_db has added and validated their constraints.
+
+    SET LOGGED rewrites each table and its indexes into the WAL, so report the time and WAL volume
+    for each one, for comparison with the COPY figures the populate scripts report. All the tables
+    are converted in one transaction. Referenced tables are converted before the tables that
+    reference them, because a permanent table cannot reference an unlogged one. Tables that are
+    already logged (update_db --logged-load) are skipped. A partitioned table has no storage of its
+    own, so its partitions are converted instead.
+"""
+import argparse
+import os
+
+from time import perf_counter
+
+from curriculum_db import connect
+import run_metrics
+
+tables = ['course_attributes',
+          'cuny_courses',
+          'course_attribute_map',
+          'transfer_rules',
+          'source_courses',
+          'destination_courses',
+          'course_rule_map',
+          'subject_rule_map']
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--progress', '-p', action='store_true')
+args = parser.parse_args()
+
+try:
+  terminal = open(os.ttyname(0), 'wt')
+except OSError as e:
+  # No progress reporting unless run from command line
+  terminal = open('/dev/null', 'wt')
+
+db = connect()
+cursor = db.cursor()
+
+total_seconds = 0.0
+total_bytes = 0
+leaf_tables = []
+for table in tables:
+  cursor.execute("""select relid::text as name from pg_partition_tree(%s) where isleaf
+                    order by relid::text""", (table, ))
+  leaf_tables += [row.name for row in cursor.fetchall()]
+
+for table in leaf_tables:
+  cursor.execute("select relpersistence from pg_class where oid = %s::regclass", (table, ))
+  if cursor.fetchone().relpersistence != 'u':
+    print(f'  {table:<32} already logged')
+    continue
+  if args.progress:
+    print(f'  {table}', file=terminal)
+  cursor.execute('select pg_current_wal_lsn() as lsn')
+  start_lsn = cursor.fetchone().lsn
+  start_time = perf_counter()
+  cursor.execute(f'alter table {table} set logged')
+  seconds = perf_counter() - start_time
+  cursor.execute('select pg_wal_lsn_diff(pg_current_wal_lsn(), %s) as wal_bytes', (start_lsn, ))
+  wal_bytes = int(cursor.fetchone().wal_bytes)
+  print(f'  {table:<32} {seconds:7.1f} sec {wal_bytes:15,} bytes of WAL')
+  total_seconds += seconds
+  total_bytes += wal_bytes
+
+print(f'  {"Total":<32} {total_seconds:7.1f} sec {total_bytes:15,} bytes of WAL')
+db.commit()
+db.close()
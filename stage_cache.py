@@ -0,0 +1,95 @@
+""" Reference data shared by the update_db stages.
+
+    When the stages run in one process (run_stages.py), a table that several of them look up, like
+    cuny_institutions or cuny_disciplines, is read from the db once, by the first stage that needs
+    it, and the later stages get the same rows from memory. The same goes for the course index
+    (course_id => the offer_nbr rows of that course) that populate_transfer_rules.py checks rules
+    against: populate_cuny_courses.py hands it over from the courses it has just loaded, instead of
+    populate_transfer_rules.py reading cuny_courses back from the db.
+
+    Cached rows of a table are stale once it is rebuilt, so run_stages.py forget()s the tables each
+    stage writes before running it. When a stage runs in a process of its own, the cache just lasts
+    for that stage.
+
+    loads records the number of rows and the seconds taken by each load from the db, and hits the
+    number of times each table was served from memory, for run_stages.py’s report.
+"""
+from collections import Counter, namedtuple
+from time import perf_counter
+
+from curriculum_db import connect, server_rows
+
+Indexed_Course = namedtuple('Indexed_Course', """course_id offer_nbr institution discipline
+                                                 catalog_number cat_num cuny_subject min_credits
+                                                 max_credits course_status""")
+
+_tables = dict()
+loads = dict()    # table => (rows, seconds)
+hits = Counter()  # table => times served from memory
+
+
+# table_rows()
+# -------------------------------------------------------------------------------------------------
+def table_rows(table):
+  """ All the rows of table, as named tuples.
+  """
+  if table in _tables:
+    hits[table] += 1
+  else:
+    start = perf_counter()
+    cursor = connect().cursor()
+    cursor.execute(f'select * from {table}')
+    _tables[table] = cursor.fetchall()
+    cursor.close()
+    loads[table] = (len(_tables[table]), perf_counter() - start)
+  return _tables[table]
+
+
+# table_keys()
+# -------------------------------------------------------------------------------------------------
+def table_keys(table, *columns):
+  """ The set of values of columns in the rows of table (tuples, if there is more than one column),
+      for checking the references a stage’s rows would make to it.
+  """
+  if len(columns) == 1:
+    return set(getattr(row, columns[0]) for row in table_rows(table))
+  return set(tuple(getattr(row, column) for column in columns) for row in table_rows(table))
+
+
+# course_index()
+# -------------------------------------------------------------------------------------------------
+def course_index():
+  """ Dict of course_id => list of Indexed_Course, one for each offer_nbr.
+  """
+  if 'course_index' in _tables:
+    hits['course_index'] += 1
+  else:
+    start = perf_counter()
+    set_course_index(server_rows(f'select {", ".join(Indexed_Course._fields)} from cuny_courses'))
+    loads['course_index'] = (len(_tables['course_index']), perf_counter() - start)
+  return _tables['course_index']
+
+
+# set_course_index()
+# -------------------------------------------------------------------------------------------------
+def set_course_index(courses):
+  """ Build the course index from courses, which can be any objects with the Indexed_Course fields
+      as attributes.
+  """
+  index = dict()
+  for course in courses:
+    index.setdefault(course.course_id, []).append(
+        Indexed_Course._make(getattr(course, field) for field in Indexed_Course._fields))
+  _tables['course_index'] = index
+
+
+# forget()
+# -------------------------------------------------------------------------------------------------
+def forget(*tables):
+  """ Drop tables from the cache, before a stage rebuilds them. cuny_courses takes the course
+      index with it.
+  """
+  for table in tables:
+    _tables.pop(table, None)
+    if table == 'cuny_courses':
+      _tables.pop('course_index', None)
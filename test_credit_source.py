@@ -16,8 +16,7 @@ import csv
 from collections import namedtuple
 from datetime import date
 
-import psycopg2
-from psycopg2.extras import NamedTupleCursor
+from curriculum_db import connect
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--debug', '-d', action='store_true')
@@ -27,8 +26,8 @@ args = parser.parse_args()
 if args.progress:
   print('\nInitializing.', file=terminal)
 
-db = psycopg2.connect('dbname=vickery')
-cursor = db.cursor(cursor_factory=NamedTupleCursor)
+db = connect('dbname=vickery')
+cursor = db.cursor()
 
 # Get the table
 cf_rules_file = './QCCV_EXT_TRANSFER_EQUIV_COMP-29143052.csv'
@@ -0,0 +1,80 @@
+-- Keys and indexes for the tables created by create_transfer_rules.sql.
+--
+-- The tables are created without them, so populate_transfer_rules.py can bulk-load the rows
+-- without maintaining indexes or checking foreign keys one row at a time. update_db runs this file
+-- in parallel with cuny_courses_constraints.sql once all the tables are loaded. A duplicate key or
+-- a dangling reference fails the update, and the error, with the offending key values, is in
+-- update_transfer_rules_constraints.log.
+
+--
+-- When the tables are partitioned by source_institution (see create_transfer_rules.sql), Postgres
+-- requires the partition key in every primary key and unique constraint, so it is added to the ones
+-- for transfer_rules and the course tables. That loses nothing: rule ids are unique because they
+-- come from the rule_ids registry, and rule keys start with the source institution. But rule_id
+-- alone no longer identifies a row of transfer_rules, so the references to it from course_rule_map
+-- and subject_rule_map are not declared in that case.
+
+set maintenance_work_mem = '1GB';
+
+\if :{?partitioned}
+\else
+  \set partitioned false
+\endif
+
+\if :partitioned
+alter table transfer_rules
+  add primary key (id, source_institution),
+  add unique (rule_key, source_institution),
+  add unique (source_institution, destination_institution, subject_area, group_number),
+  add foreign key (source_institution) references cuny_institutions,
+  add foreign key (destination_institution) references cuny_institutions;
+\else
+alter table transfer_rules
+  add primary key (id),
+  add unique (rule_key),
+  add unique (source_institution, destination_institution, subject_area, group_number),
+  add foreign key (source_institution) references cuny_institutions,
+  add foreign key (destination_institution) references cuny_institutions;
+\endif
+
+-- For finding rules by discipline, subject, or course, e.g., source_disciplines @> '{MATH}'
+create index on transfer_rules using gin (source_disciplines);
+create index on transfer_rules using gin (source_subjects);
+create index on transfer_rules using gin (destination_disciplines);
+create index on transfer_rules using gin (sending_courses);
+create index on transfer_rules using gin (receiving_courses);
+
+-- Looking up a rule’s courses by rule_id. post_load.sql clusters the tables on these indexes.
+\if :partitioned
+alter table source_courses
+  add primary key (id, source_institution),
+  add foreign key (rule_id, source_institution) references transfer_rules,
+  add foreign key (credits_source) references credit_sources;
+alter table destination_courses
+  add primary key (id, source_institution),
+  add foreign key (rule_id, source_institution) references transfer_rules;
+\else
+alter table source_courses
+  add primary key (id),
+  add foreign key (rule_id) references transfer_rules,
+  add foreign key (credits_source) references credit_sources;
+alter table destination_courses
+  add primary key (id),
+  add foreign key (rule_id) references transfer_rules;
+\endif
+create index on source_courses (rule_id);
+create index on destination_courses (rule_id);
+
+-- The primary key index includes rule_key, so the lookup does not need to visit transfer_rules.
+alter table course_rule_map
+  add primary key (course_id, direction, destination_institution, rule_id) include (rule_key);
+alter table subject_rule_map
+  add primary key (subject, rule_id),
+  add foreign key (subject) references cuny_subjects;
+\if :partitioned
+\else
+alter table course_rule_map
+  add foreign key (rule_id) references transfer_rules;
+alter table subject_rule_map
+  add foreign key (rule_id) references transfer_rules;
+\endif
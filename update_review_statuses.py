@@ -1,12 +1,14 @@
 # Use the events table to set rule statuses.
 #
+# Rule ids are stable across rebuilds (see rule_ids.sql), so the restored events reference the
+# right rules without remapping, and each rule’s status is just the OR of the bitmasks of all
+# events for it. That is done with a single update instead of a read/update round trip per event.
 
-import psycopg2
-from collections import namedtuple
-from psycopg2.extras import NamedTupleCursor
+from curriculum_db import connect
+import run_metrics
 
-db = psycopg2.connect('dbname=cuny_curriculum')
-cursor = db.cursor(cursor_factory=NamedTupleCursor)
+db = connect()
+cursor = db.cursor()
 
 # Clear all existing status bits: only status changes from the events table
 # will be reflected in the rules table.
@@ -14,31 +16,20 @@ cursor.execute('select count(*) as num_rules from transfer_rules where review_st
 print('\n  Reset status for {:,} rules ...'.format(cursor.fetchone().num_rules))
 cursor.execute('update transfer_rules set review_status = 0 where review_status != 0')
 
-# Initialize the bitmasks dict for this script to work from
-cursor.execute('select * from review_status_bits')
-event_types = cursor.fetchall()
-bitmasks = dict()
-for event_type in event_types:
-  bitmasks[event_type.abbr] = event_type.bitmask
-
 # Process the events table
-cursor.execute('select * from events')
-print('  Process {} events ...'.format(cursor.rowcount))
-events = cursor.fetchall()
-for event in events:
-  cursor.execute("""select review_status
-                      from transfer_rules
-                     where id = %s
-                 """, (event.rule_id,))
-  review_status = cursor.fetchone().review_status
-  # print('status is {}\n  event_type is {}\n  bitmask is {}'
-  #       .format(status, event.event_type, bitmasks[event.event_type]))
-  review_status = review_status | bitmasks[event.event_type]
-  # print('new status:', status)
-  cursor.execute("""
-                  update transfer_rules set review_status = %s
-                   where id = %s
-               """, (review_status, event.rule_id))
-  db.commit()
+cursor.execute('select count(*) as num_events from events')
+print('  Process {} events ...'.format(cursor.fetchone().num_events))
+cursor.execute("""
+               update transfer_rules r
+                  set review_status = s.review_status
+                 from (select e.rule_id, bit_or(b.bitmask) as review_status
+                         from events e, review_status_bits b
+                        where b.abbr = e.event_type
+                        group by e.rule_id) s
+                where r.id = s.rule_id
+               """)
+print('  Set status for {:,} rules'.format(cursor.rowcount))
+run_metrics.wrote(cursor.rowcount)
+db.commit()
 print('  Done')
 db.close()
@@ -3,5 +3,18 @@
 -- drop role if exists view_only;
 -- create user view_only with login password 'Fernández';
 grant connect on database cuny_curriculum to view_only;
+-- update_db re-creates the public schema, so usage on it has to be granted again each time.
+grant usage on schema public to public;
 grant select on all tables in schema public to public;
 alter default privileges in schema public grant select on tables to public;
+
+-- The persistent schema (cuny_curriculum only)
+do $$
+  begin
+    if exists (select 1 from pg_namespace where nspname = 'persistent') then
+      grant usage on schema persistent to public;
+      grant select on all tables in schema persistent to public;
+      alter default privileges in schema persistent grant select on tables to public;
+    end if;
+  end;
+$$;
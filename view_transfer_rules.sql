@@ -4,8 +4,8 @@ drop view if exists view_transfer_rules, view_source_courses, view_destination_c
 create view view_transfer_rules as
 (
   select  t.id as rule_id,
-          rule_key(t.id),
-          t.source_disciplines as sending_disciplines,
+          t.rule_key,
+          array_to_string(t.source_disciplines, ':') as sending_disciplines,
           string_agg(d.discipline, ':') as receiving_discipline,
           string_agg(trim(to_char(s.course_id, '000000'))||'.'||s.offer_nbr, ':') as sending_courses,
           string_agg(trim(to_char(d.course_id, '000000'))||'.'||d.offer_nbr, ':') as receiving_courses
@@ -13,6 +13,7 @@ create view view_transfer_rules as
     where  s.rule_id = t.id
       and  d.rule_id = t.id
   group by  t.id,
+            t.rule_key,
             t.source_disciplines,
             s.rule_id,
             d.rule_id
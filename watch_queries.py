@@ -0,0 +1,196 @@
+#! /usr/local/bin/python3
+""" Wait for the weekly query files to arrive, and start the update as soon as they are all there.
+
+    Instead of update_db running at a fixed time, whether or not the files have come in, and
+    wait_tumble checking Tumbleweed once a minute, this watches the local directories the files
+    are delivered to (default: the queries folder that check_queries.py checks) and, once there is
+    a complete file for every query check_queries.py requires, runs the command (default:
+    ./update_db --skip-download), which checks the queries and rebuilds the db.
+
+    A file is complete when whatever is writing it has closed it. On Linux that is reported by
+    inotify (IN_CLOSE_WRITE, or IN_MOVED_TO for files moved into place). Elsewhere (macOS) the
+    directories are polled every --interval seconds, and a file counts as complete once it is
+    non-empty and its size and modification time have not changed for --settle seconds.
+
+    Usage: watch_queries.py [--dir DIR ...] [--command CMD] [--timeout HOURS] [--progress]
+
+    Any local directory can stand in for Tumbleweed (or for the download step): copy or write query
+    files into it and watch them being picked up. Files whose names are not required queries are
+    ignored. Exits with the command’s exit status, or 2 on timeout.
+"""
+import argparse
+import ctypes
+import ctypes.util
+import os
+import select
+import shlex
+import struct
+import subprocess
+import sys
+import time
+
+from pathlib import Path
+
+from required_queries import required_query_names
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+_event_header = struct.Struct('iIII')
+
+
+# query_name()
+# -------------------------------------------------------------------------------------------------
+def query_name(path):
+  """ The query a file is the result of, dropping the CUNYfirst process id from its name, as
+      check_queries.py does.
+  """
+  return Path(path).stem.strip('-0123456789')
+
+
+# class Inotify
+# -------------------------------------------------------------------------------------------------
+class Inotify:
+  """ The files closed after writing, or moved into, a set of directories, from Linux inotify, used
+      through libc so there is nothing to install. Raises OSError where inotify isn’t available.
+  """
+
+  def __init__(self, dirs):
+    libc_name = ctypes.util.find_library('c')
+    libc = ctypes.CDLL(libc_name, use_errno=True)
+    if not hasattr(libc, 'inotify_init1'):
+      raise OSError('inotify is not available')
+    self.fd = libc.inotify_init1(os.O_NONBLOCK)
+    if self.fd < 0:
+      raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+    self.dirs = dict()
+    for dir in dirs:
+      watch = libc.inotify_add_watch(self.fd, str(dir).encode(), IN_CLOSE_WRITE | IN_MOVED_TO)
+      if watch < 0:
+        raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {dir}')
+      self.dirs[watch] = Path(dir)
+
+  def wait(self, seconds):
+    """ Paths of the files completed within seconds.
+    """
+    paths = []
+    readable, _, _ = select.select([self.fd], [], [], seconds)
+    if readable:
+      buffer = os.read(self.fd, 64 * 1024)
+      offset = 0
+      while offset < len(buffer):
+        watch, mask, cookie, name_length = _event_header.unpack_from(buffer, offset)
+        offset += _event_header.size
+        name = buffer[offset:offset + name_length].rstrip(b'\0').decode()
+        offset += name_length
+        if name:
+          paths.append(self.dirs[watch] / name)
+    return paths
+
+  def close(self):
+    os.close(self.fd)
+
+
+# class Poller
+# -------------------------------------------------------------------------------------------------
+class Poller:
+  """ The files in a set of directories that are non-empty, and whose sizes and modification times
+      have not changed for settle seconds.
+  """
+
+  def __init__(self, dirs, interval, settle):
+    self.dirs = dirs
+    self.interval = interval
+    self.settle = settle
+    self.seen = dict()  # path => ((size, mtime), time first seen that way)
+
+  def wait(self, seconds):
+    time.sleep(min(seconds, self.interval))
+    paths = []
+    now = time.monotonic()
+    for dir in self.dirs:
+      for path in dir.glob('*.csv'):
+        try:
+          status = path.stat()
+        except FileNotFoundError:
+          continue
+        signature = (status.st_size, status.st_mtime)
+        previous = self.seen.get(path)
+        if previous is None or previous[0] != signature:
+          self.seen[path] = (signature, now)
+        elif status.st_size > 0 and now - previous[1] >= self.settle:
+          paths.append(path)
+    return paths
+
+  def close(self):
+    pass
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Start the update when the query files arrive')
+  parser.add_argument('--dir', '-d', action='append', type=Path,
+                      help='directory to watch (repeatable; default: the queries folder)')
+  parser.add_argument('--command', '-c', default='./update_db --skip-download')
+  parser.add_argument('--interval', '-i', type=float, default=1.0,
+                      help='seconds between polls, without inotify')
+  parser.add_argument('--settle', '-s', type=float, default=5.0,
+                      help='seconds a polled file must be unchanged to count as complete')
+  parser.add_argument('--timeout', '-t', type=float, default=24.0, help='hours to wait')
+  parser.add_argument('--poll', action='store_true', help='poll even where inotify is available')
+  parser.add_argument('--progress', '-p', action='store_true')
+  args = parser.parse_args()
+  dirs = args.dir or [Path('/Users/vickery/CUNY_Curriculum/queries')]
+
+  required = set(required_query_names)
+
+  watcher = None
+  if not args.poll:
+    try:
+      watcher = Inotify(dirs)
+    except OSError as e:
+      if args.progress:
+        print(f'{e}: polling every {args.interval:g} sec instead', file=sys.stderr)
+
+  # Files that were already there when the watch started count if they have not been modified for
+  # settle seconds. The others may have been closed before the watch started, so they are polled
+  # until they settle, even with inotify.
+  present = set()
+  pending = Poller(dirs, args.interval, args.settle)
+  if watcher is None:
+    watcher = pending
+  for dir in dirs:
+    for path in dir.glob('*.csv'):
+      status = path.stat()
+      if query_name(path) not in required:
+        continue
+      if status.st_size > 0 and time.time() - status.st_mtime >= args.settle:
+        present.add(query_name(path))
+      else:
+        pending.seen[path] = ((status.st_size, status.st_mtime), time.monotonic())
+
+  start_time = time.monotonic()
+  deadline = start_time + 3600 * args.timeout
+  while present != required:
+    if time.monotonic() > deadline:
+      print(f'Timed out waiting for {", ".join(sorted(required - present))}', file=sys.stderr)
+      exit(2)
+    seconds = max(0.0, min(60.0, deadline - time.monotonic()))
+    if pending.seen and watcher is not pending:
+      seconds = min(seconds, args.interval)
+    paths = watcher.wait(seconds)
+    if pending.seen and watcher is not pending:
+      paths += pending.wait(0)
+      pending.seen = {path: seen for path, seen in pending.seen.items()
+                      if query_name(path) in required - present and path not in paths}
+    for path in paths:
+      name = query_name(path)
+      if name in required and name not in present:
+        present.add(name)
+        if args.progress:
+          print(f'{time.monotonic() - start_time:8.1f} sec  {path.name} '
+                f'({len(present)}/{len(required)})', file=sys.stderr)
+  watcher.close()
+
+  if args.progress:
+    print(f'All {len(required)} queries present after {time.monotonic() - start_time:.1f} sec; '
+          f'running {args.command}', file=sys.stderr)
+  exit(subprocess.run(shlex.split(args.command)).returncode)